@@ -0,0 +1,527 @@
+"""
+GPlay Downloader - Android Binary Resources
+Minimal readers/writers for the chunk formats inside an APK
+
+Covers what merging split APKs needs: string pools, patching the binary
+AndroidManifest.xml (AXML) and folding split resource tables
+(resources.arsc) into the base table. Anything unexpected raises
+ResourceError so callers can fall back to APKEditor.
+"""
+import struct
+
+# Chunk types (ResourceTypes.h)
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_TYPE = 0x0003
+RES_XML_START_NAMESPACE_TYPE = 0x0100
+RES_XML_END_NAMESPACE_TYPE = 0x0101
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+RES_TABLE_TYPE_SPEC_TYPE = 0x0202
+
+SORTED_FLAG = 1 << 0
+UTF8_FLAG = 1 << 8
+STYLE_END = 0xFFFFFFFF
+
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+
+# ResTable_type flags / ResTable_entry flags
+TYPE_FLAG_SPARSE = 0x01
+TYPE_FLAG_OFFSET16 = 0x02
+ENTRY_FLAG_COMPLEX = 0x0001
+ENTRY_FLAG_COMPACT = 0x0008
+NO_ENTRY = 0xFFFFFFFF
+
+ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+# Attributes that make the base APK refuse to install without its splits
+SPLIT_ATTRS = {0x01010591: 'isSplitRequired', 0x0101064e: 'requiredSplitTypes', 0x0101064f: 'splitTypes'}
+SPLIT_META_DATA = ('com.android.vending.splits', 'com.android.vending.splits.required')
+ATTR_MIN_SDK_VERSION = 0x0101020c
+ATTR_IS_FEATURE_SPLIT = 0x0101055b
+
+
+class ResourceError(Exception):
+    pass
+
+
+def chunk_header(buf, offset):
+    """(type, header size, total size) of the chunk at `offset`."""
+    if offset + 8 > len(buf):
+        raise ResourceError(f"Truncated chunk at {offset}")
+    ctype, hsize, size = struct.unpack_from('<HHI', buf, offset)
+    if size < 8 or offset + size > len(buf):
+        raise ResourceError(f"Bad chunk size {size} at {offset}")
+    return ctype, hsize, size
+
+
+def iter_chunks(buf, start, end):
+    offset = start
+    while offset < end:
+        ctype, hsize, size = chunk_header(buf, offset)
+        yield offset, ctype, hsize, size
+        offset += size
+
+
+def _pad4(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+class StringPool:
+    """A ResStringPool. Existing entries are kept byte-for-byte; `add` appends."""
+
+    def __init__(self, buf, offset=0):
+        ctype, hsize, size = chunk_header(buf, offset)
+        if ctype != RES_STRING_POOL_TYPE:
+            raise ResourceError(f"Expected a string pool, got chunk 0x{ctype:04x}")
+        count, style_count, flags, strings_start, styles_start = struct.unpack_from('<IIIII', buf, offset + 8)
+        self.flags = flags & ~SORTED_FLAG
+        self.utf8 = bool(flags & UTF8_FLAG)
+        self.strings = []
+        self.raw = []
+        self.styles = []
+
+        index = offset + hsize
+        string_offsets = struct.unpack_from(f'<{count}I', buf, index)
+        style_offsets = struct.unpack_from(f'<{style_count}I', buf, index + 4 * count)
+        base = offset + strings_start
+        for rel in string_offsets:
+            text, length = self._decode(buf, base + rel)
+            self.strings.append(text)
+            self.raw.append(bytes(buf[base + rel:base + rel + length]))
+        base = offset + styles_start
+        for rel in style_offsets:
+            spans, pos = [], base + rel
+            while struct.unpack_from('<I', buf, pos)[0] != STYLE_END:
+                spans.append(struct.unpack_from('<III', buf, pos))
+                pos += 12
+            self.styles.append(spans)
+        self._index = None
+
+    def _decode(self, buf, pos):
+        """Return (text, encoded length including the terminator)."""
+        start = pos
+        if self.utf8:
+            pos += 2 if buf[pos] & 0x80 else 1  # UTF-16 length, unused
+            n = buf[pos]
+            if n & 0x80:
+                n = ((n & 0x7F) << 8) | buf[pos + 1]
+                pos += 2
+            else:
+                pos += 1
+            text = bytes(buf[pos:pos + n]).decode('utf-8', errors='surrogatepass')
+            return text, pos + n + 1 - start
+        n = struct.unpack_from('<H', buf, pos)[0]
+        if n & 0x8000:
+            n = ((n & 0x7FFF) << 16) | struct.unpack_from('<H', buf, pos + 2)[0]
+            pos += 4
+        else:
+            pos += 2
+        text = bytes(buf[pos:pos + 2 * n]).decode('utf-16-le', errors='surrogatepass')
+        return text, pos + 2 * n + 2 - start
+
+    def _encode(self, text):
+        units = len(text.encode('utf-16-le', errors='surrogatepass')) // 2
+        if self.utf8:
+            data = text.encode('utf-8', errors='surrogatepass')
+            out = bytearray()
+            for n in (units, len(data)):
+                if n > 0x7FFF:
+                    raise ResourceError("String too long for a UTF-8 pool")
+                out += bytes([0x80 | (n >> 8), n & 0xFF]) if n > 0x7F else bytes([n])
+            return bytes(out) + data + b'\0'
+        prefix = struct.pack('<HH', 0x8000 | (units >> 16), units & 0xFFFF) if units > 0x7FFF else struct.pack('<H', units)
+        return prefix + text.encode('utf-16-le', errors='surrogatepass') + b'\0\0'
+
+    def __len__(self):
+        return len(self.strings)
+
+    def style_of(self, i):
+        return self.styles[i] if i < len(self.styles) else []
+
+    def find(self, text, spans=()):
+        """Index of an existing entry with this text and these (already local) spans."""
+        if self._index is None:
+            self._index = {}
+            for i, s in enumerate(self.strings):
+                self._index.setdefault((s, tuple(map(tuple, self.style_of(i)))), i)
+        return self._index.get((text, tuple(map(tuple, spans))))
+
+    def add(self, text, spans=()):
+        """Return the index of `text` with `spans`, appending it if needed."""
+        found = self.find(text, spans)
+        if found is not None:
+            return found
+        index = len(self.strings)
+        self.strings.append(text)
+        self.raw.append(self._encode(text))
+        if spans:
+            # Styles are parallel to the first N strings; unstyled gaps get empty span lists
+            self.styles.extend([] for _ in range(index - len(self.styles)))
+            self.styles.append([tuple(s) for s in spans])
+        self._index[(text, tuple(map(tuple, spans)))] = index
+        return index
+
+    def serialize(self):
+        count, style_count = len(self.strings), len(self.styles)
+        hsize = 28
+        offsets, data, pos = [], bytearray(), 0
+        for raw in self.raw:
+            offsets.append(pos)
+            data += raw
+            pos += len(raw)
+        data = _pad4(bytes(data))
+        style_offsets, style_data = [], bytearray()
+        for spans in self.styles:
+            style_offsets.append(len(style_data))
+            for span in spans:
+                style_data += struct.pack('<III', *span)
+            style_data += struct.pack('<I', STYLE_END)
+        if self.styles:
+            style_data += struct.pack('<II', STYLE_END, STYLE_END)
+        strings_start = hsize + 4 * (count + style_count)
+        styles_start = strings_start + len(data) if self.styles else 0
+        body = struct.pack(f'<{count}I', *offsets) + struct.pack(f'<{style_count}I', *style_offsets) + data + bytes(style_data)
+        header = struct.pack('<HHIIIIII', RES_STRING_POOL_TYPE, hsize, hsize + len(body),
+                             count, style_count, self.flags, strings_start, styles_start)
+        return header + body
+
+
+# --- AXML (binary AndroidManifest.xml) ---
+
+class _Element:
+    def __init__(self, buf, offset, pool, resource_map):
+        self.offset = offset
+        hsize = struct.unpack_from('<H', buf, offset + 2)[0]
+        ext = offset + hsize
+        ns, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', buf, ext)
+        self.name = pool.strings[name] if name != NO_ENTRY else None
+        self.ext = ext
+        self.attr_start, self.attr_size, self.attr_count = attr_start, attr_size, attr_count
+        self.attrs = []
+        for i in range(attr_count):
+            pos = ext + attr_start + i * attr_size
+            a_ns, a_name, a_raw, _, _, a_type, a_data = struct.unpack_from('<IIIHBBI', buf, pos)
+            self.attrs.append({
+                'ns': pool.strings[a_ns] if a_ns != NO_ENTRY else None,
+                'name': pool.strings[a_name],
+                'resid': resource_map[a_name] if a_name < len(resource_map) else None,
+                'raw': pool.strings[a_raw] if a_raw != NO_ENTRY else None,
+                'type': a_type,
+                'data': a_data,
+                'pos': pos,
+            })
+
+    def get(self, resid):
+        for attr in self.attrs:
+            if attr['resid'] == resid:
+                return attr
+        return None
+
+    def string_value(self, attr, pool):
+        if attr['raw'] is not None:
+            return attr['raw']
+        return pool.strings[attr['data']] if attr['type'] == TYPE_STRING else None
+
+
+def _parse_xml(data):
+    buf = memoryview(data)
+    ctype, hsize, size = chunk_header(buf, 0)
+    if ctype != RES_XML_TYPE:
+        raise ResourceError("Not a binary XML file")
+    pool, resource_map, nodes = None, [], []
+    for offset, ctype, chsize, csize in iter_chunks(buf, hsize, size):
+        if ctype == RES_STRING_POOL_TYPE:
+            pool = StringPool(buf, offset)
+        elif ctype == RES_XML_RESOURCE_MAP_TYPE:
+            resource_map = list(struct.unpack_from(f'<{(csize - chsize) // 4}I', buf, offset + chsize))
+        nodes.append((offset, ctype, csize))
+    if pool is None:
+        raise ResourceError("Binary XML without a string pool")
+    return buf, hsize, pool, resource_map, nodes
+
+
+def iter_manifest_elements(data):
+    """Yield (depth, element) for every start tag of a binary XML file."""
+    buf, _, pool, resource_map, nodes = _parse_xml(data)
+    depth = 0
+    for offset, ctype, _ in nodes:
+        if ctype == RES_XML_START_ELEMENT_TYPE:
+            yield depth, _Element(buf, offset, pool, resource_map), pool
+            depth += 1
+        elif ctype == RES_XML_END_ELEMENT_TYPE:
+            depth -= 1
+
+
+def patch_manifest(data):
+    """Turn a base AndroidManifest.xml into one that installs without splits.
+
+    Removes android:isSplitRequired, requiredSplitTypes and splitTypes
+    wherever they occur, and the com.android.vending.splits(.required)
+    <meta-data> elements, which is what APKEditor's merge does.
+    """
+    buf, hsize, pool, resource_map, nodes = _parse_xml(data)
+    out = [bytes(buf[:hsize])]
+    skip_depth = 0
+    for offset, ctype, size in nodes:
+        chunk = bytes(buf[offset:offset + size])
+        if skip_depth:
+            if ctype == RES_XML_START_ELEMENT_TYPE:
+                skip_depth += 1
+            elif ctype == RES_XML_END_ELEMENT_TYPE:
+                skip_depth -= 1
+            continue
+        if ctype == RES_XML_START_ELEMENT_TYPE:
+            element = _Element(buf, offset, pool, resource_map)
+            name_attr = element.get(0x01010003)
+            if element.name == 'meta-data' and name_attr and \
+                    element.string_value(name_attr, pool) in SPLIT_META_DATA:
+                skip_depth = 1
+                continue
+            chunk = _drop_attrs(chunk, element, [i for i, a in enumerate(element.attrs) if _is_split_attr(a)])
+        out.append(chunk)
+    body = b''.join(out)
+    return body[:4] + struct.pack('<I', len(body)) + body[8:]
+
+
+def _is_split_attr(attr):
+    if attr['resid'] is not None:
+        return attr['resid'] in SPLIT_ATTRS
+    return attr['ns'] == ANDROID_NS and attr['name'] in SPLIT_ATTRS.values()
+
+
+def _drop_attrs(chunk, element, drop):
+    if not drop:
+        return chunk
+    rel = element.ext - element.offset
+    attrs_at = rel + element.attr_start
+    kept = [chunk[attrs_at + i * element.attr_size:attrs_at + (i + 1) * element.attr_size]
+            for i in range(element.attr_count) if i not in drop]
+    end = attrs_at + element.attr_count * element.attr_size
+    out = bytearray(chunk[:attrs_at] + b''.join(kept) + chunk[end:])
+    struct.pack_into('<I', out, 4, len(out))
+    struct.pack_into('<H', out, rel + 12, len(kept))
+    # id/class/style attribute indices are 1-based positions in the attribute list
+    for field in (14, 16, 18):
+        idx = struct.unpack_from('<H', out, rel + field)[0]
+        if idx:
+            idx = 0 if idx - 1 in drop else idx - sum(1 for d in drop if d < idx - 1)
+            struct.pack_into('<H', out, rel + field, idx)
+    return bytes(out)
+
+
+def manifest_info(data):
+    """package, versionCode, minSdkVersion and split identity from a binary AndroidManifest.xml."""
+    info = {'package': None, 'versionCode': None, 'minSdkVersion': 1,
+            'split': None, 'configForSplit': None, 'isFeatureSplit': False}
+    for depth, element, pool in iter_manifest_elements(data):
+        if depth == 0 and element.name == 'manifest':
+            for attr in element.attrs:
+                if attr['name'] in ('package', 'split', 'configForSplit'):
+                    info[attr['name']] = element.string_value(attr, pool)
+                elif attr['resid'] == 0x0101021b:
+                    info['versionCode'] = attr['data']
+                elif attr['resid'] == ATTR_IS_FEATURE_SPLIT:
+                    info['isFeatureSplit'] = attr['data'] != 0
+        elif depth == 1 and element.name == 'uses-sdk':
+            attr = element.get(ATTR_MIN_SDK_VERSION)
+            if attr and attr['type'] == TYPE_INT_DEC:
+                info['minSdkVersion'] = attr['data']
+            elif attr:
+                # A preview codename: treat as the newest platform
+                info['minSdkVersion'] = 10000
+    return info
+
+
+# --- resources.arsc ---
+
+class _Package:
+    def __init__(self, buf, offset):
+        ctype, hsize, size = chunk_header(buf, offset)
+        self.header = bytearray(buf[offset:offset + hsize])
+        self.id = struct.unpack_from('<I', buf, offset + 8)[0]
+        type_strings, _, key_strings = struct.unpack_from('<III', buf, offset + 268)
+        self.type_strings = StringPool(buf, offset + type_strings)
+        self.key_strings = StringPool(buf, offset + key_strings)
+        # The key pool is written back as-is unless a split added keys to it
+        key_size = chunk_header(buf, offset + key_strings)[2]
+        self.key_pool = bytes(buf[offset + key_strings:offset + key_strings + key_size])
+        self.key_pool_dirty = False
+        # Everything after the two pools, in order: (type, type id, bytes)
+        self.chunks = []
+        for c_off, ctype, _, csize in iter_chunks(buf, offset + hsize, offset + size):
+            if c_off - offset in (type_strings, key_strings):
+                continue
+            data = bytearray(buf[c_off:c_off + csize])
+            type_id = data[8] if ctype in (RES_TABLE_TYPE_TYPE, RES_TABLE_TYPE_SPEC_TYPE) else None
+            self.chunks.append((ctype, type_id, data))
+
+    def spec(self, type_id):
+        for ctype, tid, data in self.chunks:
+            if ctype == RES_TABLE_TYPE_SPEC_TYPE and tid == type_id:
+                return data
+        return None
+
+    def serialize(self):
+        type_pool = self.type_strings.serialize()
+        key_pool = self.key_strings.serialize() if self.key_pool_dirty else self.key_pool
+        hsize = len(self.header)
+        body = type_pool + key_pool + b''.join(bytes(data) for _, _, data in self.chunks)
+        header = bytearray(self.header)
+        struct.pack_into('<I', header, 4, hsize + len(body))
+        struct.pack_into('<I', header, 268, hsize)
+        struct.pack_into('<I', header, 276, hsize + len(type_pool))
+        return bytes(header) + body
+
+
+class ResourceTable:
+    """A resources.arsc with one global string pool and its packages."""
+
+    def __init__(self, data):
+        buf = memoryview(data)
+        ctype, hsize, size = chunk_header(buf, 0)
+        if ctype != RES_TABLE_TYPE:
+            raise ResourceError("Not a resource table")
+        self.header = bytearray(buf[:hsize])
+        self.strings = None
+        self.packages = []
+        for offset, ctype, _, _ in iter_chunks(buf, hsize, size):
+            if ctype == RES_STRING_POOL_TYPE:
+                self.strings = StringPool(buf, offset)
+            elif ctype == RES_TABLE_PACKAGE_TYPE:
+                self.packages.append(_Package(buf, offset))
+        if self.strings is None:
+            raise ResourceError("Resource table without a string pool")
+
+    def package(self, package_id):
+        for package in self.packages:
+            if package.id == package_id:
+                return package
+        return None
+
+    def merge(self, split):
+        """Fold a split APK's table into this one.
+
+        The split's type chunks (one per extra configuration) are appended
+        after the base chunks of the same type, with their key and string
+        references remapped into the base pools; type spec flags are OR-ed.
+        """
+        string_map = {}
+
+        def map_string(i):
+            if i not in string_map:
+                spans = [(map_string(name), first, last) for name, first, last in split.strings.style_of(i)]
+                string_map[i] = self.strings.add(split.strings.strings[i], spans)
+            return string_map[i]
+
+        for split_pkg in split.packages:
+            pkg = self.package(split_pkg.id)
+            if pkg is None:
+                raise ResourceError(f"Split has unknown package 0x{split_pkg.id:02x}")
+            key_map = {}
+
+            def map_key(i):
+                if i not in key_map:
+                    before = len(pkg.key_strings)
+                    key_map[i] = pkg.key_strings.add(split_pkg.key_strings.strings[i])
+                    pkg.key_pool_dirty |= len(pkg.key_strings) != before
+                return key_map[i]
+
+            for ctype, type_id, data in split_pkg.chunks:
+                if ctype == RES_TABLE_TYPE_SPEC_TYPE:
+                    self._merge_spec(pkg, split_pkg, type_id, data)
+                elif ctype == RES_TABLE_TYPE_TYPE:
+                    _remap_type_chunk(data, map_key, map_string)
+                    self._insert_type(pkg, type_id, data)
+
+    def _merge_spec(self, pkg, split_pkg, type_id, data):
+        name = split_pkg.type_strings.strings[type_id - 1]
+        if type_id > len(pkg.type_strings) or pkg.type_strings.strings[type_id - 1] != name:
+            raise ResourceError(f"Split type {name} (id {type_id}) does not match the base")
+        base = pkg.spec(type_id)
+        if base is None:
+            pkg.chunks.append((RES_TABLE_TYPE_SPEC_TYPE, type_id, bytearray(data)))
+            return
+        # A split only needs to cover entries up to the last one it defines
+        count = struct.unpack_from('<I', data, 12)[0]
+        if count > struct.unpack_from('<I', base, 12)[0]:
+            raise ResourceError(f"Split type {name} has more entries than the base")
+        base_hsize = struct.unpack_from('<H', base, 2)[0]
+        split_hsize = struct.unpack_from('<H', data, 2)[0]
+        for i in range(count):
+            flags = struct.unpack_from('<I', base, base_hsize + 4 * i)[0]
+            flags |= struct.unpack_from('<I', data, split_hsize + 4 * i)[0]
+            struct.pack_into('<I', base, base_hsize + 4 * i, flags)
+
+    def _insert_type(self, pkg, type_id, data):
+        config = _type_config(data)
+        last = None
+        for i, (ctype, tid, existing) in enumerate(pkg.chunks):
+            if tid == type_id:
+                if ctype == RES_TABLE_TYPE_TYPE and _type_config(existing) == config:
+                    raise ResourceError(f"Configuration of type {type_id} present in base and split")
+                last = i
+        if last is None:
+            raise ResourceError(f"Split type {type_id} has no type spec")
+        pkg.chunks.insert(last + 1, (RES_TABLE_TYPE_TYPE, type_id, data))
+
+    def serialize(self):
+        body = self.strings.serialize() + b''.join(pkg.serialize() for pkg in self.packages)
+        header = bytearray(self.header)
+        struct.pack_into('<I', header, 4, len(header) + len(body))
+        struct.pack_into('<I', header, 8, len(self.packages))
+        return bytes(header) + body
+
+
+def _type_config(data):
+    hsize = struct.unpack_from('<H', data, 2)[0]
+    return bytes(data[20:hsize])
+
+
+def _type_entry_offsets(data):
+    hsize = struct.unpack_from('<H', data, 2)[0]
+    flags = data[9]
+    count, entries_start = struct.unpack_from('<II', data, 12)
+    if flags & TYPE_FLAG_SPARSE:
+        rels = [struct.unpack_from('<HH', data, hsize + 4 * i)[1] * 4 for i in range(count)]
+    elif flags & TYPE_FLAG_OFFSET16:
+        rels = [r * 4 for r in struct.unpack_from(f'<{count}H', data, hsize) if r != 0xFFFF]
+    else:
+        rels = [r for r in struct.unpack_from(f'<{count}I', data, hsize) if r != NO_ENTRY]
+    return sorted({entries_start + r for r in rels})
+
+
+def _remap_type_chunk(data, map_key, map_string):
+    """Rewrite key and string-value indices of every entry in a ResTable_type, in place."""
+    def remap_value(pos):
+        if data[pos + 3] == TYPE_STRING:
+            struct.pack_into('<I', data, pos + 4, map_string(struct.unpack_from('<I', data, pos + 4)[0]))
+
+    for pos in _type_entry_offsets(data):
+        size, flags = struct.unpack_from('<HH', data, pos)
+        if flags & ENTRY_FLAG_COMPACT:
+            key = map_key(size)
+            if key > 0xFFFF:
+                raise ResourceError("Key index too large for a compact entry")
+            struct.pack_into('<H', data, pos, key)
+            if flags >> 8 == TYPE_STRING:
+                struct.pack_into('<I', data, pos + 4, map_string(struct.unpack_from('<I', data, pos + 4)[0]))
+            continue
+        struct.pack_into('<I', data, pos + 4, map_key(struct.unpack_from('<I', data, pos + 4)[0]))
+        if flags & ENTRY_FLAG_COMPLEX:
+            count = struct.unpack_from('<I', data, pos + 12)[0]
+            for i in range(count):
+                remap_value(pos + size + 12 * i + 4)
+        else:
+            remap_value(pos + size)
+
+
+def merge_resource_tables(base_data, split_datas):
+    """Return the base resources.arsc with every split table folded in."""
+    table = ResourceTable(base_data)
+    for data in split_datas:
+        table.merge(ResourceTable(data))
+    return table.serialize()
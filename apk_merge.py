@@ -0,0 +1,233 @@
+"""
+GPlay Downloader - APK Merge
+Merges a base APK and its splits into one installable APK
+
+The native path streams ZIP entries (still compressed) from every input
+straight into the output, merges the split resource tables into the base
+resources.arsc and patches the manifest so it no longer requires splits.
+It never extracts to disk and needs no JVM. Only configuration splits
+(ABI, density, language) are merged natively: a feature split, or a split
+whose code (classes*.dex, lib/) collides with the base, needs its manifest
+and dex merged, so APKEditor is the fallback for those and for anything
+else the native path does not understand.
+
+The result is unsigned; sign it before installing.
+"""
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+from android_res import ResourceError, manifest_info, merge_resource_tables, patch_manifest
+
+logger = logging.getLogger(__name__)
+
+APKEDITOR_JAR = Path(os.environ.get('GPLAY_APKEDITOR_JAR', Path(__file__).parent / 'APKEditor.jar'))
+COPY_CHUNK = 1024 * 1024
+# Uncompressed native libraries must be page aligned to be mmapped in place
+SO_ALIGNMENT = 4096
+ALIGNMENT = 4
+ALIGNMENT_EXTRA_ID = 0xD935  # Same extra field zipalign uses for padding
+
+MANIFEST = 'AndroidManifest.xml'
+RESOURCES = 'resources.arsc'
+SIGNATURE_SUFFIXES = ('.SF', '.RSA', '.DSA', '.EC', '.MF')
+CODE_ENTRY = re.compile(r'classes\d*\.dex|lib/.+')
+
+
+class MergeUnsupported(Exception):
+    pass
+
+
+def is_signature_file(name):
+    if name == 'stamp-cert-sha256':
+        return True
+    return name.startswith('META-INF/') and '/' not in name[9:] and name.upper().endswith(SIGNATURE_SUFFIXES)
+
+
+class _ZipWriter:
+    """Minimal ZIP writer that copies entries without recompressing them."""
+
+    def __init__(self, f):
+        self.f = f
+        self.entries = []
+        self.names = set()
+
+    def _local_header(self, name, flags, method, dostime, dosdate, crc, csize, usize, align):
+        offset = self.f.tell()
+        extra = b''
+        if align:
+            data_at = offset + 30 + len(name)
+            pad = -(data_at + 6) % align
+            extra = struct.pack('<HHH', ALIGNMENT_EXTRA_ID, 2 + pad, align) + b'\0' * pad
+        self.f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dostime, dosdate,
+                                 crc, csize, usize, len(name), len(extra)) + name + extra)
+        self.entries.append((name, flags, method, dostime, dosdate, crc, csize, usize, offset))
+        self.names.add(name)
+
+    def copy(self, src, info, align=0):
+        """Copy `info` from the open ZipFile `src` as-is (compressed bytes included)."""
+        if info.file_size > 0xFFFFFFFF or info.compress_size > 0xFFFFFFFF:
+            raise MergeUnsupported(f"{info.filename}: ZIP64 entries are not supported")
+        name = info.filename.encode('utf-8')
+        flags = (info.flag_bits & 0x0800) | (0x0800 if not name.isascii() else 0)
+        raw = src.fp
+        raw.seek(info.header_offset)
+        header = raw.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise MergeUnsupported(f"{info.filename}: bad local header")
+        dostime, dosdate = struct.unpack_from('<HH', header, 10)
+        name_len, extra_len = struct.unpack_from('<HH', header, 26)
+        raw.seek(info.header_offset + 30 + name_len + extra_len)
+        # Sizes/CRC come from the central directory, so data descriptors are dropped
+        self._local_header(name, flags, info.compress_type, dostime, dosdate,
+                           info.CRC, info.compress_size, info.file_size,
+                           align if info.compress_type == zipfile.ZIP_STORED else 0)
+        left = info.compress_size
+        while left:
+            chunk = raw.read(min(COPY_CHUNK, left))
+            if not chunk:
+                raise MergeUnsupported(f"{info.filename}: truncated entry")
+            self.f.write(chunk)
+            left -= len(chunk)
+
+    def write(self, name, data, compress=True, align=0):
+        name = name.encode('utf-8')
+        crc = zlib.crc32(data)
+        if compress:
+            c = zlib.compressobj(9, zlib.DEFLATED, -15)
+            payload = c.compress(data) + c.flush()
+            method = zipfile.ZIP_DEFLATED
+        else:
+            payload, method = data, zipfile.ZIP_STORED
+        # 1981-01-01 00:00, as produced by the Android build tools
+        self._local_header(name, 0, method, 0, (1 << 9) | (1 << 5) | 1, crc, len(payload), len(data),
+                           align if method == zipfile.ZIP_STORED else 0)
+        self.f.write(payload)
+
+    def close(self):
+        cd_offset = self.f.tell()
+        for name, flags, method, dostime, dosdate, crc, csize, usize, offset in self.entries:
+            self.f.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, method, dostime, dosdate,
+                                     crc, csize, usize, len(name), 0, 0, 0, 0, 0, offset) + name)
+        cd_size = self.f.tell() - cd_offset
+        if len(self.entries) > 0xFFFF or cd_offset > 0xFFFFFFFF:
+            raise MergeUnsupported("Output needs ZIP64")
+        self.f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.entries), len(self.entries),
+                                 cd_size, cd_offset, 0))
+
+
+def _check_config_split(path, z):
+    """Raise MergeUnsupported unless `z` is a configuration split of the base module."""
+    if MANIFEST not in z.namelist():
+        raise MergeUnsupported(f"{os.path.basename(path)}: split has no AndroidManifest.xml")
+    info = manifest_info(z.read(MANIFEST))
+    split = info['split'] or ''
+    if not split.startswith('config.') or info['configForSplit'] or info['isFeatureSplit']:
+        raise MergeUnsupported(f"{os.path.basename(path)}: '{split}' is not a base configuration split")
+
+
+def _alignment(info):
+    if info.compress_type != zipfile.ZIP_STORED:
+        return 0
+    return SO_ALIGNMENT if info.filename.endswith('.so') else ALIGNMENT
+
+
+def merge_native(base_path, split_paths, output_path):
+    """Merge in-process; raises MergeUnsupported/ResourceError if the inputs need APKEditor."""
+    zips = [zipfile.ZipFile(p) for p in [base_path, *split_paths]]
+    try:
+        base = zips[0]
+        names = set(base.namelist())
+        for path, z in zip(split_paths, zips[1:]):
+            _check_config_split(path, z)
+        if MANIFEST not in names:
+            raise MergeUnsupported("Base APK has no AndroidManifest.xml")
+        manifest = patch_manifest(base.read(MANIFEST))
+
+        split_tables = [z.read(RESOURCES) for z in zips[1:] if RESOURCES in z.namelist()]
+        if RESOURCES in names:
+            resources = merge_resource_tables(base.read(RESOURCES), split_tables) if split_tables \
+                else base.read(RESOURCES)
+        elif split_tables:
+            raise MergeUnsupported("Splits have resources but the base has no resources.arsc")
+        else:
+            resources = None
+
+        tmp = str(output_path) + '.tmp'
+        with open(tmp, 'wb') as f:
+            out = _ZipWriter(f)
+            out.write(MANIFEST, manifest)
+            if resources is not None:
+                # Android R+ requires resources.arsc stored and 4-byte aligned
+                out.write(RESOURCES, resources, compress=False, align=ALIGNMENT)
+            for z in zips:
+                for info in z.infolist():
+                    name = info.filename
+                    if name in (MANIFEST, RESOURCES) or info.is_dir() or is_signature_file(name):
+                        continue
+                    if name.encode('utf-8') in out.names:
+                        if CODE_ENTRY.fullmatch(name):
+                            raise MergeUnsupported(f"{name} is in more than one input")
+                        continue  # The base (first) copy wins
+                    out.copy(z, info, _alignment(info))
+            out.close()
+        os.replace(tmp, output_path)
+    except (ResourceError, struct.error, IndexError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+        raise MergeUnsupported(str(e)) from e
+    finally:
+        for z in zips:
+            z.close()
+        if os.path.exists(str(output_path) + '.tmp'):
+            os.remove(str(output_path) + '.tmp')
+
+
+def merge_apks_with_apkeditor(base_path, split_paths, output_path):
+    """Use APKEditor to merge split APKs."""
+    apkeditor_jar = APKEDITOR_JAR
+    if not apkeditor_jar.exists():
+        raise FileNotFoundError(f"APKEditor.jar not found at {apkeditor_jar}")
+
+    work_dir = tempfile.mkdtemp(prefix='apk_merge_')
+    try:
+        # Link (or copy) the inputs into the directory APKEditor expects
+        for i, path in enumerate([base_path, *split_paths]):
+            dest = os.path.join(work_dir, 'base.apk' if i == 0 else f'split{i - 1}.apk')
+            try:
+                os.link(path, dest)
+            except OSError:
+                shutil.copy(path, dest)
+
+        # Run APKEditor merge
+        result = subprocess.run(
+            ['java', '-jar', str(apkeditor_jar), 'm', '-i', work_dir, '-o', str(output_path)],
+            capture_output=True, text=True, timeout=300
+        )
+
+        if result.returncode != 0:
+            raise Exception(f"APKEditor failed: {result.stderr}")
+
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def merge_apks(base_path, split_paths, output_path, native=True):
+    """Merge natively, falling back to APKEditor. Returns 'native' or 'apkeditor'."""
+    if native:
+        start = time.monotonic()
+        try:
+            merge_native(base_path, split_paths, output_path)
+            logger.info(f"Native merge of {len(split_paths)} splits took {time.monotonic() - start:.2f}s")
+            return 'native'
+        except MergeUnsupported as e:
+            logger.warning(f"Native merge not possible ({e}), using APKEditor")
+    merge_apks_with_apkeditor(base_path, split_paths, output_path)
+    return 'apkeditor'
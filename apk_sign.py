@@ -0,0 +1,313 @@
+"""
+GPlay Downloader - APK Signing
+Signs APKs in place with APK Signature Scheme v2 and v3
+
+The content digest is computed in one streaming pass (1 MiB chunks) and the
+APK Signing Block is written in place, just before the central directory,
+so signing never copies the APK (unless it is hardlinked elsewhere, which
+gets a private copy first). Apps that still install on Android < 7.0
+need a v1 (JAR) signature too; those, and keystores that cannot be read
+here (JKS), are handed to apksigner.
+"""
+import functools
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import zipfile
+from pathlib import Path
+
+from android_res import ResourceError, manifest_info
+from apk_merge import MANIFEST, is_signature_file
+
+DEBUG_KEYSTORE = Path(os.environ.get('GPLAY_KEYSTORE', Path.home() / '.android' / 'debug.keystore'))
+KEYSTORE_PASSWORD = os.environ.get('GPLAY_KEYSTORE_PASS', 'android')
+# PEM private key + certificate, used instead of the keystore when both are set
+SIGN_KEY = os.environ.get('GPLAY_SIGN_KEY')
+SIGN_CERT = os.environ.get('GPLAY_SIGN_CERT')
+
+CHUNK_SIZE = 1024 * 1024
+BLOCK_MAGIC = b'APK Sig Block 42'
+BLOCK_ALIGNMENT = 4096
+V2_BLOCK_ID = 0x7109871a
+V3_BLOCK_ID = 0xf05368c0
+PADDING_BLOCK_ID = 0x42726577
+STRIPPING_PROTECTION_ATTR_ID = 0xbeeff00d
+
+RSA_PKCS1_SHA256 = 0x0103
+RSA_PKCS1_SHA512 = 0x0104
+ECDSA_SHA256 = 0x0201
+ECDSA_SHA512 = 0x0202
+
+MIN_SDK_V2 = 24  # Android 7.0; older releases only check v1 signatures
+MIN_SDK_V3 = 28  # Android 9
+MAX_SDK = 0x7fffffff
+
+
+class SigningError(Exception):
+    pass
+
+
+class Signer:
+    """A private key and its certificate, with the v2/v3 algorithm apksigner would pick."""
+
+    def __init__(self, private_key, certificate, keystore=None, password=None):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = RSA_PKCS1_SHA512 if private_key.key_size > 3072 else RSA_PKCS1_SHA256
+        elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+            self.algorithm = ECDSA_SHA512 if private_key.curve.key_size > 256 else ECDSA_SHA256
+        else:
+            raise SigningError(f"Unsupported key type: {type(private_key).__name__}")
+        self.private_key = private_key
+        self.hash = hashlib.sha512 if self.algorithm in (RSA_PKCS1_SHA512, ECDSA_SHA512) else hashlib.sha256
+        self.certificate = certificate.public_bytes(serialization.Encoding.DER)
+        self.public_key = certificate.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        # Kept for the apksigner fallback
+        self.keystore = keystore
+        self.password = password
+
+    def sign(self, data):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, padding
+
+        digest = hashes.SHA512() if self.hash is hashlib.sha512 else hashes.SHA256()
+        if self.algorithm in (ECDSA_SHA256, ECDSA_SHA512):
+            return self.private_key.sign(data, ec.ECDSA(digest))
+        return self.private_key.sign(data, padding.PKCS1v15(), digest)
+
+
+def load_signer(keystore=None, password=None, key=None, cert=None):
+    """Load a PKCS#12 keystore, or a PEM key + certificate (password then unlocks the key)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.serialization import pkcs12
+
+    if key or cert:
+        if not (key and cert):
+            raise SigningError("A PEM key needs its certificate, and vice versa")
+        try:
+            private_key = serialization.load_pem_private_key(
+                Path(key).read_bytes(), password=password.encode() if password else None)
+            certificate = x509.load_pem_x509_certificate(Path(cert).read_bytes())
+        except (OSError, ValueError, TypeError) as e:
+            raise SigningError(f"Cannot load {key} / {cert}: {e}") from e
+        return Signer(private_key, certificate)
+
+    keystore = Path(keystore or DEBUG_KEYSTORE)
+    password = password or KEYSTORE_PASSWORD
+    if not keystore.exists():
+        raise SigningError(f"Keystore not found: {keystore}")
+    try:
+        private_key, certificate, _ = pkcs12.load_key_and_certificates(keystore.read_bytes(), password.encode())
+    except ValueError as e:
+        raise SigningError(f"Cannot read {keystore} (JKS keystores need apksigner): {e}") from e
+    if private_key is None or certificate is None:
+        raise SigningError(f"{keystore} has no private key entry")
+    return Signer(private_key, certificate, keystore, password)
+
+
+@functools.lru_cache(maxsize=1)
+def default_signer():
+    """GPLAY_SIGN_KEY/GPLAY_SIGN_CERT if set, else the debug keystore. Loaded once."""
+    if SIGN_KEY or SIGN_CERT:
+        return load_signer(key=SIGN_KEY, cert=SIGN_CERT)
+    return load_signer()
+
+
+def _zip_layout(f):
+    """(entries_end, cd_offset, cd_size) of an open APK.
+
+    entries_end is where the signing block goes: the central directory
+    offset, or the start of an existing signing block, which is replaced.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    tail_len = min(size, 22 + 0xFFFF)
+    f.seek(size - tail_len)
+    tail = f.read()
+    pos = tail.rfind(b'PK\x05\x06')
+    while pos >= 0 and pos + 22 + struct.unpack_from('<H', tail, pos + 20)[0] != len(tail):
+        pos = tail.rfind(b'PK\x05\x06', 0, pos)
+    if pos < 0:
+        raise SigningError("Not a ZIP file (no end of central directory)")
+    cd_size, cd_offset = struct.unpack_from('<II', tail, pos + 12)
+    if cd_offset == 0xFFFFFFFF or cd_offset + cd_size != size - tail_len + pos:
+        raise SigningError("ZIP64 or data between the central directory and its end record is not supported")
+
+    entries_end = cd_offset
+    if cd_offset >= 32:
+        f.seek(cd_offset - 24)
+        footer = f.read(24)
+        if footer[8:] == BLOCK_MAGIC:
+            entries_end = cd_offset - struct.unpack_from('<Q', footer)[0] - 8
+            if entries_end < 0:
+                raise SigningError("Corrupt APK Signing Block")
+    return entries_end, cd_offset, cd_size
+
+
+def _content_digest(hash_fn, f, entries_end, sections):
+    """The chunked digest of the entries (read from `f`) followed by in-memory `sections`."""
+    digests = []
+
+    def add(chunk):
+        h = hash_fn(b'\xa5' + struct.pack('<I', len(chunk)))
+        h.update(chunk)
+        digests.append(h.digest())
+
+    buf = bytearray(CHUNK_SIZE)
+    f.seek(0)
+    left = entries_end
+    while left:
+        n = f.readinto(memoryview(buf)[:min(CHUNK_SIZE, left)])
+        if not n:
+            raise SigningError("APK is truncated")
+        add(memoryview(buf)[:n])
+        left -= n
+    for section in sections:
+        for i in range(0, len(section), CHUNK_SIZE):
+            add(section[i:i + CHUNK_SIZE])
+    top = hash_fn(b'\x5a' + struct.pack('<I', len(digests)))
+    for d in digests:
+        top.update(d)
+    return top.digest()
+
+
+def _lp(data):
+    return struct.pack('<I', len(data)) + data
+
+
+def _lp_seq(items):
+    return _lp(b''.join(_lp(item) for item in items))
+
+
+def _signer_block(signer, digest, v3):
+    """One scheme's value: a sequence holding our single signer."""
+    digests = _lp_seq([struct.pack('<I', signer.algorithm) + _lp(digest)])
+    certs = _lp_seq([signer.certificate])
+    sdk_range = struct.pack('<II', MIN_SDK_V3, MAX_SDK)
+    if v3:
+        signed = digests + certs + sdk_range + _lp_seq([])
+    else:
+        # Lets v3-aware verifiers notice if the v3 block was stripped
+        signed = digests + certs + _lp_seq([struct.pack('<II', STRIPPING_PROTECTION_ATTR_ID, 3)])
+    signatures = _lp_seq([struct.pack('<I', signer.algorithm) + _lp(signer.sign(signed))])
+    return _lp_seq([_lp(signed) + (sdk_range if v3 else b'') + signatures + _lp(signer.public_key)])
+
+
+def _signing_block(pairs):
+    body = b''.join(struct.pack('<QI', len(value) + 4, block_id) + value for block_id, value in pairs)
+    # Pad to a page multiple, as apksigner does
+    pad = -(len(body) + 32) % BLOCK_ALIGNMENT
+    if pad:
+        if pad < 12:
+            pad += BLOCK_ALIGNMENT
+        body += struct.pack('<QI', pad - 8, PADDING_BLOCK_ID) + b'\0' * (pad - 12)
+    size = struct.pack('<Q', len(body) + 24)
+    return size + body + size + BLOCK_MAGIC
+
+
+def _unshare(apk_path):
+    """Give `apk_path` its own inode if it is hardlinked elsewhere, so writing it changes no other file."""
+    if os.stat(apk_path).st_nlink <= 1:
+        return
+    tmp = f'{apk_path}.{os.getpid()}.unshare'
+    try:
+        shutil.copy2(apk_path, tmp)
+        os.replace(tmp, apk_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sign_in_place(apk_path, signer):
+    """Add (or replace) the v2 and v3 signatures of `apk_path`."""
+    _unshare(apk_path)
+    with open(apk_path, 'r+b') as f:
+        entries_end, cd_offset, cd_size = _zip_layout(f)
+        f.seek(cd_offset)
+        cd = f.read(cd_size)
+        eocd = f.read()
+        # Digested as if the central directory started where the signing block will
+        digest = _content_digest(signer.hash, f, entries_end,
+                                 [cd, eocd[:16] + struct.pack('<I', entries_end) + eocd[20:]])
+        block = _signing_block([(V2_BLOCK_ID, _signer_block(signer, digest, v3=False)),
+                                (V3_BLOCK_ID, _signer_block(signer, digest, v3=True))])
+        f.seek(entries_end)
+        f.write(block + cd + eocd[:16] + struct.pack('<I', entries_end + len(block)) + eocd[20:])
+        f.truncate()
+
+
+def needs_v1(apk_path):
+    """Why the APK needs apksigner (a v1 signature), or None."""
+    try:
+        with zipfile.ZipFile(apk_path) as z:
+            if any(is_signature_file(name) for name in z.namelist()):
+                return "APK already has a v1 signature"
+            min_sdk = manifest_info(z.read(MANIFEST))['minSdkVersion']
+    except (KeyError, ResourceError, struct.error, zipfile.BadZipFile) as e:
+        return f"cannot read the manifest ({e})"
+    if min_sdk < MIN_SDK_V2:
+        return f"minSdkVersion {min_sdk} needs a v1 signature"
+    return None
+
+
+def sign_with_apksigner(apk_path, keystore, password, log=print):
+    """Sign an APK using apksigner (v1 included where the app needs it)."""
+    signed_path = str(apk_path) + '.signed'
+    cmd = [
+        'apksigner', 'sign',
+        '--ks', str(keystore),
+        '--ks-pass', f'pass:{password}',
+        '--key-pass', f'pass:{password}',
+        '--out', signed_path,
+        str(apk_path)
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+
+    if result.returncode == 0 and os.path.exists(signed_path):
+        os.replace(signed_path, apk_path)
+        return True
+    else:
+        log(f"Warning: Signing failed: {result.stderr}")
+        return False
+
+
+def sign_apk(apk_path, log=print, signer=None):
+    """Sign an APK in place, natively where possible. Returns True if it was signed."""
+    try:
+        signer = signer or default_signer()
+        reason = needs_v1(apk_path)
+    except (SigningError, ImportError) as e:
+        signer, reason = None, str(e)
+
+    if reason and shutil.which('apksigner'):
+        keystore = signer.keystore if signer else DEBUG_KEYSTORE
+        if keystore and Path(keystore).exists():
+            log(f"{reason}; signing with apksigner")
+            return sign_with_apksigner(apk_path, keystore, signer.password if signer else KEYSTORE_PASSWORD, log)
+    if signer is None:
+        log(f"Warning: {reason}, APK will be unsigned")
+        return False
+    if reason:
+        log(f"Warning: {reason} but apksigner is unavailable; signing with v2/v3 only (Android 7.0+)")
+
+    try:
+        sign_in_place(apk_path, signer)
+    except (SigningError, OSError) as e:
+        log(f"Warning: Signing failed: {e}")
+        return False
+    return True
+
+
+def verify_apk(apk_path):
+    """Run `apksigner verify`; returns (ok, output), or (None, message) without apksigner."""
+    if not shutil.which('apksigner'):
+        return None, "apksigner not found"
+    result = subprocess.run(['apksigner', 'verify', '-v', str(apk_path)], capture_output=True, text=True, timeout=60)
+    return result.returncode == 0, (result.stdout + result.stderr).strip()
@@ -0,0 +1,206 @@
+"""
+GPlay Downloader - Artifact Store
+Content-addressed APK cache keyed by the sha1 from the delivery response
+
+Objects live in <root>/objects/<aa>/<sha1> and are made read-only. Files
+only move in and out of the store as reflinks (copy-on-write) or copies,
+never hardlinks, so writing to an output APK can not change a stored
+object. The modification time doubles as the last-used time for LRU
+eviction.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+STORE_DIR = Path(os.environ.get('GPLAY_STORE_DIR', Path.home() / '.gplay-store'))
+STORE_MAX_BYTES = int(os.environ.get('GPLAY_STORE_MAX_BYTES', str(10 * 1024 ** 3)))
+
+# Linux FICLONE ioctl (btrfs/xfs/...); anything else falls back to a copy
+FICLONE = 0x40049409
+
+
+def _clone(src, dst):
+    """Reflink `src` to `dst`, or copy it; never shares an inode."""
+    if not _reflink(src, dst):
+        shutil.copyfile(src, dst)
+
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+class StoreWriter:
+    """Streams bytes into the store; `commit` only keeps them if the sha1 matches."""
+
+    def __init__(self, store, sha1):
+        self.store = store
+        self.sha1 = sha1
+        self.hash = hashlib.sha1()
+        self.size = 0
+        self.tmp = store.tmp_path()
+        self.file = open(self.tmp, 'wb')
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self.file.close()
+        if self.hash.hexdigest() != self.sha1:
+            os.remove(self.tmp)
+            return None
+        return self.store._commit(self.tmp, self.sha1, self.size)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+class ArtifactStore:
+    """Size-bounded, LRU-evicted store of verified artifacts."""
+
+    def __init__(self, root=STORE_DIR, max_bytes=STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path_for(self, sha1):
+        return self.root / 'objects' / sha1[:2] / sha1
+
+    def tmp_path(self):
+        tmp = self.root / 'tmp'
+        tmp.mkdir(parents=True, exist_ok=True)
+        return tmp / uuid.uuid4().hex
+
+    def lookup(self, sha1):
+        """Return the object path for `sha1` (marking it recently used) or None."""
+        if not sha1 or not self.enabled:
+            return None
+        path = self.path_for(sha1)
+        try:
+            if os.stat(path).st_nlink > 1:
+                # Hardlinked out by an older version: a user file shares the inode and may have changed it
+                os.remove(path)
+                raise FileNotFoundError(path)
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def materialize(self, sha1, dest):
+        """Place a writable copy of the object at `dest` (reflink, else copy). False on miss."""
+        src = self.lookup(sha1)
+        if not src:
+            return False
+        dest = str(dest)
+        if os.path.exists(dest):
+            os.remove(dest)
+        _clone(src, dest)
+        return True
+
+    def add(self, path, sha1):
+        """Add a reflink or copy of an already verified file; `path` itself is left alone."""
+        if not sha1 or not self.enabled:
+            return None
+        if self.path_for(sha1).exists():
+            return self.lookup(sha1)
+        tmp = self.tmp_path()
+        _clone(path, tmp)
+        return self._commit(tmp, sha1, os.path.getsize(tmp))
+
+    def writer(self, sha1):
+        return StoreWriter(self, sha1) if sha1 and self.enabled else None
+
+    def _commit(self, tmp, sha1, size):
+        dest = self.path_for(sha1)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, dest)
+        with self._lock:
+            if self._total is not None:
+                self._total += size
+            over = self._total is None or self._total > self.max_bytes
+        if over:
+            self.gc()
+        return dest
+
+    def _objects(self):
+        objects = self.root / 'objects'
+        if not objects.exists():
+            return []
+        entries = []
+        for path in objects.glob('*/*'):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def gc(self, max_bytes=None, tmp_age=3600):
+        """Evict least recently used objects until the store fits `max_bytes`.
+
+        Also removes abandoned temp files. Returns (objects removed, bytes freed).
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._objects())
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+
+        now = time.time()
+        tmp_dir = self.root / 'tmp'
+        for tmp in tmp_dir.glob('*') if tmp_dir.exists() else []:
+            try:
+                if now - tmp.stat().st_mtime > tmp_age:
+                    os.remove(tmp)
+            except OSError:
+                pass
+
+        with self._lock:
+            self._total = total
+        return removed, freed
+
+    def stats(self):
+        entries = self._objects()
+        return {'objects': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
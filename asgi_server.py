@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+GPlay Downloader - ASGI Server
+Same routes as server.py, served by asyncio with non-blocking upstream I/O
+
+Run with:  python server.py --asgi      (or GPLAY_SERVER=asgi)
+     or:   uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+
+Profiles, token pool and result caches are shared with server.py. Calls that
+must go through cloudscraper (dispenser, Play web pages, /api/download-url)
+run in the thread pool; FDFE and CDN traffic uses httpx.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from fdfe_client import AsyncFdfeClient
+from single_flight import AsyncSingleFlight
+from server import (
+    BASE_DEVICES, REGIONS, HAS_GPAPI, TOKEN_POOL, TOKEN_HEALTH, DETAILS_CACHE, DELIVERY_CACHE, STORE,
+    SEARCH_CACHE, INFO_CACHE,
+    DISPENSER_HEALTH, dispenser_racer, resolve_check, DETAILS_URL, PURCHASE_URL, DELIVERY_URL, BROWSER_HEADERS,
+    create_scraper_no_verify, get_profile, get_cached_auth, save_cached_auth,
+    fdfe_headers, parse_details, parse_delivery, get_cached_download_info, store_download_info,
+    search_apps, app_info, bulk_app_details, guess_filename, sse, BULK_MAX_PACKAGES,
+    PROXY_CHUNK_SIZE, proxy_headers, proxy_response_headers, log_relay, store_writer,
+    BUNDLES, register_bundle, bundle_stream, bundle_headers,
+    MERGE_FLIGHTS, MERGED, MERGED_FILES, merged_events, merge_params, public_event,
+)
+from download_engine import normalize_sha1
+from token_health import DEAD_STATUSES
+import metrics
+from metrics import PROXY_BYTES, PROXY_IN_FLIGHT, STREAM_SECONDS, TOKEN_CACHE, async_upstream_call
+
+logger = logging.getLogger(__name__)
+
+FDFE = AsyncFdfeClient()
+FLIGHTS = AsyncSingleFlight()
+INDEX_HTML = Path(__file__).parent / 'index.html'
+
+async def iterate_in_thread(iterator, maxsize=2):
+    """Iterate a blocking sync `iterator` on a thread of its own.
+
+    iterate_in_threadpool holds one of the shared limiter threads for every
+    next(), and merge and bundle streams can wait minutes for one item, so a
+    few dozen of them would starve run_in_threadpool. Here a dedicated
+    thread hands items over through an asyncio.Queue of `maxsize` and closes
+    the iterator once the consumer stops.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize)
+    closed = threading.Event()
+
+    def put(kind, value):
+        asyncio.run_coroutine_threadsafe(queue.put((kind, value)), loop).result()
+
+    def run():
+        try:
+            for item in iterator:
+                if closed.is_set(): break
+                put('item', item)
+            else:
+                put('done', None)
+        except Exception as e:
+            if not closed.is_set():
+                with contextlib.suppress(RuntimeError): put('error', e)  # RuntimeError: loop already closed
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close: close()
+
+    threading.Thread(target=run, name='asgi-stream', daemon=True).start()
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == 'error': raise value
+            if kind == 'done': return
+            yield value
+    finally:
+        closed.set()
+        while not queue.empty():  # Unblocks a put waiting for room
+            queue.get_nowait()
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that always closes its body iterator.
+
+    Starlette drops the iterator without closing it when sending fails
+    (ASGI 2.4 disconnects), so its cleanup would wait for garbage collection.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+# --- 1. CORE DOWNLOAD LOGIC ---
+
+async def get_download_info_internal(pkg, auth, reg_key, details=None):
+    if not HAS_GPAPI: return {'error': 'GPAPI missing'}
+
+    headers = fdfe_headers(auth, reg_key)
+
+    # A. DETAILS
+    if not details:
+        try:
+            r = await async_upstream_call('details', FDFE.get(f'{DETAILS_URL}?doc={pkg}', headers=headers,
+                                                              timeout=15))
+            TOKEN_HEALTH.observe(auth, r.status_code)
+            if r.status_code in DEAD_STATUSES: return {'error': f'Token rejected ({r.status_code})'}
+            details = parse_details(r.content)
+            if 'error' in details: return details
+        except Exception as e:
+            return {'error': f'Details failed: {e}'}
+    vc = details['versionCode']
+
+    # B. PURCHASE
+    try:
+        await async_upstream_call('purchase', FDFE.post(
+            PURCHASE_URL, headers={**headers, 'Content-Type': 'application/x-www-form-urlencoded'},
+            content=f'doc={pkg}&ot=1&vc={vc}', timeout=10))
+    except Exception: pass
+
+    # C. DELIVERY
+    try:
+        r = await async_upstream_call('delivery', FDFE.get(f'{DELIVERY_URL}?doc={pkg}&ot=1&vc={vc}',
+                                                           headers=headers, timeout=15))
+        TOKEN_HEALTH.observe(auth, r.status_code)
+        if r.status_code in DEAD_STATUSES: return {'error': f'Token rejected ({r.status_code})'}
+        return parse_delivery(r.content, pkg, details)
+    except Exception as e:
+        return {'error': f'Delivery failed: {e}'}
+
+async def resolve_download_info(pkg, auth, dev_key, reg_key):
+    details = DETAILS_CACHE.get((pkg, dev_key, reg_key))
+    res = await get_download_info_internal(pkg, auth, reg_key, details)
+    store_download_info(res, dev_key, reg_key)
+    return res
+
+async def resolve_events(pkg, dev_key, reg_key):
+    """Async twin of server.resolve_events."""
+    profile = get_profile(dev_key, reg_key)
+    cache_key = profile.key
+
+    # 1. Warm token from the pool
+    use_pool = not os.environ.get('GPLAY_AUTH_TOKEN')
+    pooled = TOKEN_POOL.acquire(cache_key) if use_pool else None
+    if use_pool: TOKEN_CACHE.inc(cache_key, 'pool', 'hit' if pooled else 'miss')
+    if pooled:
+        yield {'type':'progress','msg':'Using pooled token...'}
+        res = await resolve_download_info(pkg, pooled, dev_key, reg_key)
+        if 'error' not in res:
+            TOKEN_POOL.report_success(cache_key, pooled)
+            yield {'type':'success', **res}
+            return
+        TOKEN_POOL.report_failure(cache_key, pooled)
+        TOKEN_CACHE.inc(cache_key, 'pool', 'failure')
+        yield {'type':'progress','msg':'Pooled token failed, trying cached...'}
+
+    # 2. Cached (Env Var or File)
+    cached = await run_in_threadpool(get_cached_auth, cache_key)
+    TOKEN_CACHE.inc(cache_key, 'cached', 'hit' if cached else 'miss')
+    if cached:
+        yield {'type':'progress','msg':'Using cached/env token...'}
+        res = await resolve_download_info(pkg, cached, dev_key, reg_key)
+        if 'error' not in res:
+            if use_pool: TOKEN_POOL.add(cache_key, cached)
+            yield {'type':'success', **res}
+            return
+        TOKEN_CACHE.inc(cache_key, 'cached', 'failure')
+        yield {'type':'progress','msg':'Cached token failed, trying new...'}
+
+    # 3. Race the dispensers for a new token; the dispenser sits behind Cloudflare, so cloudscraper
+    #    and the racer's validating resolutions run in threads
+    racer = dispenser_racer(profile, resolve_check(pkg, dev_key, reg_key))
+    async for event in iterate_in_threadpool(racer.events()):
+        if event['type'] == 'token':
+            await run_in_threadpool(save_cached_auth, event['auth'], cache_key)
+            if use_pool: TOKEN_POOL.add(cache_key, event['auth'])
+            yield {'type':'success', **event['detail']}
+            return
+        if event['type'] == 'progress':
+            yield event
+
+    yield {'type':'error', 'msg':'Failed to find working token'}
+
+# --- 2. ROUTES ---
+
+async def index(request):
+    return FileResponse(INDEX_HTML)
+
+async def search(request):
+    q = request.query_params.get('q')
+    reg = request.query_params.get('region', 'il')
+    dev = request.query_params.get('device', 's23')
+    return JSONResponse(await run_in_threadpool(search_apps, q, reg, dev))
+
+async def info(request):
+    pkg = request.path_params['pkg']
+    reg = request.query_params.get('region', 'il')
+    return JSONResponse(await run_in_threadpool(app_info, pkg, reg))
+
+async def bulk(request):
+    try:
+        data = await request.json() if request.method == 'POST' else {}
+    except ValueError:
+        data = {}
+    params = request.query_params
+    packages = data.get('packages') or [p for p in params.get('packages', '').split(',') if p]
+    dev_key = data.get('device') or params.get('device', 's23')
+    reg_key = data.get('region') or params.get('region', 'il')
+    if dev_key not in BASE_DEVICES: dev_key = 's23'
+    if reg_key not in REGIONS: reg_key = 'il'
+    if not packages: return JSONResponse({'error': 'packages required'}, status_code=400)
+    if len(packages) > BULK_MAX_PACKAGES:
+        return JSONResponse({'error': f'At most {BULK_MAX_PACKAGES} packages'}, status_code=400)
+    # Chunks run on the shared sync client's thread pool
+    res = await run_in_threadpool(bulk_app_details, packages, dev_key, reg_key)
+    return JSONResponse(res, status_code=503 if 'error' in res else 200)
+
+async def stream(request):
+    pkg = request.path_params['pkg']
+    dev_key = request.query_params.get('device', 's23')
+    reg_key = request.query_params.get('region', 'il')
+    if dev_key not in BASE_DEVICES: dev_key = 's23'
+    if reg_key not in REGIONS: reg_key = 'il'
+
+    async def generate():
+        start = time.monotonic()
+        hit = get_cached_download_info(pkg, dev_key, reg_key)
+        if hit:
+            STREAM_SECONDS.observe(time.monotonic() - start, 'cached')
+            yield sse({'type':'success', **hit})
+            return
+        events = FLIGHTS.subscribe((pkg, dev_key, reg_key), lambda: resolve_events(pkg, dev_key, reg_key))
+        outcome = 'aborted'
+        try:
+            async for event in events:
+                if event['type'] != 'progress': outcome = event['type']
+                yield sse(event)
+        finally:
+            STREAM_SECONDS.observe(time.monotonic() - start, outcome)
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+async def proxy_dl(request):
+    url = request.query_params.get('url')
+    cookie = request.query_params.get('cookie')
+    name = request.query_params.get('name', 'file.apk')
+    sha1 = request.query_params.get('sha1')
+
+    # Store and file I/O stays off the event loop
+    cached = await run_in_threadpool(STORE.lookup, normalize_sha1(sha1))
+    if cached:
+        return FileResponse(cached, filename=name, media_type='application/vnd.android.package-archive')
+
+    headers = proxy_headers(request.headers, cookie)
+    try:
+        r = await async_upstream_call('proxy', FDFE.open_stream('GET', url, headers=headers, timeout=120))
+    except Exception as e:
+        return PlainTextResponse(str(e), status_code=500)
+    writer = await run_in_threadpool(store_writer, sha1, r.status_code, request.headers)
+
+    async def body():
+        # CPU time is shared by every stream on the event loop, so only wall time is logged
+        start = time.monotonic()
+        sent = 0
+        PROXY_IN_FLIGHT.inc()
+        try:
+            async for chunk in r.aiter_raw(PROXY_CHUNK_SIZE):
+                sent += len(chunk)
+                PROXY_BYTES.inc(amount=len(chunk))
+                if writer: await run_in_threadpool(writer.write, chunk)
+                yield chunk
+        finally:
+            PROXY_IN_FLIGHT.dec()
+            await r.aclose()
+            if writer: await run_in_threadpool(writer.commit)
+            log_relay(sent, time.monotonic() - start)
+
+    return StreamingResponse(body(), status_code=r.status_code,
+                             headers=proxy_response_headers(r.headers, name),
+                             media_type='application/vnd.android.package-archive')
+
+async def bundle_register(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    res, status = register_bundle(data)
+    return JSONResponse(res, status_code=status)
+
+async def bundle_download(request):
+    """Base + splits as one store-mode ZIP, streamed while the parts download."""
+    data = BUNDLES.get(request.path_params['bundle_id'])
+    if not data:
+        return JSONResponse({'error': 'Unknown or expired bundle'}, status_code=404)
+    # Parts are fetched on worker threads; the sync generator runs on its own thread and
+    # may be blocked waiting for a part, so a disconnect stops the downloads through `stop`
+    stop = threading.Event()
+
+    async def body():
+        try:
+            async for chunk in iterate_in_thread(bundle_stream(data, stop)):
+                yield chunk
+        finally:
+            stop.set()
+
+    return ClosingStreamingResponse(body(), headers=bundle_headers(data), media_type='application/zip')
+
+async def merged_stream(request):
+    """SSE progress of a server-side merge; `success` carries the /api/download-temp url."""
+    pkg = request.path_params['pkg']
+    dev_key, reg_key, arch = merge_params(request.query_params)
+
+    # Merge jobs are blocking work on the shared merge pool; the sync generator
+    # runs on its own thread so waiting for a job holds no thread pool slot
+    def generate():
+        for event in merged_events(pkg, dev_key, reg_key, arch):
+            yield sse(public_event(event))
+
+    return ClosingStreamingResponse(iterate_in_thread(generate()), media_type='text/event-stream')
+
+async def download_temp(request):
+    entry = MERGED_FILES.get(request.path_params['file_id'])
+    if not entry or not os.path.exists(entry['path']):
+        return JSONResponse({'error': 'Unknown or expired file'}, status_code=404)
+    return FileResponse(entry['path'], filename=entry['name'], media_type='application/vnd.android.package-archive')
+
+async def stats(request):
+    return JSONResponse({
+        'fdfe': FDFE.stats(),
+        'token_pool': TOKEN_POOL.stats(),
+        'dispensers': DISPENSER_HEALTH.stats(),
+        'token_health': TOKEN_HEALTH.stats(),
+        'details_cache': DETAILS_CACHE.stats(),
+        'search_cache': SEARCH_CACHE.stats(),
+        'info_cache': INFO_CACHE.stats(),
+        'delivery_cache': DELIVERY_CACHE.stats(),
+        'flights': FLIGHTS.stats(),
+        'artifact_store': STORE.stats(),
+        'merge_jobs': MERGE_FLIGHTS.stats(),
+        'merged_cache': MERGED.stats(),
+    })
+
+async def download_url(request):
+    """Download any file from URL via server"""
+    data = await request.json()
+    url = data.get('url')
+    filename = data.get('filename', 'download.apk')
+
+    if not url:
+        return JSONResponse({'error': 'URL required'}, status_code=400)
+
+    try:
+        logger.info(f"Downloading from URL: {url}")
+        scraper = create_scraper_no_verify()
+        r = await run_in_threadpool(scraper.get, url, headers=BROWSER_HEADERS, stream=True, timeout=60)
+        r.raise_for_status()
+        filename = guess_filename(url, r.headers, filename)
+
+        # Starlette iterates sync iterators in the thread pool
+        return StreamingResponse(
+            r.iter_content(chunk_size=8192),
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+            media_type=r.headers.get('content-type', 'application/octet-stream'),
+        )
+    except Exception as e:
+        logger.error(f"Download failed: {e}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await FDFE.close()
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/search', search),
+        Route('/api/info/{pkg:path}', info),
+        Route('/api/bulk-details', bulk, methods=['GET', 'POST']),
+        Route('/api/download-info-stream/{pkg:path}', stream),
+        Route('/proxy-download', proxy_dl),
+        Route('/api/bundle', bundle_register, methods=['POST']),
+        Route('/api/bundle/{bundle_id}', bundle_download),
+        Route('/api/download-merged-stream/{pkg:path}', merged_stream),
+        Route('/api/download-temp/{file_id}', download_temp),
+        Route('/api/stats', stats),
+        Route('/metrics', metrics_endpoint),
+        Route('/api/download-url', download_url, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Time the native split merge against APKEditor on the same inputs.
+
+Usage:
+    python bench/merge_bench.py base.apk split1.apk [split2.apk ...] [-n 5] [--json]
+
+Each method runs `-n` times into a temp dir; min/median/max wall time and
+the output size are reported. APKEditor is skipped if java or APKEditor.jar
+is missing.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from apk_merge import APKEDITOR_JAR, merge_apks_with_apkeditor, merge_native  # noqa: E402
+
+
+def bench(fn, base, splits, runs, work_dir):
+    times, size = [], 0
+    for i in range(runs):
+        out = os.path.join(work_dir, f'out{i}.apk')
+        start = time.perf_counter()
+        fn(base, splits, out)
+        times.append(time.perf_counter() - start)
+        size = os.path.getsize(out)
+        os.remove(out)
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times), 'size': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark native vs APKEditor split merging')
+    parser.add_argument('base', help='Base APK')
+    parser.add_argument('splits', nargs='+', help='Split APKs')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Runs per method (default: 5)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    methods = {'native': merge_native}
+    if shutil.which('java') and APKEDITOR_JAR.exists():
+        methods['apkeditor'] = merge_apks_with_apkeditor
+    else:
+        print("APKEditor skipped (java or APKEditor.jar missing)", file=sys.stderr)
+
+    inputs = sum(os.path.getsize(p) for p in [args.base, *args.splits])
+    results = {'inputs': len(args.splits) + 1, 'input_bytes': inputs, 'runs': args.runs}
+    with tempfile.TemporaryDirectory(prefix='merge_bench_') as work_dir:
+        for name, fn in methods.items():
+            results[name] = bench(fn, args.base, args.splits, args.runs, work_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{results['inputs']} inputs, {inputs / 1e6:.1f} MB, {args.runs} runs each")
+    print(f"{'method':<10} {'min':>8} {'median':>8} {'max':>8} {'output':>10}")
+    for name in methods:
+        r = results[name]
+        print(f"{name:<10} {r['min']:>7.3f}s {r['median']:>7.3f}s {r['max']:>7.3f}s {r['size'] / 1e6:>8.1f}MB")
+    if 'apkeditor' in results:
+        print(f"native is {results['apkeditor']['median'] / results['native']['median']:.1f}x faster (median)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the FDFE API, the token dispenser and the download CDN.
+
+Usage:
+    python bench/mock_upstream.py [-p 8099] [--latency-ms 80] [--bandwidth-mbps 200] [--apk-mb 20]
+
+Then point the server or CLI at it:
+    GPLAY_FDFE_URL=http://127.0.0.1:8099/fdfe GPLAY_DISPENSER_URL=http://127.0.0.1:8099/api/auth python3 server.py
+
+Every package exists. Details, purchase, delivery, bulkDetails, search and
+toc return ResponseWrapper protobufs; delivery points at /cdn/ URLs served
+by the mock itself as deterministic blobs with a matching sha1. With
+--replay DIR, a file named <endpoint>-<package>.bin or <endpoint>.bin in DIR
+(e.g. a captured details response) is served verbatim instead. API calls
+wait --latency-ms (the dispenser --dispenser-latency-ms); each CDN stream is
+throttled to --bandwidth-mbps. --error-rate makes that fraction of API calls
+fail (401 for FDFE, 429 for the dispenser).
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+VERSION_CODE = 1000
+SEND_CHUNK = 64 * 1024
+RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+AUTH = {
+    'authToken': 'mock-token', 'gsfId': '3f1e2d3c4b5a6978', 'email': 'mock@example.com', 'dfeCookie': '',
+    'deviceInfoProvider': {'userAgentString': 'Android-Finsky/41.2.29-23 (api=3,versionCode=84122900,sdk=34)'},
+}
+
+
+class MockUpstream:
+    """The mock server; `start()` runs it on a background thread and returns its base URL."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, dispenser_latency=0.0, bandwidth=0.0,
+                 apk_size=8 * 1024 * 1024, splits=2, split_size=1024 * 1024, error_rate=0.0, replay=None):
+        self.latency = latency
+        self.dispenser_latency = dispenser_latency
+        self.bandwidth = bandwidth * 1e6 / 8 if bandwidth else 0  # bytes/s per stream
+        self.apk_size = apk_size
+        self.splits = [f'config.split{i}' for i in range(splits)]
+        self.split_size = split_size
+        self.error_rate = error_rate
+        self.replay = Path(replay) if replay else None
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._blobs = {}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True, name='mock-upstream').start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def blob(self, size):
+        """Deterministic content of `size` bytes (shared by every package) and its sha1."""
+        with self._lock:
+            if size not in self._blobs:
+                data = (hashlib.sha256(str(size).encode()).digest() * (size // 32 + 1))[:size]
+                self._blobs[size] = (data, base64.urlsafe_b64encode(hashlib.sha1(data).digest()).decode().rstrip('='))
+            return self._blobs[size]
+
+    # --- Protobuf responses ---
+
+    def details(self, pkg):
+        from gpapi import googleplay_pb2
+
+        wrapper = googleplay_pb2.ResponseWrapper()
+        self._fill_doc(wrapper.payload.detailsResponse.docV2, pkg)
+        return wrapper.SerializeToString()
+
+    def _fill_doc(self, doc, pkg):
+        doc.docid = pkg
+        doc.docType = 1
+        doc.title = f'Mock {pkg}'
+        doc.creator = 'Mock Developer'
+        doc.details.appDetails.packageName = pkg
+        doc.details.appDetails.versionCode = VERSION_CODE
+        doc.details.appDetails.versionString = '1.0.0'
+        doc.details.appDetails.numDownloads = '1,000,000+'
+
+    def delivery(self, pkg):
+        from gpapi import googleplay_pb2
+
+        wrapper = googleplay_pb2.ResponseWrapper()
+        data = wrapper.payload.deliveryResponse.appDeliveryData
+        data.downloadSize = self.apk_size
+        data.downloadUrl = f'{self.url}/cdn/{pkg}/{VERSION_CODE}/base/{self.apk_size}'
+        data.sha1 = self.blob(self.apk_size)[1]
+        cookie = data.downloadAuthCookie.add()
+        cookie.name, cookie.value = 'MarketDA', 'mock'
+        for name in self.splits:
+            split = data.split.add()
+            split.name = name
+            split.size = self.split_size
+            split.sha1 = self.blob(self.split_size)[1]
+            split.downloadUrl = f'{self.url}/cdn/{pkg}/{VERSION_CODE}/{name}/{self.split_size}'
+        return wrapper.SerializeToString()
+
+    def bulk_details(self, body):
+        from gpapi import googleplay_pb2
+
+        req = googleplay_pb2.BulkDetailsRequest.FromString(body)
+        wrapper = googleplay_pb2.ResponseWrapper()
+        for pkg in req.docid:
+            self._fill_doc(wrapper.payload.bulkDetailsResponse.entry.add().doc, pkg)
+        return wrapper.SerializeToString()
+
+    def search(self, query, offset, page_size=20, pages=3):
+        from gpapi import googleplay_pb2
+
+        wrapper = googleplay_pb2.ResponseWrapper()
+        container = wrapper.payload.listResponse.doc.add()
+        slug = re.sub(r'[^a-z0-9]+', '', query.lower()) or 'app'
+        for i in range(offset, offset + page_size):
+            self._fill_doc(container.child.add(), f'com.mock.{slug}{i}')
+        if offset + page_size < page_size * pages:
+            container.containerMetadata.nextPageUrl = f'search?c=3&q={quote(query)}&o={offset + page_size}'
+        return wrapper.SerializeToString()
+
+    def toc(self):
+        from gpapi import googleplay_pb2
+
+        wrapper = googleplay_pb2.ResponseWrapper()
+        wrapper.payload.tocResponse.tosToken = 'mock'
+        return wrapper.SerializeToString()
+
+    def replayed(self, endpoint, pkg):
+        if not self.replay:
+            return None
+        names = [f'{endpoint}-{pkg}.bin'] if pkg else []
+        for path in (self.replay / name for name in names + [f'{endpoint}.bin']):
+            if path.exists():
+                return path.read_bytes()
+        return None
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=b'', content_type='application/x-protobuf'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def failing(self, status):
+                if mock.error_rate and random.random() < mock.error_rate:
+                    self.reply(status, b'')
+                    return True
+                return False
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path = urlsplit(self.path).path
+                if path == '/api/auth':
+                    mock.count('dispenser')
+                    time.sleep(mock.dispenser_latency)
+                    if not self.failing(429):
+                        self.reply(200, json.dumps(AUTH).encode(), 'application/json')
+                elif path == '/fdfe/purchase':
+                    self.api('purchase', None, lambda: b'')
+                elif path == '/fdfe/bulkDetails':
+                    self.api('bulkDetails', None, lambda: mock.bulk_details(body))
+                else:
+                    self.reply(404)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.startswith('/cdn/'):
+                    self.cdn(url.path)
+                elif url.path == '/fdfe/details':
+                    self.api('details', query.get('doc'), lambda: mock.details(query.get('doc', '')))
+                elif url.path == '/fdfe/delivery':
+                    self.api('delivery', query.get('doc'), lambda: mock.delivery(query.get('doc', '')))
+                elif url.path == '/fdfe/search':
+                    self.api('search', query.get('q'),
+                             lambda: mock.search(query.get('q', ''), int(query.get('o', 0))))
+                elif url.path == '/fdfe/toc':
+                    self.api('toc', None, mock.toc)
+                else:
+                    self.reply(404)
+
+            def api(self, endpoint, pkg, build):
+                mock.count(endpoint)
+                time.sleep(mock.latency)
+                if self.failing(401):
+                    return
+                self.reply(200, mock.replayed(endpoint, pkg) or build())
+
+            def cdn(self, path):
+                mock.count('cdn')
+                try:
+                    size = int(path.rsplit('/', 1)[1])
+                except ValueError:
+                    return self.reply(404)
+                data = mock.blob(size)[0]
+                start, end = 0, size - 1
+                m = RANGE.match(self.headers.get('Range', ''))
+                if m and (m.group(1) or m.group(2)):
+                    if m.group(1):
+                        start = int(m.group(1))
+                        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+                    else:
+                        start = max(size - int(m.group(2)), 0)
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/vnd.android.package-archive')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                began, sent = time.monotonic(), 0
+                try:
+                    for pos in range(start, end + 1, SEND_CHUNK):
+                        chunk = data[pos:min(pos + SEND_CHUNK, end + 1)]
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if mock.bandwidth:
+                            ahead = sent / mock.bandwidth - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local FDFE/dispenser/CDN stand-in for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay per FDFE call')
+    parser.add_argument('--dispenser-latency-ms', type=float, default=0, help='Delay per dispenser call')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help='Per-stream CDN rate (0: unlimited)')
+    parser.add_argument('--apk-mb', type=float, default=8, help='Base APK size')
+    parser.add_argument('--splits', type=int, default=2, help='Config splits per app')
+    parser.add_argument('--split-mb', type=float, default=1, help='Size of each split')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of API calls that fail')
+    parser.add_argument('--replay', metavar='DIR', help='Serve recorded <endpoint>[-<package>].bin payloads')
+    args = parser.parse_args()
+
+    mock = MockUpstream(args.host, args.port, args.latency_ms / 1000, args.dispenser_latency_ms / 1000,
+                        args.bandwidth_mbps, int(args.apk_mb * 1024 * 1024), args.splits,
+                        int(args.split_mb * 1024 * 1024), args.error_rate, args.replay)
+    print(f"Mock upstream on {mock.url}", file=sys.stderr)
+    print(f"  GPLAY_FDFE_URL={mock.url}/fdfe GPLAY_DISPENSER_URL={mock.url}/api/auth", file=sys.stderr)
+    try:
+        mock.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Time the Play page parser against the old regex extraction on saved pages.
+
+Usage:
+    python bench/parse_bench.py [fixtures...] [-n 200] [--json]
+    python bench/parse_bench.py --fetch-search whatsapp --fetch-details com.whatsapp
+
+Fixtures are HTML files named search-*.html or details-*.html (default:
+bench/fixtures/). The --fetch options download live pages into the fixture
+directory first. The bench reports time per page and the number of results
+each method found.
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from play_parser import parse_details, parse_search  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+# The extraction server.py used before play_parser, kept as the baseline
+def regex_search(html):
+    results = []
+    for m in re.finditer(r'href="/store/apps/details\?id=([^"]+)"[^>]*><div[^>]*>([^<]+)</div>', html):
+        if m.group(1) not in [x['package'] for x in results]:
+            results.append({'package': m.group(1), 'title': m.group(2)})
+    return results
+
+
+def regex_details(html):
+    title_m = re.search(r'<h1[^>]*>([^<]+)</h1>', html)
+    dev_m = re.search(r'<div[^>]*class="Vbfug "[^>]*><span[^>]*>([^<]+)</span>', html)
+    return {'title': title_m.group(1) if title_m else None, 'developer': dev_m.group(1) if dev_m else None}
+
+
+def fetch(url, dest):
+    import requests
+
+    r = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=30)
+    r.raise_for_status()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_text(r.text, encoding='utf-8')
+    print(f"Saved {dest} ({len(r.text) / 1e3:.0f} kB)", file=sys.stderr)
+
+
+def time_per_call(fn, html, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(html)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def found(result):
+    if isinstance(result, list):
+        return len(result)
+    return sum(v is not None for v in result.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Play page parsing')
+    parser.add_argument('fixtures', nargs='*', help='HTML files (default: bench/fixtures/*.html)')
+    parser.add_argument('-n', '--runs', type=int, default=200, help='Runs per page and method (default: 200)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--fetch-search', metavar='QUERY', action='append', default=[],
+                        help='Save the live search page for QUERY as a fixture first')
+    parser.add_argument('--fetch-details', metavar='PACKAGE', action='append', default=[],
+                        help='Save the live details page for PACKAGE as a fixture first')
+    parser.add_argument('--hl', default='en', help='Language for fetched pages (default: en)')
+    args = parser.parse_args()
+
+    for query in args.fetch_search:
+        fetch(f'https://play.google.com/store/search?q={query}&c=apps&hl={args.hl}',
+              FIXTURES / f"search-{re.sub(r'[^A-Za-z0-9]+', '_', query)}.html")
+    for package in args.fetch_details:
+        fetch(f'https://play.google.com/store/apps/details?id={package}&hl={args.hl}',
+              FIXTURES / f'details-{package}.html')
+
+    paths = [Path(p) for p in args.fixtures] or sorted(FIXTURES.glob('*.html'))
+    if not paths:
+        print(f"No fixtures in {FIXTURES}; save some with --fetch-search/--fetch-details", file=sys.stderr)
+        return 1
+
+    rows = []
+    for path in paths:
+        html = path.read_text(encoding='utf-8')
+        if path.name.startswith('details'):
+            methods = {'regex': regex_details, 'parser': lambda h, p=path.stem[8:]: parse_details(h, p or None)}
+        else:
+            methods = {'regex': regex_search, 'parser': parse_search}
+        row = {'page': path.name, 'bytes': len(html)}
+        for name, fn in methods.items():
+            seconds, result = time_per_call(fn, html, args.runs)
+            row[name] = {'ms': round(seconds * 1000, 3), 'found': found(result)}
+        rows.append(row)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    print(f"{'page':<36} {'kB':>6} {'regex ms':>9} {'found':>6} {'parser ms':>10} {'found':>6}")
+    for row in rows:
+        print(f"{row['page'][:36]:<36} {row['bytes'] / 1e3:>6.0f} {row['regex']['ms']:>9.3f} "
+              f"{row['regex']['found']:>6} {row['parser']['ms']:>10.3f} {row['parser']['found']:>6}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Measure server throughput offline, against bench/mock_upstream.py.
+
+Usage:
+    python bench/server_bench.py [-n 200] [-c 16] [--streams 8] [--latency-ms 50] [--asgi] [--json]
+
+Starts the mock upstream and the web server (Flask, or the ASGI app with
+--asgi) in this process, with GPLAY_FDFE_URL/GPLAY_DISPENSER_URL pointing at
+the mock and a throwaway HOME and artifact store. Then:
+
+- resolution: -n download-info streams for distinct packages over -c
+  connections (cold: dispenser + details/purchase/delivery), then the same
+  packages again (served from the result caches);
+- proxy: --streams concurrent /proxy-download transfers of the base APK.
+
+Reports resolutions/s with p50/p99 latency, aggregate proxy MB/s, and the
+process RSS growth per concurrent proxy stream (Linux only).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import requests  # noqa: E402
+
+from mock_upstream import MockUpstream  # noqa: E402
+
+
+def rss():
+    """Resident set size of this process in bytes, or None if /proc is unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Tracks peak RSS on a background thread while active."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = self.base = rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss() or 0)
+
+    def __enter__(self):
+        if self.base is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+
+
+def start_server(asgi):
+    """Import and serve the app on a free port; returns its base URL."""
+    if asgi:
+        import uvicorn
+        from asgi_server import app
+
+        config = uvicorn.Config(app, host='127.0.0.1', port=0, log_level='warning')
+        server = uvicorn.Server(config)
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+    else:
+        from werkzeug.serving import make_server
+        from server import app
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+    return f'http://127.0.0.1:{port}'
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def resolve(session, base, pkg):
+    """One download-info stream; returns (seconds, ok)."""
+    start = time.perf_counter()
+    with session.get(f'{base}/api/download-info-stream/{pkg}', stream=True, timeout=120) as r:
+        for line in r.iter_lines():
+            if line.startswith(b'data: '):
+                kind = json.loads(line[6:])['type']
+                if kind in ('success', 'error'):
+                    return time.perf_counter() - start, kind == 'success'
+    return time.perf_counter() - start, False
+
+
+def bench_resolutions(base, packages, concurrency):
+    local = threading.local()
+
+    def run(pkg):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return resolve(local.session, base, pkg)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, packages))
+    wall = time.perf_counter() - start
+    latencies = [seconds for seconds, _ in results]
+    return {
+        'requests': len(results), 'ok': sum(ok for _, ok in results), 'seconds': round(wall, 3),
+        'per_second': round(len(results) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def bench_proxy(base, mock, streams):
+    url = f'{base}/proxy-download?' + urlencode({
+        'url': f'{mock.url}/cdn/com.bench.proxy/1/base/{mock.apk_size}', 'cookie': 'MarketDA=mock'})
+
+    def transfer(_):
+        received = 0
+        with requests.get(url, stream=True, timeout=300) as r:
+            for chunk in r.iter_content(1024 * 1024):
+                received += len(chunk)
+        return received
+
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=streams) as pool:
+            total = sum(pool.map(transfer, range(streams)))
+        wall = time.perf_counter() - start
+    result = {'streams': streams, 'bytes': total, 'seconds': round(wall, 3),
+              'mb_per_second': round(total / 1e6 / wall, 1)}
+    if sampler.base is not None:
+        result['rss_per_stream_mb'] = round((sampler.peak - sampler.base) / 1e6 / streams, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline server benchmark against a mock upstream')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='Resolutions per phase (default: 200)')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='Concurrent resolutions (default: 16)')
+    parser.add_argument('--streams', type=int, default=8, help='Concurrent proxy transfers (default: 8)')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Mock FDFE latency (default: 50)')
+    parser.add_argument('--dispenser-latency-ms', type=float, default=300,
+                        help='Mock dispenser latency (default: 300)')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help='Mock CDN rate per stream (0: unlimited)')
+    parser.add_argument('--apk-mb', type=float, default=32, help='APK size for the proxy phase (default: 32)')
+    parser.add_argument('--asgi', action='store_true', help='Benchmark the ASGI server instead of Flask')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    mock = MockUpstream(latency=args.latency_ms / 1000, dispenser_latency=args.dispenser_latency_ms / 1000,
+                        bandwidth=args.bandwidth_mbps, apk_size=int(args.apk_mb * 1024 * 1024))
+    mock.start()
+    mock.blob(mock.apk_size)  # Built before the RSS baseline
+
+    work_dir = tempfile.mkdtemp(prefix='server_bench_')
+    os.environ.update({
+        'GPLAY_FDFE_URL': f'{mock.url}/fdfe', 'GPLAY_DISPENSER_URL': f'{mock.url}/api/auth',
+        'HOME': work_dir, 'GPLAY_STORE_DIR': os.path.join(work_dir, 'store'), 'GPLAY_STORE_MAX_BYTES': '0',
+    })
+    os.environ.pop('GPLAY_AUTH_TOKEN', None)
+    import logging
+    logging.disable(logging.INFO)
+    base = start_server(args.asgi)
+
+    packages = [f'com.bench.app{i}' for i in range(args.requests)]
+    results = {
+        'server': 'asgi' if args.asgi else 'flask',
+        'mock': {'latency_ms': args.latency_ms, 'dispenser_latency_ms': args.dispenser_latency_ms,
+                 'bandwidth_mbps': args.bandwidth_mbps, 'apk_mb': args.apk_mb},
+        'cold': bench_resolutions(base, packages, args.concurrency),
+        'cached': bench_resolutions(base, packages, args.concurrency),
+        'proxy': bench_proxy(base, mock, args.streams),
+        'upstream_calls': dict(sorted(mock.counts.items())),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"Server: {results['server']}   mock latency {args.latency_ms:.0f} ms, "
+          f"dispenser {args.dispenser_latency_ms:.0f} ms")
+    print(f"{'phase':<8} {'ok':>9} {'res/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for phase in ('cold', 'cached'):
+        r = results[phase]
+        print(f"{phase:<8} {r['ok']:>4}/{r['requests']:<4} {r['per_second']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f}")
+    p = results['proxy']
+    rss_note = f", {p['rss_per_stream_mb']:.2f} MB RSS per stream" if 'rss_per_stream_mb' in p else ''
+    print(f"proxy    {p['streams']} streams, {p['bytes'] / 1e6:.0f} MB at {p['mb_per_second']:.1f} MB/s{rss_note}")
+    print(f"upstream calls: {results['upstream_calls']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
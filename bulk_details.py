@@ -0,0 +1,79 @@
+"""
+GPlay Downloader - Bulk Details
+Resolves version info for many packages via the FDFE bulkDetails endpoint
+
+Packages are sent in chunks of BulkDetailsRequest docids; chunks run
+concurrently on the shared keep-alive client.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BULK_CHUNK_SIZE = int(os.environ.get('GPLAY_BULK_CHUNK_SIZE', '100'))
+BULK_WORKERS = int(os.environ.get('GPLAY_BULK_WORKERS', '4'))
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_request(packages):
+    from gpapi import googleplay_pb2
+
+    req = googleplay_pb2.BulkDetailsRequest()
+    req.docid.extend(packages)
+    req.includeChildDocs = False
+    return req.SerializeToString()
+
+
+def parse_response(content, packages):
+    """Map each requested package to {versionCode, version, title} or {error}.
+
+    Entries are matched by docid; unknown apps come back with an empty doc.
+    """
+    from gpapi import googleplay_pb2
+
+    wrapper = googleplay_pb2.ResponseWrapper()
+    wrapper.ParseFromString(content)
+    results = {pkg: {'error': 'App not found'} for pkg in packages}
+    for entry in wrapper.payload.bulkDetailsResponse.entry:
+        doc = entry.doc
+        if doc.docid not in results:
+            continue
+        if doc.details.appDetails.versionCode == 0:
+            results[doc.docid] = {'error': 'Incompatible/Restricted'}
+            continue
+        results[doc.docid] = {
+            'versionCode': doc.details.appDetails.versionCode,
+            'version': doc.details.appDetails.versionString,
+            'title': doc.title,
+        }
+    return results
+
+
+def fetch_chunk(client, url, headers, packages, limiter=None):
+    if limiter:
+        limiter.acquire()
+    try:
+        r = client.post(url, headers={**headers, 'Content-Type': 'application/x-protobuf'},
+                        data=build_request(packages), timeout=30)
+        if r.status_code != 200:
+            return {pkg: {'error': f'HTTP {r.status_code}'} for pkg in packages}
+        return parse_response(r.content, packages)
+    except Exception as e:
+        return {pkg: {'error': str(e)} for pkg in packages}
+
+
+def bulk_details(client, url, headers, packages, chunk_size=BULK_CHUNK_SIZE, workers=BULK_WORKERS,
+                 limiter=None):
+    """Resolve `packages` with one bulkDetails call per chunk, chunks in parallel.
+
+    Returns {package: {versionCode, version, title}} with {error} for packages
+    that could not be resolved. Duplicates are requested once.
+    """
+    packages = list(dict.fromkeys(packages))
+    results = {}
+    chunks = chunked(packages, max(1, chunk_size))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks) or 1))) as pool:
+        for part in pool.map(lambda chunk: fetch_chunk(client, url, headers, chunk, limiter), chunks):
+            results.update(part)
+    return {pkg: results[pkg] for pkg in packages}
@@ -0,0 +1,182 @@
+"""
+GPlay Downloader - Dispenser Racing
+Gets a working token by racing dispenser requests instead of trying them one by one
+
+Up to `parallel` attempts run at once, spread over the dispenser URLs
+(several attempts against one URL hedge against slow or bad tokens). The
+first token that passes `check` wins and the others are abandoned. A 429,
+5xx or network error puts that URL on exponential backoff with full jitter.
+DispenserHealth keeps a success score and latency per URL across races, so
+new attempts go to the healthiest dispenser first.
+"""
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+DISPENSER_PARALLEL = int(os.environ.get('GPLAY_DISPENSER_PARALLEL', '3'))
+DISPENSER_ATTEMPTS = int(os.environ.get('GPLAY_DISPENSER_ATTEMPTS', '7'))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+
+class DispenserHealth:
+    """Success score (EWMA of validated tokens), EWMA latency and backoff state per dispenser URL."""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, url):
+        s = self._stats.get(url)
+        if s is None:
+            s = self._stats[url] = {'score': 1.0, 'latency': None, 'throttled': 0, 'blocked_until': 0.0,
+                                    'tokens': 0, 'failures': 0}
+        return s
+
+    def record(self, url, ok, seconds, throttled=False):
+        """Record one attempt (ok=None: latency only); returns the backoff (seconds) now applied to `url`."""
+        with self._lock:
+            s = self._get(url)
+            if seconds is not None:
+                s['latency'] = seconds if s['latency'] is None else s['latency'] + self.alpha * (seconds - s['latency'])
+            if ok is not None:
+                s['score'] += self.alpha * ((1.0 if ok else 0.0) - s['score'])
+                s['tokens' if ok else 'failures'] += 1
+            if not throttled:
+                s['throttled'] = 0
+                return 0.0
+            s['throttled'] += 1
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** s['throttled']))
+            s['blocked_until'] = max(s['blocked_until'], time.monotonic() + delay)
+            return delay
+
+    def ready_in(self, url):
+        with self._lock:
+            return max(0.0, self._get(url)['blocked_until'] - time.monotonic())
+
+    def rank(self, url):
+        """Higher is better: success score per second of latency."""
+        with self._lock:
+            s = self._get(url)
+            return s['score'] / (1.0 + (s['latency'] or 0.0))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {url: {'score': round(s['score'], 3),
+                          'latency': round(s['latency'], 3) if s['latency'] is not None else None,
+                          'tokens': s['tokens'], 'failures': s['failures'],
+                          'backoff': round(max(0.0, s['blocked_until'] - now), 1)}
+                    for url, s in self._stats.items()}
+
+
+HEALTH = DispenserHealth()
+
+
+class TokenRacer:
+    """Race `attempts` dispenser requests, at most `parallel` at a time.
+
+    `post(url)` performs the dispenser request and returns a requests-style
+    response. `check(auth)` returns (ok, detail): detail is handed back with
+    a winning token (e.g. the result of the call that proved it works) or
+    names the reason it was rejected.
+    """
+
+    def __init__(self, urls, post, check, parallel=DISPENSER_PARALLEL, attempts=DISPENSER_ATTEMPTS, health=HEALTH):
+        self.urls = list(urls)
+        self.post = post
+        self.check = check
+        self.parallel = max(1, parallel)
+        self.attempts = max(1, attempts)
+        self.health = health
+
+    def _pick(self, in_flight):
+        """(url, seconds until it may be used): the healthiest ready URL, spreading hedged attempts."""
+        waits = {url: self.health.ready_in(url) for url in self.urls}
+        ready = [url for url in self.urls if waits[url] == 0]
+        if not ready:
+            url = min(self.urls, key=waits.get)
+            return url, waits[url]
+        return max(ready, key=lambda url: (-in_flight[url], self.health.rank(url))), 0.0
+
+    def _attempt(self, url, stop):
+        start = time.monotonic()
+        try:
+            r = self.post(url)
+        except Exception as e:
+            delay = self.health.record(url, False, time.monotonic() - start, throttled=True)
+            return {'error': f'network error ({str(e)[:40]}), backing off {delay:.1f}s'}
+        seconds = time.monotonic() - start
+        if r.status_code != 200:
+            throttled = r.status_code == 429 or r.status_code >= 500
+            delay = self.health.record(url, False, seconds, throttled=throttled)
+            backoff = f', backing off {delay:.1f}s' if throttled else ''
+            return {'error': f'dispenser returned {r.status_code}{backoff}'}
+        try:
+            auth = r.json()
+        except ValueError:
+            self.health.record(url, False, seconds)
+            return {'error': 'dispenser returned invalid JSON'}
+        if stop.is_set():
+            self.health.record(url, None, seconds)
+            return {'error': 'another token won'}
+        ok, detail = self.check(auth)
+        self.health.record(url, ok, seconds)
+        if ok:
+            return {'auth': auth, 'detail': detail}
+        return {'error': f'token rejected ({detail})'}
+
+    def events(self):
+        """Yield progress events, then {'type': 'token', auth, detail, url} or {'type': 'error', msg}."""
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix='dispenser')
+        pending = {}
+        in_flight = Counter()
+        started = 0
+        try:
+            while True:
+                next_ready = None
+                while started < self.attempts and len(pending) < self.parallel:
+                    url, delay = self._pick(in_flight)
+                    if delay > 0:
+                        if pending:
+                            next_ready = delay
+                            break
+                        yield {'type': 'progress', 'msg': f'Dispensers backing off, waiting {delay:.1f}s...'}
+                        time.sleep(delay)
+                    started += 1
+                    yield {'type': 'progress', 'msg': f'Generating Token #{started} ({urlsplit(url).netloc})...'}
+                    pending[pool.submit(self._attempt, url, stop)] = (started, url)
+                    in_flight[url] += 1
+                if not pending:
+                    yield {'type': 'error', 'msg': f'No working token after {started} attempts'}
+                    return
+                done, _ = wait(pending, timeout=next_ready, return_when=FIRST_COMPLETED)
+                for future in done:
+                    n, url = pending.pop(future)
+                    in_flight[url] -= 1
+                    outcome = future.result()
+                    if 'auth' in outcome:
+                        stop.set()
+                        yield {'type': 'token', 'auth': outcome['auth'], 'detail': outcome['detail'], 'url': url,
+                               'attempt': n}
+                        return
+                    yield {'type': 'progress', 'msg': f'Token #{n}: {outcome["error"]}'}
+        finally:
+            # Attempts still running finish in the background; their tokens are dropped
+            stop.set()
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def acquire(self):
+        """The winning token event, or None."""
+        for event in self.events():
+            if event['type'] == 'token':
+                return event
+        return None
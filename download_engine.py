@@ -0,0 +1,310 @@
+"""
+GPlay Downloader - Download Engine
+Concurrent, resumable base/split downloads with optional byte-range segmentation
+
+Files are written to `<path>.part` next to a `<path>.part.json` state record
+(URL, expected size, bytes done, sha1). A rerun with the same expected size
+and sha1 resumes with an HTTP Range request, even if the URL has changed.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CHUNK_SIZE = 1024 * 1024
+# Files smaller than this per segment are not worth splitting
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# How often (in bytes) the state record is rewritten while streaming
+STATE_EVERY = 8 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class UrlExpired(DownloadError):
+    """The signed download URL was rejected; resolve a fresh delivery and retry."""
+
+
+def normalize_sha1(value):
+    """Return a hex sha1 from the hex or base64(url) form FDFE uses, or None."""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        return value.hex() if len(value) == 20 else None
+    if len(value) == 40:
+        try:
+            return bytes.fromhex(value).hex()
+        except ValueError:
+            pass
+    try:
+        raw = base64.urlsafe_b64decode(value.replace('+', '-').replace('/', '_') + '=' * (-len(value) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    return raw.hex() if len(raw) == 20 else None
+
+
+class DownloadJob:
+    """One file to fetch: `url` -> `path`, with optional request headers."""
+
+    def __init__(self, url, path, headers=None, size=0, name=None, sha1=None):
+        self.url = url
+        self.path = str(path)
+        self.headers = headers or {}
+        self.size = size
+        self.name = name or os.path.basename(self.path)
+        self.sha1 = normalize_sha1(sha1)
+        self.cached = False
+
+    @property
+    def part_path(self):
+        return self.path + '.part'
+
+    @property
+    def state_path(self):
+        return self.path + '.part.json'
+
+    def load_state(self):
+        """Return the saved state if it describes this same artifact."""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != self.size or state.get('sha1') != self.sha1:
+            return None
+        if not os.path.exists(self.part_path):
+            return None
+        return state
+
+    def save_state(self, **extra):
+        state = {'url': self.url, 'size': self.size, 'sha1': self.sha1, **extra}
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def finish(self):
+        os.replace(self.part_path, self.path)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+    def discard(self):
+        for p in (self.part_path, self.state_path):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+class Progress:
+    """Aggregated byte counter shared by all workers."""
+
+    def __init__(self, total, callback=None):
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.done += n
+            done, total = self.done, self.total
+        if self.callback:
+            self.callback(done, total)
+
+
+def download_all(client, jobs, workers=4, segments=1, on_progress=None, store=None):
+    """Download `jobs` concurrently on at most `workers` threads.
+
+    With `segments > 1`, large files whose server honours Range requests are
+    fetched as that many byte ranges in parallel into a preallocated file.
+    `on_progress(done, total)` is called from worker threads. Jobs whose
+    final file already exists with the expected size are skipped. With an
+    ArtifactStore, jobs whose sha1 is stored are materialized from it and
+    finished downloads are added to it. Raises UrlExpired if a signed URL
+    was rejected, DownloadError on other failures.
+    """
+    progress = Progress(sum(job.size for job in jobs), on_progress)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(download_file, client, job, segments, progress, store) for job in jobs]
+        for future in as_completed(futures):
+            future.result()
+    return jobs
+
+
+def download_file(client, job, segments=1, progress=None, store=None):
+    progress = progress or Progress(job.size)
+    try:
+        if store and job.sha1 and store.materialize(job.sha1, job.path):
+            job.cached = True
+            progress.add(job.size)
+            return
+        fetched = _download_file(client, job, segments, progress)
+        if fetched and store and job.sha1:
+            store.add(job.path, job.sha1)
+    except DownloadError:
+        raise
+    except Exception as e:
+        raise DownloadError(f"{job.name}: {e}, rerun to resume") from e
+
+
+def _download_file(client, job, segments, progress):
+    """Fetch one job; returns False if an existing file was kept unverified."""
+    if job.size and os.path.exists(job.path) and os.path.getsize(job.path) == job.size:
+        progress.add(job.size)
+        return False
+    state = job.load_state()
+    if state and state.get('segments'):
+        return _download_segmented(client, job, job.size, state['segments'], progress)
+    if segments > 1 and not state:
+        total = probe_size(client, job)
+        if total and total >= segments * MIN_SEGMENT_SIZE:
+            step = -(-total // segments)
+            ranges = [[start, min(start + step, total) - 1, 0] for start in range(0, total, step)]
+            return _download_segmented(client, job, total, ranges, progress)
+    return _download_single(client, job, progress, resume=bool(state))
+
+
+def probe_size(client, job):
+    """Return the file size if the server supports byte ranges, else None."""
+    r = client.get(job.url, headers={**job.headers, 'Range': 'bytes=0-0'}, stream=True, timeout=30)
+    try:
+        _check_expired(job, r)
+        content_range = r.headers.get('Content-Range', '')
+        if r.status_code == 206 and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        return None
+    finally:
+        r.close()
+
+
+def _check_expired(job, r):
+    if r.status_code in (401, 403, 410):
+        raise UrlExpired(f"{job.name}: download URL rejected (HTTP {r.status_code})")
+
+
+def _verify(job, digest):
+    if job.sha1 and digest != job.sha1:
+        job.discard()
+        raise DownloadError(f"{job.name}: sha1 mismatch (expected {job.sha1}, got {digest})")
+
+
+def _download_single(client, job, progress, resume=False):
+    # Hash the bytes already on disk once, then keep hashing as we stream
+    sha1 = hashlib.sha1()
+    done = 0
+    if resume:
+        with open(job.part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha1.update(chunk)
+                done += len(chunk)
+
+    headers = {**job.headers, 'Range': f'bytes={done}-'} if done else job.headers
+    r = client.get(job.url, headers=headers, stream=True, timeout=120)
+    try:
+        _check_expired(job, r)
+        if done and r.status_code == 206:
+            mode = 'ab'
+            progress.add(done)
+        elif r.status_code == 200:
+            mode, done, sha1 = 'wb', 0, hashlib.sha1()
+        elif done and r.status_code == 416:
+            mode = None  # Already complete
+            progress.add(done)
+        else:
+            raise DownloadError(f"{job.name}: HTTP {r.status_code}")
+
+        if mode:
+            job.save_state(done=done)
+            unsaved = 0
+            with open(job.part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        sha1.update(chunk)
+                        done += len(chunk)
+                        unsaved += len(chunk)
+                        progress.add(len(chunk))
+                        if unsaved >= STATE_EVERY:
+                            f.flush()
+                            job.save_state(done=done)
+                            unsaved = 0
+    finally:
+        r.close()
+
+    if job.size and done != job.size:
+        job.save_state(done=done)
+        raise DownloadError(f"{job.name}: incomplete ({done} of {job.size} bytes), rerun to resume")
+    _verify(job, sha1.hexdigest())
+    job.finish()
+    return True
+
+
+def _download_segmented(client, job, total, ranges, progress):
+    """Fetch `ranges` ([start, end, done] triples) in parallel into the .part file.
+
+    Segments arrive out of order, so the sha1 is checked with one read pass
+    once every range is complete.
+    """
+    if not os.path.exists(job.part_path):
+        with open(job.part_path, 'wb') as f:
+            f.truncate(total)
+    lock = threading.Lock()
+    job.save_state(segments=ranges)
+    progress.add(sum(r[2] for r in ranges))
+
+    def save():
+        with lock:
+            job.save_state(segments=ranges)
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(_download_range, client, job, seg, progress, save)
+                   for seg in ranges if seg[0] + seg[2] <= seg[1]]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            save()
+
+    if job.sha1:
+        sha1 = hashlib.sha1()
+        with open(job.part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha1.update(chunk)
+        _verify(job, sha1.hexdigest())
+    job.finish()
+    return True
+
+
+def _download_range(client, job, seg, progress, save):
+    start, end, done = seg
+    headers = {**job.headers, 'Range': f'bytes={start + done}-{end}'}
+    r = client.get(job.url, headers=headers, stream=True, timeout=120)
+    try:
+        _check_expired(job, r)
+        if r.status_code != 206:
+            raise DownloadError(f"{job.name}: range {start}-{end} returned HTTP {r.status_code}")
+        unsaved = 0
+        with open(job.part_path, 'r+b') as f:
+            f.seek(start + done)
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    seg[2] += len(chunk)
+                    unsaved += len(chunk)
+                    progress.add(len(chunk))
+                    if unsaved >= STATE_EVERY:
+                        f.flush()
+                        save()
+                        unsaved = 0
+        if start + seg[2] != end + 1:
+            raise DownloadError(f"{job.name}: range {start}-{end} truncated, rerun to resume")
+    finally:
+        r.close()
@@ -0,0 +1,185 @@
+"""
+GPlay Downloader - FDFE Client
+Pooled keep-alive HTTP client shared by the server and the CLI
+"""
+import os
+import ssl
+import threading
+from http import cookiejar
+
+import requests
+import urllib3
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Connections kept open per host, and number of hosts kept in the pool manager
+POOL_SIZE = int(os.environ.get('GPLAY_POOL_SIZE', '16'))
+POOL_HOSTS = int(os.environ.get('GPLAY_POOL_HOSTS', '8'))
+# Seconds an API call waits for a free pooled connection before failing
+POOL_TIMEOUT = float(os.environ.get('GPLAY_POOL_TIMEOUT', '30'))
+
+
+class ConnectionStats:
+    """Thread-safe counters of new vs reused upstream connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.new_connections = 0
+        self.requests = 0
+
+    def record_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(self.requests - self.new_connections, 0),
+            }
+
+
+def _counting_pool(base, stats, pool_timeout=None):
+    """Build a connection pool class that reports into `stats`.
+
+    `pool_timeout` bounds how long a blocking pool waits for a free
+    connection (requests never passes one, so it would wait forever).
+    """
+    class CountingPool(base):
+        def urlopen(self, *args, **kwargs):
+            kwargs.setdefault('pool_timeout', pool_timeout)
+            return super().urlopen(*args, **kwargs)
+
+        def _new_conn(self):
+            stats.record_connection()
+            return super()._new_conn()
+
+        def _make_request(self, *args, **kwargs):
+            stats.record_request()
+            return super()._make_request(*args, **kwargs)
+
+    CountingPool.__name__ = f'Counting{base.__name__}'
+    return CountingPool
+
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter with SSL verification disabled and connection counting."""
+
+    def __init__(self, stats, pool_timeout=None, **kwargs):
+        self.stats = stats
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = ssl._create_unverified_context()
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.stats, self.pool_timeout),
+            'https': _counting_pool(HTTPSConnectionPool, self.stats, self.pool_timeout),
+        }
+
+
+class _NoCookies(cookiejar.DefaultCookiePolicy):
+    """Never store response cookies; the session is shared between users."""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class FdfeClient:
+    """Keep-alive session for FDFE (details/purchase/delivery) and CDN calls.
+
+    One instance is meant to be shared by every thread of the process. The
+    underlying pool holds at most `pool_size` connections per host and
+    `pool_hosts` hosts; with `block=True` extra API callers wait up to
+    `pool_timeout` seconds for a free connection instead of opening
+    throwaway ones. Streamed requests (`stream=True`: CDN downloads and
+    proxied transfers) can hold a connection for minutes, so they use a
+    separate pool of the same size that never blocks: once it is full,
+    extra streams get a connection that is closed after use.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, pool_hosts=POOL_HOSTS, block=True, timeout=30,
+                 pool_timeout=POOL_TIMEOUT):
+        self.timeout = timeout
+        self.connections = ConnectionStats()
+        self.session = self._session(pool_size, pool_hosts, block, pool_timeout)
+        self.stream_session = self._session(pool_size, pool_hosts, False, None)
+
+    def _session(self, pool_size, pool_hosts, block, pool_timeout):
+        session = requests.Session()
+        session.verify = False
+        session.cookies.set_policy(_NoCookies())
+        adapter = PooledHTTPAdapter(
+            self.connections,
+            pool_timeout=pool_timeout,
+            pool_connections=pool_hosts,
+            pool_maxsize=pool_size,
+            pool_block=block,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.stream_session if kwargs.get('stream') else self.session
+        return session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return self.connections.snapshot()
+
+    def close(self):
+        self.session.close()
+        self.stream_session.close()
+
+
+class AsyncFdfeClient:
+    """asyncio counterpart of FdfeClient for the ASGI server (needs httpx).
+
+    httpx only bounds the total number of connections, so the pool allows
+    `pool_size * pool_hosts` connections of which `pool_size` per host are
+    kept alive between requests.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, pool_hosts=POOL_HOSTS, timeout=30):
+        import httpx
+        limits = httpx.Limits(max_connections=pool_size * pool_hosts,
+                              max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(verify=False, limits=limits, timeout=timeout)
+        self.client.cookies.jar.set_policy(_NoCookies())
+        self.requests = 0
+
+    async def request(self, method, url, **kwargs):
+        self.requests += 1
+        return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def open_stream(self, method, url, **kwargs):
+        """Send a request without reading the body; the caller must `aclose()` it."""
+        self.requests += 1
+        request = self.client.build_request(method, url, **kwargs)
+        return await self.client.send(request, stream=True)
+
+    def stats(self):
+        return {'requests': self.requests}
+
+    async def close(self):
+        await self.client.aclose()
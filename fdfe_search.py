@@ -0,0 +1,104 @@
+"""
+GPlay Downloader - FDFE Search
+Searches apps through the authenticated protobuf search endpoint
+
+A search page is a list of container docs whose children are the apps; the
+container's nextPageUrl continues the listing. `iter_search()` yields apps
+page by page and only fetches the next page when the caller asks for more,
+so `islice(iter_search(...), 10)` costs a single request.
+"""
+import os
+from urllib.parse import quote
+
+SEARCH_MAX_PAGES = int(os.environ.get('GPLAY_SEARCH_MAX_PAGES', '5'))
+APP_DOC_TYPE = 1
+ICON_IMAGE_TYPE = 4
+
+
+class SearchError(Exception):
+    pass
+
+
+def search_url(base_url, query):
+    return f"{base_url}/search?c=3&q={quote(query)}"
+
+
+def app_result(doc):
+    """A search hit with the same keys as play_parser.parse_search, plus version info."""
+    app = doc.details.appDetails
+    icon = next((img.imageUrl for img in doc.image if img.imageType == ICON_IMAGE_TYPE), None)
+    return {
+        'package': doc.docid,
+        'title': doc.title,
+        'developer': doc.creator or None,
+        'icon': icon,
+        'rating': round(doc.aggregateRating.starRating, 2) if doc.HasField('aggregateRating') else None,
+        'installs': app.numDownloads or None,
+        'genre': app.appCategory[0] if app.appCategory else None,
+        'versionCode': app.versionCode or None,
+        'version': app.versionString or None,
+    }
+
+
+def _walk(docs, apps, next_urls):
+    for doc in docs:
+        if doc.docType == APP_DOC_TYPE and doc.docid:
+            apps.append(app_result(doc))
+        else:
+            if doc.containerMetadata.nextPageUrl:
+                next_urls.append(doc.containerMetadata.nextPageUrl)
+            _walk(doc.child, apps, next_urls)
+
+
+def parse_page(content):
+    """(apps, next page url or None) from one search response."""
+    from gpapi import googleplay_pb2
+
+    wrapper = googleplay_pb2.ResponseWrapper()
+    wrapper.ParseFromString(content)
+    if wrapper.commands.displayErrorMessage:
+        raise SearchError(wrapper.commands.displayErrorMessage)
+    # Without X-DFE-No-Prefetch the list arrives as the first prefetched response
+    if not wrapper.HasField('payload') and wrapper.preFetch:
+        wrapper = wrapper.preFetch[0].response
+    payload = wrapper.payload
+    apps, next_urls = [], []
+    _walk(payload.listResponse.doc, apps, next_urls)
+    _walk(payload.searchResponse.doc, apps, next_urls)
+    if payload.searchResponse.nextPageUrl:
+        next_urls.append(payload.searchResponse.nextPageUrl)
+    return apps, next_urls[0] if next_urls else None
+
+
+def iter_search(client, base_url, headers, query, max_pages=SEARCH_MAX_PAGES, limiter=None):
+    """Yield search hits for `query`, following nextPageUrl for up to `max_pages` pages.
+
+    Each package is yielded once. Raises SearchError if the first page
+    fails; a failing later page just ends the listing.
+    """
+    url = search_url(base_url, query)
+    seen = set()
+    for page in range(max(1, max_pages)):
+        if limiter:
+            limiter.acquire()
+        try:
+            r = client.get(url, headers=headers, timeout=15)
+            if r.status_code != 200:
+                raise SearchError(f"HTTP {r.status_code}")
+            apps, next_url = parse_page(r.content)
+        except SearchError:
+            if page == 0:
+                raise
+            return
+        except Exception as e:
+            if page == 0:
+                raise SearchError(str(e)) from e
+            return
+        for app in apps:
+            if app['package'] not in seen:
+                seen.add(app['package'])
+                yield app
+        if not next_url:
+            return
+        # nextPageUrl is relative to the fdfe root
+        url = next_url if next_url.startswith('http') else f"{base_url}/{next_url.lstrip('/')}"
@@ -20,14 +20,15 @@ Note: This uses anonymous authentication via AuroraOSS dispensers.
 
 import argparse
 import json
+import logging
 import os
 import sys
-import subprocess
-import tempfile
-import shutil
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
+from types import MappingProxyType
 from urllib.parse import urlencode
 
 try:
@@ -51,6 +52,20 @@ except ImportError:
 
 import ssl
 
+from fdfe_client import FdfeClient
+from download_engine import DownloadJob, DownloadError, UrlExpired, download_all
+from artifact_store import ArtifactStore
+from rate_limit import RateLimiter
+from bulk_details import bulk_details, BULK_CHUNK_SIZE, BULK_WORKERS
+from apk_merge import merge_apks
+from apk_sign import SigningError, load_signer, sign_apk, verify_apk
+from play_parser import parse_details, parse_search
+from fdfe_search import SearchError, iter_search
+from merge_worker import WORKER_ADDRESS, WORKER_PARALLEL, MergeClient, MergeWorker
+from dispenser import DISPENSER_ATTEMPTS, DISPENSER_PARALLEL, TokenRacer
+from token_health import toc_probe
+from profiles import token_headers
+
 # Create custom SSL context that doesn't verify certificates
 class NoVerifyHTTPAdapter(requests.adapters.HTTPAdapter):
     def init_poolmanager(self, *args, **kwargs):
@@ -66,16 +81,17 @@ def create_scraper_no_verify():
     scraper.mount('http://', adapter)
     return scraper
 
-# Default dispenser URLs for anonymous authentication
-DISPENSER_URLS = [
+# Default dispenser URLs for anonymous authentication (GPLAY_DISPENSER_URL: comma-separated override)
+DISPENSER_URLS = [u.strip() for u in os.environ.get('GPLAY_DISPENSER_URL', '').split(',') if u.strip()] or [
     "https://auroraoss.com/api/auth",
 ]
 
-# Google Play API endpoints
-FDFE_URL = "https://android.clients.google.com/fdfe"
+# Google Play API endpoints (GPLAY_FDFE_URL points them at e.g. bench/mock_upstream.py)
+FDFE_URL = os.environ.get('GPLAY_FDFE_URL', "https://android.clients.google.com/fdfe")
 PURCHASE_URL = f"{FDFE_URL}/purchase"
 DELIVERY_URL = f"{FDFE_URL}/delivery"
 DETAILS_URL = f"{FDFE_URL}/details"
+BULK_DETAILS_URL = f"{FDFE_URL}/bulkDetails"
 SEARCH_URL = f"{FDFE_URL}/search"
 
 # Default device properties (Pixel 7a)
@@ -121,6 +137,11 @@ DEFAULT_DEVICE = {
 AUTH_FILE = Path.home() / ".gplay-auth.json"
 SCRIPT_DIR = Path(__file__).parent
 
+# Shared keep-alive client for FDFE and CDN requests
+FDFE = FdfeClient()
+# Verified APKs by sha1, shared with the web server (GPLAY_STORE_DIR)
+STORE = ArtifactStore()
+
 # Architecture mapping
 ARCH_MAP = {
     'arm64': 'arm64-v8a',
@@ -131,66 +152,6 @@ ARCH_MAP = {
 }
 
 
-def merge_apks_with_apkeditor(base_path, split_paths, output_path):
-    """Use APKEditor to merge split APKs."""
-    apkeditor_jar = SCRIPT_DIR / 'APKEditor.jar'
-    if not apkeditor_jar.exists():
-        raise FileNotFoundError(f"APKEditor.jar not found at {apkeditor_jar}")
-
-    work_dir = tempfile.mkdtemp(prefix='apk_merge_')
-    try:
-        # Copy base APK
-        shutil.copy(base_path, os.path.join(work_dir, 'base.apk'))
-
-        # Copy split APKs
-        for i, split_path in enumerate(split_paths):
-            shutil.copy(split_path, os.path.join(work_dir, f'split{i}.apk'))
-
-        # Run APKEditor merge
-        result = subprocess.run(
-            ['java', '-jar', str(apkeditor_jar), 'm', '-i', work_dir, '-o', output_path],
-            capture_output=True, text=True, timeout=300
-        )
-
-        if result.returncode != 0:
-            raise Exception(f"APKEditor failed: {result.stderr}")
-
-        return True
-    finally:
-        shutil.rmtree(work_dir, ignore_errors=True)
-
-
-def sign_apk(apk_path):
-    """Sign an APK using apksigner with debug keystore."""
-    keystore = Path.home() / '.android' / 'debug.keystore'
-    if not keystore.exists():
-        print("Warning: Debug keystore not found, APK will be unsigned")
-        return False
-
-    if not shutil.which('apksigner'):
-        print("Warning: apksigner not found, APK will be unsigned")
-        return False
-
-    signed_path = str(apk_path) + '.signed'
-    cmd = [
-        'apksigner', 'sign',
-        '--ks', str(keystore),
-        '--ks-pass', 'pass:android',
-        '--key-pass', 'pass:android',
-        '--out', signed_path,
-        str(apk_path)
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-
-    if result.returncode == 0 and os.path.exists(signed_path):
-        os.replace(signed_path, apk_path)
-        return True
-    else:
-        print(f"Warning: Signing failed: {result.stderr}")
-        return False
-
-
 def format_size(size_bytes):
     """Format bytes to human readable size."""
     if not size_bytes:
@@ -202,12 +163,12 @@ def format_size(size_bytes):
     return f"{size_bytes:.2f} TB"
 
 
-def get_dispenser_auth(dispenser_url=None):
-    """Get anonymous authentication from dispenser."""
+def get_dispenser_auth(dispenser_url=None, parallel=DISPENSER_PARALLEL, attempts=DISPENSER_ATTEMPTS):
+    """Get a validated anonymous token by racing dispenser requests."""
     urls = [dispenser_url] if dispenser_url else DISPENSER_URLS
     
     # Check for proxy environment variables
-    proxies = {}
+    proxies = None
     if os.environ.get('HTTPS_PROXY') or os.environ.get('HTTP_PROXY'):
         https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('HTTP_PROXY')
         http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('HTTPS_PROXY')
@@ -216,31 +177,27 @@ def get_dispenser_auth(dispenser_url=None):
             'https': https_proxy,
         }
         print(f"Using proxy: {https_proxy}")
-    
-    for url in urls:
-        print(f"Authenticating via dispenser: {url}")
 
-        # Use cloudscraper to bypass Cloudflare protection
-        scraper = create_scraper_no_verify()
+    headers = {
+        'User-Agent': 'com.aurora.store-4.6.1-70',
+        'Content-Type': 'application/json',
+    }
 
-        headers = {
-            'User-Agent': 'com.aurora.store-4.6.1-70',
-            'Content-Type': 'application/json',
-        }
+    body = json.dumps(DEFAULT_DEVICE)
 
-        try:
-            response = scraper.post(url, json=DEFAULT_DEVICE, headers=headers, 
-                                   timeout=30, proxies=proxies if proxies else None)
-            response.raise_for_status()
-            data = response.json()
-            return data
-        except Exception as e:
-            print(f"Error: Failed to authenticate with {url}: {e}")
-            if url != urls[-1]:
-                print("Trying next dispenser...")
-                continue
-    
-    return None
+    def post(url):
+        # Use cloudscraper to bypass Cloudflare protection
+        return create_scraper_no_verify().post(url, data=body, headers=headers,
+                                               timeout=30, proxies=proxies)
+
+    print(f"Authenticating via {len(urls)} dispenser(s), {parallel} request(s) at a time")
+    racer = TokenRacer(urls, post, check_auth_token, parallel=parallel, attempts=attempts)
+    for event in racer.events():
+        if event['type'] == 'token':
+            print(f"✓ Token #{event['attempt']} validated (from {event['url']})")
+            return event['auth'], event['attempt']
+        print(event['msg'])
+    return None, None
 
 
 def save_auth(auth_data):
@@ -263,23 +220,26 @@ def load_auth():
         return None
 
 
+# Token-independent request headers, built once; only the token fields are filled in per request
+API_HEADERS = MappingProxyType({
+    'Accept-Language': 'en-US',
+    'X-DFE-Encoded-Targets': 'CAESN/qigQYC2AMBFfUbyA7SM5Ij/CvfBoIDgxXrBPsDlQUdMfOLAfoFrwEHgAcBrQYhoA0cGt4MKK0Y2gI',
+    'X-DFE-Client-Id': 'am-android-google',
+    'X-DFE-Network-Type': '4',
+    'X-DFE-Content-Filters': '',
+    'X-Limit-Ad-Tracking-Enabled': 'false',
+    'X-DFE-No-Prefetch': 'true',
+})
+PROTO_HEADERS = MappingProxyType({
+    **API_HEADERS,
+    'Content-Type': 'application/x-protobuf',
+    'Accept': 'application/x-protobuf',
+})
+
+
 def get_auth_headers(auth):
     """Build headers for Google Play API requests."""
-    device_info = auth.get('deviceInfoProvider', {})
-
-    return {
-        'Authorization': f"Bearer {auth.get('authToken')}",
-        'User-Agent': device_info.get('userAgentString', 'Android-Finsky/41.2.29-23'),
-        'X-DFE-Device-Id': auth.get('gsfId', ''),
-        'Accept-Language': 'en-US',
-        'X-DFE-Encoded-Targets': 'CAESN/qigQYC2AMBFfUbyA7SM5Ij/CvfBoIDgxXrBPsDlQUdMfOLAfoFrwEHgAcBrQYhoA0cGt4MKK0Y2gI',
-        'X-DFE-Client-Id': 'am-android-google',
-        'X-DFE-Network-Type': '4',
-        'X-DFE-Content-Filters': '',
-        'X-Limit-Ad-Tracking-Enabled': 'false',
-        'X-DFE-Cookie': auth.get('dfeCookie', ''),
-        'X-DFE-No-Prefetch': 'true',
-    }
+    return token_headers(API_HEADERS, auth)
 
 
 def api_request(auth, url, params=None, method='GET'):
@@ -288,9 +248,9 @@ def api_request(auth, url, params=None, method='GET'):
 
     try:
         if method == 'GET':
-            response = requests.get(url, headers=headers, params=params, timeout=30, verify=False)
+            response = FDFE.get(url, headers=headers, params=params)
         else:
-            response = requests.post(url, headers=headers, data=params, timeout=30, verify=False)
+            response = FDFE.post(url, headers=headers, data=params)
 
         return response
     except Exception as e:
@@ -298,67 +258,45 @@ def api_request(auth, url, params=None, method='GET'):
         return None
 
 
-def test_auth_token(auth):
-    """Test if an auth token works by making a simple API request."""
-    try:
-        headers = get_auth_headers(auth)
-        headers['Accept'] = 'application/x-protobuf'
-        
-        # Test with a common app
-        test_app = 'com.google.android.youtube'
-        resp = requests.get(f'{DETAILS_URL}?doc={test_app}', headers=headers, timeout=10, verify=False)
-        
-        if resp.status_code == 200:
-            print(f"✓ Token validated successfully")
-            return True
-        else:
-            print(f"✗ Token validation failed: status={resp.status_code}")
-            return False
-    except Exception as e:
-        print(f"✗ Token validation error: {e}")
-        return False
+def check_auth_token(auth):
+    """Test if an auth token works with a cheap FDFE toc request; returns (ok, detail)."""
+    ok = toc_probe(FDFE, FDFE_URL, get_proto_headers(auth))
+    if ok is None:
+        return False, 'toc request failed'
+    return ok, 'ok' if ok else 'rejected'
 
 
 def cmd_auth(args):
     """Authenticate with Google Play."""
-    max_attempts = getattr(args, 'max_attempts', 1)
-    
-    for attempt in range(1, max_attempts + 1):
-        if max_attempts > 1:
-            print(f"\n=== Attempt {attempt}/{max_attempts} ===")
-        
-        # Add random delay between attempts to avoid rate limiting
-        if attempt > 1:
-            delay = random.uniform(1, 3)
-            print(f"Waiting {delay:.1f}s before retry...")
-            time.sleep(delay)
-        
-        auth_data = get_dispenser_auth(args.dispenser)
-
-        if not auth_data:
-            if attempt < max_attempts:
-                print("Failed to get token, retrying...")
-                continue
-            print("Authentication failed!")
-            return 1
+    auth_data, attempt = get_dispenser_auth(args.dispenser, args.parallel, args.max_attempts)
+    if not auth_data:
+        print("Authentication failed!")
+        return 1
 
-        email = auth_data.get('email', 'unknown')
-        print(f"Got auth token for: {email}")
-        
-        # Validate the token
-        print("Validating token...")
-        if not test_auth_token(auth_data):
-            if attempt < max_attempts:
-                print("Token validation failed, retrying...")
-                continue
-            print("Token validation failed!")
-            return 1
+    email = auth_data.get('email', 'unknown')
+    print(f"Got auth token for: {email}")
+    save_auth(auth_data)
+    print(f"✓ Authentication successful on attempt {attempt}!")
+    return 0
+
+
+def print_search_result(count, app):
+    print(f"{count}. {app['title'] or app['package']}")
+    print(f"   Package: {app['package']}")
+    details = [v for v in (app['developer'], app['rating'] and f"{app['rating']:.1f}★", app['installs'],
+                           app.get('version') and f"v{app['version']}") if v]
+    if details:
+        print(f"   {' · '.join(details)}")
+    print()
 
-        save_auth(auth_data)
-        print(f"✓ Authentication successful on attempt {attempt}!")
-        return 0
-    
-    return 1
+
+def web_search(query):
+    """Search results scraped from the Play web page (fallback for FDFE search)."""
+    scraper = create_scraper_no_verify()
+    response = scraper.get(f"https://play.google.com/store/search?q={query}&c=apps", timeout=30)
+    if response.status_code != 200:
+        raise SearchError(f"web search returned {response.status_code}")
+    return parse_search(response.text)
 
 
 def cmd_search(args):
@@ -369,50 +307,25 @@ def cmd_search(args):
 
     print(f"Searching for: {args.query}")
 
-    # Use web search as fallback (more reliable)
+    # Results print as pages arrive; later pages are only fetched if --limit needs them
+    count = 0
     try:
-        scraper = create_scraper_no_verify()
-        search_url = f"https://play.google.com/store/search?q={args.query}&c=apps"
-
-        response = scraper.get(search_url, timeout=30)
-
-        if response.status_code != 200:
-            print(f"Search failed with status {response.status_code}")
-            return 1
-
-        # Parse basic info from HTML (limited but works without protobuf)
-        import re
-
-        # Find app links
-        pattern = r'href="/store/apps/details\?id=([^"&]+)"[^>]*>([^<]*)</a>'
-        matches = re.findall(pattern, response.text)
-
-        if not matches:
-            # Try alternative pattern
-            pattern = r'data-docid="([^"]+)"'
-            package_matches = re.findall(pattern, response.text)
-            if package_matches:
-                matches = [(pkg, pkg) for pkg in set(package_matches)]
-
-        if not matches:
-            print("No results found (try 'gplay info <package>' directly)")
-            return 0
-
-        seen = set()
-        count = 0
-        for package, title in matches:
-            if package not in seen and count < args.limit:
-                seen.add(package)
+        for app in islice(iter_search(FDFE, FDFE_URL, get_proto_headers(auth), args.query), args.limit):
+            count += 1
+            print_search_result(count, app)
+    except SearchError as e:
+        print(f"API search failed ({e}), falling back to web search")
+        try:
+            for app in web_search(args.query)[:args.limit]:
                 count += 1
-                display_title = title.strip() if title.strip() else package
-                print(f"{count}. {display_title}")
-                print(f"   Package: {package}")
-                print()
+                print_search_result(count, app)
+        except Exception as e:
+            print(f"Search error: {e}")
+            return 1
 
-        return 0
-    except Exception as e:
-        print(f"Search error: {e}")
-        return 1
+    if not count:
+        print("No results found (try 'gplay info <package>' directly)")
+    return 0
 
 
 def cmd_info(args):
@@ -438,34 +351,22 @@ def cmd_info(args):
             print(f"Failed to fetch app info: {response.status_code}")
             return 1
 
-        import re
-
-        # Extract app info from HTML
-        html = response.text
-
-        # Title
-        title_match = re.search(r'<h1[^>]*>([^<]+)</h1>', html)
-        title = title_match.group(1) if title_match else args.package
-
-        # Developer
-        dev_match = re.search(r'<a[^>]*href="/store/apps/developer[^"]*"[^>]*>([^<]+)</a>', html)
-        developer = dev_match.group(1) if dev_match else "Unknown"
+        info = parse_details(response.text, args.package)
+        rating = f"{info['rating']:.1f}" if info['rating'] is not None else "N/A"
+        if info['ratings']:
+            rating += f" ({info['ratings']:,} ratings)"
 
-        # Rating
-        rating_match = re.search(r'(\d+\.\d+)\s*star', html, re.IGNORECASE)
-        rating = rating_match.group(1) if rating_match else "N/A"
-
-        # Downloads
-        downloads_match = re.search(r'>(\d+[KMB+,\d]*)\s*downloads<', html, re.IGNORECASE)
-        if not downloads_match:
-            downloads_match = re.search(r'>([\d,]+\+?)\s*Downloads<', html)
-        downloads = downloads_match.group(1) if downloads_match else "N/A"
-
-        print(f"Name: {title}")
+        print(f"Name: {info['title'] or args.package}")
         print(f"Package: {args.package}")
-        print(f"Developer: {developer}")
+        print(f"Developer: {info['developer'] or 'Unknown'}")
         print(f"Rating: {rating}")
-        print(f"Downloads: {downloads}")
+        print(f"Downloads: {info['installs'] or 'N/A'}")
+        if info['version']:
+            print(f"Version: {info['version']}")
+        if info['updated']:
+            print(f"Updated: {time.strftime('%Y-%m-%d', time.gmtime(info['updated']))}")
+        if info['genre']:
+            print(f"Category: {info['genre']}")
         print()
         print(f"Play Store URL: https://play.google.com/store/apps/details?id={args.package}")
 
@@ -475,6 +376,127 @@ def cmd_info(args):
         return 1
 
 
+def get_app_details(package, headers, log=print):
+    """Return the app's DocV2 from the details endpoint, or None."""
+    from gpapi import googleplay_pb2
+
+    log("Getting app details...")
+    details_url = f"{DETAILS_URL}?doc={package}"
+    response = FDFE.get(details_url, headers=headers)
+
+    if response.status_code != 200:
+        log(f"Failed to get app details: {response.status_code}")
+        log("The app might not be available in your region or device profile.")
+        return None
+
+    # Parse details response
+    details_response = googleplay_pb2.ResponseWrapper()
+    details_response.ParseFromString(response.content)
+
+    if not details_response.payload.detailsResponse.docV2.docid:
+        log("App not found or not available.")
+        return None
+
+    return details_response.payload.detailsResponse.docV2
+
+
+def get_delivery_data(package, version_code, headers, log=print):
+    """Purchase (acquire) the app and return its AndroidAppDeliveryData, or None."""
+    from gpapi import googleplay_pb2
+
+    log("Acquiring app...")
+    purchase_headers = headers.copy()
+    purchase_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+    purchase_data = f"doc={package}&ot=1&vc={version_code}"
+
+    purchase_response = FDFE.post(
+        PURCHASE_URL,
+        headers=purchase_headers,
+        data=purchase_data,
+    )
+
+    if purchase_response.status_code not in [200, 204]:
+        log(f"Failed to acquire app: {purchase_response.status_code}")
+        # Try to continue anyway - might already be "purchased"
+
+    log("Getting download URL...")
+    delivery_url = f"{DELIVERY_URL}?doc={package}&ot=1&vc={version_code}"
+    delivery_response = FDFE.get(delivery_url, headers=headers)
+
+    if delivery_response.status_code != 200:
+        log(f"Failed to get download URL: {delivery_response.status_code}")
+        return None
+
+    # Parse delivery response
+    delivery_wrapper = googleplay_pb2.ResponseWrapper()
+    delivery_wrapper.ParseFromString(delivery_response.content)
+
+    delivery_data = delivery_wrapper.payload.deliveryResponse.appDeliveryData
+
+    if not delivery_data.downloadUrl:
+        log("No download URL available.")
+        log("The app might require purchase or not be available for this device.")
+        return None
+
+    return delivery_data
+
+
+def build_download_jobs(package, version_code, delivery_data, output_dir):
+    """One DownloadJob for the base APK (first) and one per split."""
+    # Main APK, with cookies if provided
+    download_headers = {}
+    for cookie in delivery_data.downloadAuthCookie:
+        download_headers['Cookie'] = f"{cookie.name}={cookie.value}"
+
+    jobs = [DownloadJob(delivery_data.downloadUrl, output_dir / f"{package}-{version_code}.apk",
+                        download_headers, delivery_data.downloadSize, sha1=delivery_data.sha1)]
+
+    # Split APKs if any
+    for i, split in enumerate(delivery_data.split):
+        if split.downloadUrl:
+            split_name = split.name if split.name else f"split{i}"
+            jobs.append(DownloadJob(split.downloadUrl, output_dir / f"{package}-{version_code}-{split_name}.apk",
+                                    size=split.size, sha1=split.sha1))
+    return jobs
+
+
+def merge_downloaded(package, version_code, filepath, split_files, output_dir, log=print, worker=None):
+    """Merge base + splits into one signed APK and remove the parts.
+
+    With `worker` (a MergeClient) the job runs in the merge worker process.
+    Returns (merged path, timing dict).
+    """
+    merged_filepath = output_dir / f"{package}-{version_code}-merged.apk"
+    if worker:
+        result = worker.merge(filepath, split_files, merged_filepath)
+        if result['status'] != 'ok':
+            raise Exception(result['error'])
+        timing = {k: result[k] for k in ('method', 'merge_seconds', 'sign_seconds', 'queue_seconds') if k in result}
+        log(f"Merged: {merged_filepath} ({timing['method']}, {timing['merge_seconds']:.2f}s, "
+            f"queued {timing['queue_seconds']:.2f}s)")
+        if result.get('signed'):
+            log("APK signed successfully")
+    else:
+        start = time.monotonic()
+        method = merge_apks(filepath, split_files, merged_filepath)
+        timing = {'method': method, 'merge_seconds': round(time.monotonic() - start, 3)}
+        log(f"Merged: {merged_filepath} ({method}, {timing['merge_seconds']:.2f}s)")
+
+        log("Signing merged APK...")
+        start = time.monotonic()
+        if sign_apk(merged_filepath, log=log):
+            log("APK signed successfully")
+        timing['sign_seconds'] = round(time.monotonic() - start, 3)
+
+    # Clean up individual files
+    log("Cleaning up split files...")
+    os.remove(filepath)
+    for sf in split_files:
+        os.remove(sf)
+    return merged_filepath, timing
+
+
 def cmd_download(args):
     """Download APK."""
     auth = load_auth()
@@ -491,154 +513,69 @@ def cmd_download(args):
         print("Will merge split APKs into single APK")
 
     try:
-        from gpapi import googleplay_pb2
-
-        headers = get_auth_headers(auth)
-        headers['Content-Type'] = 'application/x-protobuf'
-        headers['Accept'] = 'application/x-protobuf'
+        headers = get_proto_headers(auth)
 
         # Step 1: Get app details via protobuf
-        print("Getting app details...")
-        details_url = f"{DETAILS_URL}?doc={package}"
-        response = requests.get(details_url, headers=headers, timeout=30, verify=False)
-
-        if response.status_code != 200:
-            print(f"Failed to get app details: {response.status_code}")
-            print("The app might not be available in your region or device profile.")
+        app = get_app_details(package, headers)
+        if not app:
             return 1
-
-        # Parse details response
-        details_response = googleplay_pb2.ResponseWrapper()
-        details_response.ParseFromString(response.content)
-
-        if not details_response.payload.detailsResponse.docV2.docid:
-            print("App not found or not available.")
-            return 1
-
-        app = details_response.payload.detailsResponse.docV2
         version_code = args.version or app.details.appDetails.versionCode
 
         print(f"App: {app.title}")
         print(f"Version: {app.details.appDetails.versionString} ({version_code})")
         print()
 
-        # Step 2: Purchase (acquire free app)
-        print("Acquiring app...")
-        purchase_headers = headers.copy()
-        purchase_headers['Content-Type'] = 'application/x-www-form-urlencoded'
-
-        purchase_data = f"doc={package}&ot=1&vc={version_code}"
-
-        purchase_response = requests.post(
-            PURCHASE_URL,
-            headers=purchase_headers,
-            data=purchase_data,
-            timeout=30,
-            verify=False
-        )
-
-        if purchase_response.status_code not in [200, 204]:
-            print(f"Failed to acquire app: {purchase_response.status_code}")
-            # Try to continue anyway - might already be "purchased"
-
-        # Step 3: Get delivery URL
-        print("Getting download URL...")
-        delivery_url = f"{DELIVERY_URL}?doc={package}&ot=1&vc={version_code}"
-        delivery_response = requests.get(delivery_url, headers=headers, timeout=30, verify=False)
-
-        if delivery_response.status_code != 200:
-            print(f"Failed to get download URL: {delivery_response.status_code}")
+        # Steps 2-3: Purchase (acquire free app) and get delivery URL
+        delivery_data = get_delivery_data(package, version_code, headers)
+        if not delivery_data:
             return 1
 
-        # Parse delivery response
-        delivery_wrapper = googleplay_pb2.ResponseWrapper()
-        delivery_wrapper.ParseFromString(delivery_response.content)
-
-        delivery_data = delivery_wrapper.payload.deliveryResponse.appDeliveryData
-
-        if not delivery_data.downloadUrl:
-            print("No download URL available.")
-            print("The app might require purchase or not be available for this device.")
-            return 1
-
-        download_url = delivery_data.downloadUrl
-        download_size = delivery_data.downloadSize
-        sha1 = delivery_data.sha1
-
-        print(f"Download size: {format_size(download_size)}")
+        print(f"Download size: {format_size(delivery_data.downloadSize)}")
 
         # Create output directory
         output_dir = Path(args.output)
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Download main APK
-        filename = f"{package}-{version_code}.apk"
-        filepath = output_dir / filename
+        jobs = build_download_jobs(package, version_code, delivery_data, output_dir)
+        filepath = Path(jobs[0].path)
+        split_files = [Path(job.path) for job in jobs[1:]]
 
-        print(f"Downloading: {filename}")
+        print(f"Downloading: {filepath.name}" + (f" + {len(split_files)} splits" if split_files else ""))
 
-        # Download with cookies if provided
-        download_headers = {}
-        for cookie in delivery_data.downloadAuthCookie:
-            download_headers['Cookie'] = f"{cookie.name}={cookie.value}"
+        def show_progress(done, total):
+            if total > 0:
+                print(f"\r  Progress: {min(done * 100 // total, 100)}% ({format_size(done)} / {format_size(total)})", end='')
 
-        dl_response = requests.get(download_url, headers=download_headers, stream=True, timeout=60, verify=False)
-
-        if dl_response.status_code != 200:
-            print(f"Download failed: {dl_response.status_code}")
+        store = None if args.no_cache else STORE
+        try:
+            try:
+                download_all(FDFE, jobs, workers=args.jobs, segments=args.segments,
+                             on_progress=show_progress, store=store)
+            except UrlExpired as e:
+                # Signed URLs are short-lived; resolve again and resume the .part files
+                print()
+                print(f"{e} - requesting a fresh download URL...")
+                delivery_data = get_delivery_data(package, version_code, headers)
+                if not delivery_data:
+                    return 1
+                jobs = build_download_jobs(package, version_code, delivery_data, output_dir)
+                download_all(FDFE, jobs, workers=args.jobs, segments=args.segments,
+                             on_progress=show_progress, store=store)
+        except DownloadError as e:
+            print()
+            print(f"Download failed: {e}")
             return 1
 
-        with open(filepath, 'wb') as f:
-            downloaded = 0
-            for chunk in dl_response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if download_size > 0:
-                        progress = (downloaded * 100) // download_size
-                        print(f"\r  Progress: {progress}% ({format_size(downloaded)} / {format_size(download_size)})", end='')
-
         print()
-        print(f"Saved: {filepath}")
-
-        # Download split APKs if any
-        split_files = []
-        for i, split in enumerate(delivery_data.split):
-            if split.downloadUrl:
-                split_name = split.name if split.name else f"split{i}"
-                split_filename = f"{package}-{version_code}-{split_name}.apk"
-                split_filepath = output_dir / split_filename
-                print(f"Downloading split: {split_filename}")
-
-                split_response = requests.get(split.downloadUrl, stream=True, timeout=120, verify=False)
-                with open(split_filepath, 'wb') as f:
-                    for chunk in split_response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                print(f"Saved: {split_filepath}")
-                split_files.append(split_filepath)
+        for job in jobs:
+            print(f"Saved: {job.path}" + (" (from cache)" if job.cached else ""))
 
         # Merge if requested and there are splits
         if should_merge and split_files:
             print()
             print("Merging APKs...")
-            merged_filename = f"{package}-{version_code}-merged.apk"
-            merged_filepath = output_dir / merged_filename
-
             try:
-                merge_apks_with_apkeditor(filepath, split_files, str(merged_filepath))
-                print(f"Merged: {merged_filepath}")
-
-                print("Signing merged APK...")
-                if sign_apk(merged_filepath):
-                    print("APK signed successfully")
-
-                # Clean up individual files
-                print("Cleaning up split files...")
-                os.remove(filepath)
-                for sf in split_files:
-                    os.remove(sf)
-
+                merged_filepath, _ = merge_downloaded(package, version_code, filepath, split_files, output_dir)
                 print()
                 print(f"Final APK: {merged_filepath}")
             except Exception as e:
@@ -648,7 +585,9 @@ def cmd_download(args):
             print()
             print("No splits - APK has original signature")
 
+        conn = FDFE.stats()
         print()
+        print(f"Connections: {conn['new_connections']} new, {conn['reused_connections']} reused")
         print("Download complete!")
         return 0
 
@@ -663,6 +602,397 @@ def cmd_download(args):
         return 1
 
 
+def parse_manifest(path):
+    """Read a batch manifest: one package per line, then an optional version
+    code and `merge`, in any order. `#` starts a comment.
+    """
+    entries = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            entry = {'package': fields[0], 'version': None, 'merge': None}
+            for field in fields[1:]:
+                if field.isdigit():
+                    entry['version'] = int(field)
+                elif field in ('merge', '-m', '--merge'):
+                    entry['merge'] = True
+                elif field in ('nomerge', 'split'):
+                    entry['merge'] = False
+                else:
+                    raise ValueError(f"{path}:{lineno}: unknown field '{field}'")
+            entries.append(entry)
+    return entries
+
+
+def batch_download(entry, details, headers, output_dir, limiter, args, log):
+    """Resolve, download and optionally merge one manifest entry; returns a report record.
+
+    `details` is the entry's prefetched bulkDetails result, if any.
+    """
+    package = entry['package']
+    result = {'package': package, 'status': 'failed'}
+    started = time.monotonic()
+    try:
+        if not details or 'error' in details:
+            limiter.acquire()
+            app = get_app_details(package, headers, log=log)
+            if not app:
+                result['error'] = 'details unavailable'
+                return result
+            details = {'versionCode': app.details.appDetails.versionCode,
+                       'version': app.details.appDetails.versionString, 'title': app.title}
+        version_code = entry['version'] or details['versionCode']
+        result.update(title=details['title'], version=details['version'], versionCode=version_code)
+
+        # Purchase + delivery are two calls
+        limiter.acquire(2)
+        delivery_data = get_delivery_data(package, version_code, headers, log=log)
+        if not delivery_data:
+            result['error'] = 'delivery unavailable'
+            return result
+
+        store = None if args.no_cache else STORE
+        jobs = build_download_jobs(package, version_code, delivery_data, output_dir)
+        log(f"Downloading {len(jobs)} file(s), {format_size(sum(job.size for job in jobs))}")
+        try:
+            download_all(FDFE, jobs, workers=args.jobs, segments=args.segments, store=store)
+        except UrlExpired as e:
+            log(f"{e} - requesting a fresh download URL...")
+            limiter.acquire(2)
+            delivery_data = get_delivery_data(package, version_code, headers, log=log)
+            if not delivery_data:
+                result['error'] = 'delivery unavailable'
+                return result
+            jobs = build_download_jobs(package, version_code, delivery_data, output_dir)
+            download_all(FDFE, jobs, workers=args.jobs, segments=args.segments, store=store)
+
+        result.update(files=[job.path for job in jobs], sha1=jobs[0].sha1, bytes=sum(job.size for job in jobs),
+                      cached=sum(job.cached for job in jobs))
+        if entry['merge'] and len(jobs) > 1:
+            merged, timing = merge_downloaded(package, version_code, Path(jobs[0].path),
+                                              [Path(job.path) for job in jobs[1:]], output_dir, log=log,
+                                              worker=args.merge_client)
+            result.update(files=[str(merged)], merged=True, merge=timing)
+        result['status'] = 'ok'
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        result['seconds'] = round(time.monotonic() - started, 2)
+        log(f"{result['status'].upper()}" + (f": {result['error']}" if 'error' in result else ""))
+    return result
+
+
+def load_manifest(args):
+    """parse_manifest with the command's --merge default applied; None on error."""
+    try:
+        entries = parse_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Invalid manifest: {e}")
+        return None
+    if not entries:
+        print("Manifest is empty.")
+        return None
+    for entry in entries:
+        if entry['merge'] is None:
+            entry['merge'] = args.merge
+    return entries
+
+
+def get_proto_headers(auth):
+    return token_headers(PROTO_HEADERS, auth)
+
+
+def connect_merge_worker(args):
+    """Set args.merge_client from --merge-worker; False if the worker is unreachable."""
+    args.merge_client = None
+    if not args.merge_worker:
+        return True
+    try:
+        args.merge_client = MergeClient(args.merge_worker)
+    except (OSError, EOFError) as e:
+        print(f"Cannot reach merge worker at {args.merge_worker}: {e}")
+        print("Start one with: gplay merge-worker")
+        return False
+    print(f"Merging via worker at {args.merge_worker}")
+    return True
+
+
+def download_entries(entries, details, headers, output_dir, limiter, args):
+    """Run batch_download for `entries` on --parallel threads; returns their report records."""
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        futures = [pool.submit(batch_download, entry, details.get(entry['package']), headers,
+                               output_dir, limiter, args,
+                               lambda msg, pkg=entry['package']: print(f"[{pkg}] {msg}"))
+                   for entry in entries]
+        return [future.result() for future in futures]
+
+
+def cmd_batch(args):
+    """Download every package listed in a manifest with one token and connection pool."""
+    entries = load_manifest(args)
+    if not entries:
+        return 1
+
+    auth = load_auth()
+    if not auth:
+        return 1
+    try:
+        from gpapi import googleplay_pb2  # noqa: F401
+    except ImportError:
+        print("Error: gpapi library required for downloads.")
+        print("Install with: pip install gpapi")
+        return 1
+
+    if not connect_merge_worker(args):
+        return 1
+
+    headers = get_proto_headers(auth)
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    limiter = RateLimiter(args.rate)
+
+    print(f"Batch: {len(entries)} packages, {args.parallel} at a time, {args.rate:g} API calls/s")
+    started = time.monotonic()
+    # One bulkDetails round trip per chunk instead of a details call per package
+    details = bulk_details(FDFE, BULK_DETAILS_URL, headers, [e['package'] for e in entries], limiter=limiter)
+    results = download_entries(entries, details, headers, output_dir, limiter, args)
+
+    ok = sum(r['status'] == 'ok' for r in results)
+    conn = FDFE.stats()
+    report = {
+        'total': len(results),
+        'ok': ok,
+        'failed': len(results) - ok,
+        'seconds': round(time.monotonic() - started, 2),
+        'rate_limit_wait': round(limiter.waited, 2),
+        'connections': conn,
+        'results': results,
+    }
+    report_path = Path(args.report) if args.report else output_dir / 'batch-report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print(f"Done: {ok}/{len(results)} succeeded in {report['seconds']}s")
+    print(f"Connections: {conn['new_connections']} new, {conn['reused_connections']} reused")
+    print(f"Report: {report_path}")
+    return 0 if ok == len(results) else 1
+
+
+def load_index(path):
+    """The watch index: {package: {versionCode, version, sha1, files, fetched_at}}."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_index(path, index):
+    tmp = str(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def watch_cycle(entries, index, index_path, output_dir, limiter, args):
+    """Poll versions once and download the entries whose versionCode changed."""
+    auth = load_auth()  # Re-read, so a token refreshed with `gplay auth` is picked up
+    if not auth:
+        return
+    headers = get_proto_headers(auth)
+    details = bulk_details(FDFE, BULK_DETAILS_URL, headers, [e['package'] for e in entries], limiter=limiter)
+
+    changed = []
+    for entry in entries:
+        pkg = entry['package']
+        res = details.get(pkg, {})
+        if 'error' in res:
+            print(f"[{pkg}] {res['error']}")
+            continue
+        wanted = entry['version'] or res['versionCode']
+        if index.get(pkg, {}).get('versionCode') != wanted:
+            old = index.get(pkg, {}).get('versionCode')
+            print(f"[{pkg}] {old or 'new'} -> {wanted}")
+            changed.append(entry)
+
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    if not changed:
+        print(f"{stamp}: {len(entries)} packages checked, no updates")
+        return
+
+    print(f"{stamp}: {len(changed)} of {len(entries)} packages changed")
+    for result in download_entries(changed, details, headers, output_dir, limiter, args):
+        # Failed packages keep their old record and are retried next cycle
+        if result['status'] == 'ok':
+            index[result['package']] = {
+                'versionCode': result['versionCode'],
+                'version': result['version'],
+                'sha1': result.get('sha1'),
+                'files': result['files'],
+                'fetched_at': int(time.time()),
+            }
+    save_index(index_path, index)
+
+
+def cmd_watch(args):
+    """Poll a manifest's apps and download only those with a new versionCode."""
+    entries = load_manifest(args)
+    if not entries:
+        return 1
+    try:
+        from gpapi import googleplay_pb2  # noqa: F401
+    except ImportError:
+        print("Error: gpapi library required for downloads.")
+        print("Install with: pip install gpapi")
+        return 1
+    if not connect_merge_worker(args):
+        return 1
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    index_path = Path(args.index) if args.index else output_dir / '.gplay-index.json'
+    index = load_index(index_path)
+    limiter = RateLimiter(args.rate)
+
+    print(f"Watching {len(entries)} packages every {args.interval}s (index: {index_path})")
+    try:
+        while True:
+            try:
+                watch_cycle(entries, index, index_path, output_dir, limiter, args)
+            except Exception as e:
+                print(f"Check failed: {e}")
+            if args.once:
+                return 0
+            # Jitter keeps many watchers from polling in lockstep
+            time.sleep(max(1, args.interval * random.uniform(1 - args.jitter, 1 + args.jitter)))
+    except KeyboardInterrupt:
+        print()
+        print("Stopped.")
+        return 0
+
+
+def cmd_bulk(args):
+    """Show the current version of many apps via bulkDetails."""
+    packages = list(args.packages)
+    if args.file:
+        try:
+            with open(args.file) as f:
+                packages += [line.split('#', 1)[0].split()[0] for line in f if line.split('#', 1)[0].strip()]
+        except OSError as e:
+            print(f"Cannot read {args.file}: {e}")
+            return 1
+    if not packages:
+        print("No packages given.")
+        return 1
+
+    auth = load_auth()
+    if not auth:
+        return 1
+
+    headers = get_auth_headers(auth)
+    headers['Accept'] = 'application/x-protobuf'
+    try:
+        started = time.monotonic()
+        results = bulk_details(FDFE, BULK_DETAILS_URL, headers, packages,
+                               chunk_size=args.chunk_size, workers=args.workers)
+        elapsed = time.monotonic() - started
+    except ImportError:
+        print("Error: gpapi library required for bulk details.")
+        print("Install with: pip install gpapi")
+        return 1
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for pkg, res in results.items():
+            if 'error' in res:
+                print(f"{pkg:<45} {res['error']}")
+            else:
+                print(f"{pkg:<45} {res['versionCode']:<12} {res['version']:<20} {res['title']}")
+        found = sum('error' not in res for res in results.values())
+        print()
+        print(f"Resolved {found}/{len(results)} apps in {elapsed:.2f}s")
+    return 0 if all('error' not in res for res in results.values()) else 1
+
+
+def cmd_cache(args):
+    """Show or garbage-collect the local artifact store."""
+    if args.action == 'gc':
+        max_bytes = args.max_mb * 1024 * 1024 if args.max_mb is not None else None
+        removed, freed = STORE.gc(max_bytes)
+        print(f"Removed {removed} objects, freed {format_size(freed) if freed else '0 B'}")
+    stats = STORE.stats()
+    print(f"Store: {STORE.root}")
+    used = format_size(stats['bytes']) if stats['bytes'] else '0 B'
+    print(f"Objects: {stats['objects']} ({used} of {format_size(stats['max_bytes'])})")
+    return 0
+
+
+def cmd_sign(args):
+    """Sign APKs in place (v2/v3), optionally checking them with apksigner."""
+    signer = None
+    if args.ks or args.key or args.cert:
+        try:
+            signer = load_signer(keystore=args.ks, password=args.ks_pass, key=args.key, cert=args.cert)
+        except (SigningError, ImportError) as e:
+            print(f"Cannot load signing key: {e}")
+            return 1
+
+    failed = 0
+    for apk in args.apks:
+        start = time.monotonic()
+        if not sign_apk(apk, signer=signer):
+            print(f"{apk}: not signed")
+            failed += 1
+            continue
+        print(f"{apk}: signed in {time.monotonic() - start:.2f}s")
+        if args.verify:
+            ok, output = verify_apk(apk)
+            if ok is None:
+                print(f"  Verify skipped: {output}")
+            else:
+                print(f"  {'Verified' if ok else 'Verification FAILED'}")
+                for line in output.splitlines():
+                    print(f"    {line}")
+                failed += not ok
+    return 1 if failed else 0
+
+
+def cmd_merge_worker(args):
+    """Run the merge worker until interrupted (or stopped with --stop)."""
+    if args.stop or args.stats:
+        try:
+            client = MergeClient(args.listen)
+        except (OSError, EOFError) as e:
+            print(f"Cannot reach merge worker at {args.listen}: {e}")
+            return 1
+        if args.stats:
+            stats = client.stats()
+            print(f"Jobs: {stats['done']} done ({stats['failed']} failed), "
+                  f"{stats['busy']}/{stats['parallel']} running")
+        if args.stop:
+            client.shutdown()
+            print("Merge worker stopped.")
+        client.close()
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        worker = MergeWorker(args.listen, parallel=args.parallel)
+    except OSError as e:
+        print(f"Cannot listen on {args.listen}: {e}")
+        return 1
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        print()
+        print("Stopped.")
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Download APKs from Google Play Store',
@@ -676,6 +1006,13 @@ Examples:
   %(prog)s download com.app -a armv7         # Download for older phones
   %(prog)s download com.app -m               # Download and merge splits
   %(prog)s download com.app -m -a armv7      # Merge for armv7
+  %(prog)s batch apps.txt -o mirror/         # Download every app in a manifest
+  %(prog)s bulk -f apps.txt                  # Current versions of many apps
+  %(prog)s watch apps.txt -o mirror/         # Download updates as they appear
+  %(prog)s cache gc --max-mb 2048            # Shrink the APK cache to 2 GB
+  %(prog)s sign app.apk --verify            # Sign with the debug key, then check
+  %(prog)s merge-worker -p 4                 # Shared merge/sign worker
+  %(prog)s batch apps.txt -m --merge-worker 127.0.0.1:6390
         """
     )
 
@@ -684,8 +1021,10 @@ Examples:
     # Auth command
     auth_parser = subparsers.add_parser('auth', help='Authenticate with Google Play')
     auth_parser.add_argument('-d', '--dispenser', help='Dispenser URL for anonymous auth')
-    auth_parser.add_argument('-r', '--max-attempts', type=int, default=1, 
-                            help='Maximum authentication attempts (default: 1)')
+    auth_parser.add_argument('-r', '--max-attempts', type=int, default=DISPENSER_ATTEMPTS,
+                            help=f'Maximum dispenser requests (default: {DISPENSER_ATTEMPTS})')
+    auth_parser.add_argument('-j', '--parallel', type=int, default=DISPENSER_PARALLEL,
+                            help=f'Dispenser requests in flight at once (default: {DISPENSER_PARALLEL})')
 
     # Search command
     search_parser = subparsers.add_parser('search', help='Search for apps')
@@ -705,6 +1044,90 @@ Examples:
                                 help='Architecture: arm64 (default) or armv7')
     download_parser.add_argument('-m', '--merge', action='store_true',
                                 help='Merge split APKs into single installable APK')
+    download_parser.add_argument('-j', '--jobs', type=int, default=4,
+                                help='Files downloaded in parallel (default: 4)')
+    download_parser.add_argument('-s', '--segments', type=int, default=1,
+                                help='Parallel byte-range connections per large file (default: 1)')
+    download_parser.add_argument('--no-cache', action='store_true',
+                                help='Bypass the local APK cache')
+
+    # Batch command
+    batch_parser = subparsers.add_parser('batch', help='Download many apps from a manifest file')
+    batch_parser.add_argument('manifest',
+                              help='File with one package per line, optionally followed by '
+                                   'a version code and "merge"')
+    batch_parser.add_argument('-o', '--output', default='.', help='Output directory')
+    batch_parser.add_argument('-m', '--merge', action='store_true',
+                              help='Merge split APKs for every entry')
+    batch_parser.add_argument('-p', '--parallel', type=int, default=4,
+                              help='Packages processed in parallel (default: 4)')
+    batch_parser.add_argument('-r', '--rate', type=float, default=5,
+                              help='Max Play API calls per second, 0 for no limit (default: 5)')
+    batch_parser.add_argument('-j', '--jobs', type=int, default=4,
+                              help='Files per package downloaded in parallel (default: 4)')
+    batch_parser.add_argument('-s', '--segments', type=int, default=1,
+                              help='Parallel byte-range connections per large file (default: 1)')
+    batch_parser.add_argument('--report', help='Results JSON path (default: <output>/batch-report.json)')
+    batch_parser.add_argument('--no-cache', action='store_true', help='Bypass the local APK cache')
+    batch_parser.add_argument('--merge-worker', metavar='ADDR',
+                              help='Send merges to a running merge worker (host:port or socket path)')
+
+    # Watch command
+    watch_parser = subparsers.add_parser('watch', help='Download manifest apps whenever a new version appears')
+    watch_parser.add_argument('manifest', help='Manifest file, same format as for batch')
+    watch_parser.add_argument('-o', '--output', default='.', help='Output directory')
+    watch_parser.add_argument('-i', '--interval', type=int, default=3600,
+                              help='Seconds between checks (default: 3600)')
+    watch_parser.add_argument('--jitter', type=float, default=0.1,
+                              help='Random +/- fraction of the interval (default: 0.1)')
+    watch_parser.add_argument('--index', help='Index file (default: <output>/.gplay-index.json)')
+    watch_parser.add_argument('--once', action='store_true', help='Check once and exit')
+    watch_parser.add_argument('-m', '--merge', action='store_true', help='Merge split APKs for every entry')
+    watch_parser.add_argument('-p', '--parallel', type=int, default=4,
+                              help='Packages downloaded in parallel (default: 4)')
+    watch_parser.add_argument('-r', '--rate', type=float, default=5,
+                              help='Max Play API calls per second, 0 for no limit (default: 5)')
+    watch_parser.add_argument('-j', '--jobs', type=int, default=4,
+                              help='Files per package downloaded in parallel (default: 4)')
+    watch_parser.add_argument('-s', '--segments', type=int, default=1,
+                              help='Parallel byte-range connections per large file (default: 1)')
+    watch_parser.add_argument('--no-cache', action='store_true', help='Bypass the local APK cache')
+    watch_parser.add_argument('--merge-worker', metavar='ADDR',
+                              help='Send merges to a running merge worker (host:port or socket path)')
+
+    # Bulk details command
+    bulk_parser = subparsers.add_parser('bulk', help='Get current versions of many apps at once')
+    bulk_parser.add_argument('packages', nargs='*', help='Package names')
+    bulk_parser.add_argument('-f', '--file', help='File with one package per line')
+    bulk_parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE,
+                             help=f'Packages per request (default: {BULK_CHUNK_SIZE})')
+    bulk_parser.add_argument('-w', '--workers', type=int, default=BULK_WORKERS,
+                             help=f'Requests in parallel (default: {BULK_WORKERS})')
+    bulk_parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    # Cache command
+    cache_parser = subparsers.add_parser('cache', help='Inspect or clean the local APK cache')
+    cache_parser.add_argument('action', choices=['stats', 'gc'], help='stats, or gc to evict old APKs')
+    cache_parser.add_argument('--max-mb', type=int,
+                              help='Size to shrink to with gc (default: GPLAY_STORE_MAX_BYTES); 0 empties it')
+
+    # Sign command
+    sign_parser = subparsers.add_parser('sign', help='Sign APKs (v2/v3) in place')
+    sign_parser.add_argument('apks', nargs='+', help='APK files')
+    sign_parser.add_argument('--ks', help='PKCS#12 keystore (default: ~/.android/debug.keystore)')
+    sign_parser.add_argument('--ks-pass', help='Keystore (or PEM key) password (default: android)')
+    sign_parser.add_argument('--key', help='PEM private key, used with --cert instead of a keystore')
+    sign_parser.add_argument('--cert', help='PEM certificate for --key')
+    sign_parser.add_argument('--verify', action='store_true', help='Run apksigner verify afterwards, if installed')
+
+    # Merge worker command
+    worker_parser = subparsers.add_parser('merge-worker', help='Run a long-lived merge/sign worker')
+    worker_parser.add_argument('-l', '--listen', default=WORKER_ADDRESS,
+                               help=f'host:port or Unix socket path (default: {WORKER_ADDRESS})')
+    worker_parser.add_argument('-p', '--parallel', type=int, default=WORKER_PARALLEL,
+                               help=f'Jobs run at once (default: {WORKER_PARALLEL})')
+    worker_parser.add_argument('--stats', action='store_true', help='Show a running worker\'s job counts')
+    worker_parser.add_argument('--stop', action='store_true', help='Stop a running worker')
 
     args = parser.parse_args()
 
@@ -713,6 +1136,12 @@ Examples:
         'search': cmd_search,
         'info': cmd_info,
         'download': cmd_download,
+        'batch': cmd_batch,
+        'bulk': cmd_bulk,
+        'watch': cmd_watch,
+        'cache': cmd_cache,
+        'sign': cmd_sign,
+        'merge-worker': cmd_merge_worker,
     }
 
     return commands[args.command](args)
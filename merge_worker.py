@@ -0,0 +1,254 @@
+"""
+GPlay Downloader - Merge Worker
+Long-lived merge+sign service that takes jobs over a local socket
+
+Start it once (`gplay merge-worker`) and point batch/watch runs at it with
+`--merge-worker`: jobs from every client share one warm process and one
+bounded pool instead of each run merging and signing on its own. Each
+result carries per-stage timing.
+
+Connections are authenticated with a random key kept in a 0600 file
+(GPLAY_MERGE_KEY_FILE, created on first use) unless GPLAY_MERGE_AUTHKEY is
+set, and messages are JSON: nothing received is ever unpickled. A Unix
+socket is made 0600 as well.
+"""
+import itertools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+from apk_merge import merge_apks
+from apk_sign import sign_apk
+
+logger = logging.getLogger(__name__)
+
+WORKER_ADDRESS = os.environ.get('GPLAY_MERGE_WORKER', '127.0.0.1:6390')
+WORKER_KEY_FILE = Path(os.environ.get('GPLAY_MERGE_KEY_FILE', Path.home() / '.gplay-merge-key'))
+WORKER_PARALLEL = int(os.environ.get('GPLAY_MERGE_PARALLEL', str(os.cpu_count() or 2)))
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return address
+
+
+def load_authkey(path=WORKER_KEY_FILE):
+    """GPLAY_MERGE_AUTHKEY, else the key in `path`, created (0600, random) if missing."""
+    env_key = os.environ.get('GPLAY_MERGE_AUTHKEY')
+    if env_key:
+        return env_key.encode()
+    path = Path(path)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if path.stat().st_mode & 0o077:
+            raise PermissionError(f"{path} must not be readable by other users (chmod 600)")
+        return path.read_bytes().strip()
+    key = secrets.token_hex(32).encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def send_json(conn, message):
+    conn.send_bytes(json.dumps(message).encode())
+
+
+def recv_json(conn):
+    message = json.loads(conn.recv_bytes())
+    if not isinstance(message, dict):
+        raise ValueError('message is not an object')
+    return message
+
+
+def valid_job(job):
+    return (isinstance(job.get('base'), str) and isinstance(job.get('output'), str)
+            and isinstance(job.get('splits'), list) and all(isinstance(s, str) for s in job['splits']))
+
+
+def run_job(job, log=None):
+    """Merge (and sign) one job dict: {base, splits, output, sign}. Returns a result dict."""
+    log = log or logger.info
+    result = {'id': job.get('id'), 'output': job['output'], 'status': 'failed'}
+    start = time.monotonic()
+    try:
+        result['method'] = merge_apks(job['base'], job['splits'], job['output'])
+        result['merge_seconds'] = round(time.monotonic() - start, 3)
+        if job.get('sign', True):
+            signed_at = time.monotonic()
+            result['signed'] = sign_apk(job['output'], log=log)
+            result['sign_seconds'] = round(time.monotonic() - signed_at, 3)
+        result['status'] = 'ok'
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = round(time.monotonic() - start, 3)
+    return result
+
+
+class MergeWorker:
+    """Accepts connections and runs their jobs on `parallel` threads."""
+
+    def __init__(self, address=WORKER_ADDRESS, parallel=WORKER_PARALLEL, authkey=None):
+        self.address = parse_address(address)
+        self.parallel = max(1, parallel)
+        self.authkey = authkey or load_authkey()
+        # A Unix socket is created 0600 from the start
+        umask = os.umask(0o177) if isinstance(self.address, str) else None
+        try:
+            self.listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            if umask is not None:
+                os.umask(umask)
+        self.pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix='merge')
+        self.done = 0
+        self.failed = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def serve_forever(self):
+        logger.info(f"Merge worker listening on {self.address} ({self.parallel} parallel jobs)")
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn = self.listener.accept()
+                except Exception as e:
+                    logger.warning(f"Rejected connection: {e}")
+                    continue
+                if self._stop.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            self.pool.shutdown(wait=True)
+
+    def shutdown(self):
+        self._stop.set()
+        # accept() does not return when the socket is closed from another thread; connect to wake it
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'parallel': self.parallel, 'busy': self.busy, 'done': self.done, 'failed': self.failed}
+
+    def _serve(self, conn):
+        send_lock = threading.Lock()
+
+        def send(message):
+            with send_lock:
+                try:
+                    send_json(conn, message)
+                except (OSError, EOFError):
+                    pass  # Client went away; the job still ran
+
+        try:
+            while True:
+                message = recv_json(conn)
+                kind = message.get('type')
+                if kind == 'job' and not valid_job(message):
+                    send({'type': 'result', 'id': message.get('id'), 'output': message.get('output'),
+                          'status': 'failed', 'error': 'malformed job'})
+                elif kind == 'job':
+                    queued = time.monotonic()
+                    self.pool.submit(self._run, message, queued).add_done_callback(
+                        lambda f: send({'type': 'result', **f.result()}))
+                elif kind == 'stats':
+                    send({'type': 'stats', **self.stats()})
+                elif kind == 'shutdown':
+                    send({'type': 'bye'})
+                    self.shutdown()
+                    return
+        except (EOFError, OSError):
+            pass  # Jobs already queued still run; their results are dropped
+        except ValueError as e:
+            logger.warning(f"Dropped connection after a malformed message: {e}")
+            conn.close()
+
+    def _run(self, job, queued):
+        with self._lock:
+            self.busy += 1
+        wait = time.monotonic() - queued
+        try:
+            result = run_job(job)
+        finally:
+            with self._lock:
+                self.busy -= 1
+        result['queue_seconds'] = round(wait, 3)
+        with self._lock:
+            self.done += 1
+            self.failed += result['status'] != 'ok'
+        logger.info(f"Job {job.get('id')}: {result['status']} {result.get('method', '')} "
+                    f"merge={result.get('merge_seconds', 0)}s sign={result.get('sign_seconds', 0)}s "
+                    f"queued={result['queue_seconds']}s")
+        return result
+
+
+class MergeClient:
+    """Thread-safe client; `merge()` blocks until the worker returns that job's result."""
+
+    def __init__(self, address=WORKER_ADDRESS, authkey=None):
+        try:
+            self.conn = Client(parse_address(address), authkey=authkey or load_authkey())
+        except AuthenticationError as e:
+            raise ConnectionRefusedError(f"authentication failed ({e}); the worker uses another key") from e
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                message = recv_json(self.conn)
+                key = message['id'] if message['type'] == 'result' else message['type']
+                with self._lock:
+                    future = self._pending.pop(key, None)
+                if future:
+                    future.set_result(message)
+        except (EOFError, OSError, ValueError) as e:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError(f"Merge worker connection lost: {e}"))
+
+    def _request(self, key, message):
+        future = Future()
+        with self._lock:
+            self._pending[key] = future
+            send_json(self.conn, message)
+        return future
+
+    def submit(self, base, splits, output, sign=True):
+        """Queue a job; returns a Future with its result dict."""
+        job_id = next(self._ids)
+        # The worker may run in another directory
+        return self._request(job_id, {'type': 'job', 'id': job_id, 'base': os.path.abspath(base),
+                                      'splits': [os.path.abspath(s) for s in splits],
+                                      'output': os.path.abspath(output), 'sign': sign})
+
+    def merge(self, base, splits, output, sign=True):
+        return self.submit(base, splits, output, sign).result()
+
+    def stats(self):
+        return self._request('stats', {'type': 'stats'}).result()
+
+    def shutdown(self):
+        return self._request('bye', {'type': 'shutdown'}).result()
+
+    def close(self):
+        self.conn.close()
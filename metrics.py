@@ -0,0 +1,173 @@
+"""
+GPlay Downloader - Metrics
+Prometheus-style counters, gauges and histograms served as text on /metrics
+
+Metrics are plain in-process objects: recording a value is one dict update
+under a per-metric lock, and histograms keep per-bucket counts that are only
+made cumulative when rendered. `render()` produces the text exposition
+format (version 0.0.4) for every registered metric.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; upstream calls range from ~50 ms (details) to tens of seconds (dispenser)
+DEFAULT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{name}{labels} {_number(value)}' for name, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count; `inc(*label_values, amount=1)`."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        if not labels:
+            self._values[()] = 0
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    """Value that goes up and down; `inc`, `dec` and `set` take label values first."""
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values; `observe(value, *label_values)`."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (the last slot is +Inf), then sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket',
+                                _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative))
+            samples.append((f'{self.name}_sum', _labels(self.labelnames, key), total))
+            samples.append((f'{self.name}_count', _labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Callback(_Metric):
+    """Values read at scrape time: `fn()` returns {label_values_tuple: value}."""
+
+    def __init__(self, name, help, labels, fn, kind='gauge'):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in self.fn().items()]
+
+
+def render():
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+# --- Server metrics, shared by the Flask and ASGI apps ---
+
+STAGE_SECONDS = Histogram('gplay_stage_seconds', 'Latency of upstream calls by resolution stage', ('stage',))
+UPSTREAM_RESPONSES = Counter('gplay_upstream_responses_total',
+                             'Upstream responses by stage and HTTP status ("error" when no response)',
+                             ('stage', 'status'))
+TOKEN_CACHE = Counter('gplay_token_cache_total',
+                      'Token lookups by profile, source (pool, cached, dispenser) and result (hit, miss, failure)',
+                      ('cache_key', 'source', 'result'))
+STREAM_SECONDS = Histogram('gplay_stream_seconds', 'Duration of download-info streams by outcome', ('outcome',))
+PROXY_IN_FLIGHT = Gauge('gplay_proxy_transfers_in_flight', 'Proxy transfers currently relaying')
+PROXY_BYTES = Counter('gplay_proxy_bytes_total', 'Bytes relayed by the download proxy')
+
+
+def upstream_call(stage, fn, *args, **kwargs):
+    """Call `fn` (a requests-style call), recording its latency and status under `stage`."""
+    start = time.monotonic()
+    try:
+        r = fn(*args, **kwargs)
+    except Exception:
+        STAGE_SECONDS.observe(time.monotonic() - start, stage)
+        UPSTREAM_RESPONSES.inc(stage, 'error')
+        raise
+    STAGE_SECONDS.observe(time.monotonic() - start, stage)
+    UPSTREAM_RESPONSES.inc(stage, str(r.status_code))
+    return r
+
+
+async def async_upstream_call(stage, awaitable):
+    """upstream_call for an httpx coroutine."""
+    start = time.monotonic()
+    try:
+        r = await awaitable
+    except Exception:
+        STAGE_SECONDS.observe(time.monotonic() - start, stage)
+        UPSTREAM_RESPONSES.inc(stage, 'error')
+        raise
+    STAGE_SECONDS.observe(time.monotonic() - start, stage)
+    UPSTREAM_RESPONSES.inc(stage, str(r.status_code))
+    return r
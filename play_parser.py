@@ -0,0 +1,154 @@
+"""
+GPlay Downloader - Play Page Parser
+Reads search results and app details from the JSON embedded in Play web pages
+
+Play pages carry their data as `AF_initDataCallback({key: 'ds:N', ..., data: [...]})`
+blocks. Each block is located with str.find and decoded once with
+json.JSONDecoder.raw_decode. Results are read from the decoded lists; the
+markup itself is only consulted by the fallbacks below.
+
+Search entries are found structurally, as lists starting with `[package, 7]`
+followed by a title, so a reshuffle of the outer layout does not lose them.
+If no entry is found, packages are taken from the page's detail links, and
+details fall back to the Open Graph meta tags.
+"""
+import json
+import re
+
+CALLBACK = 'AF_initDataCallback('
+DETAILS_LINK = re.compile(r'/store/apps/details\?id=([A-Za-z0-9_.]+)')
+PACKAGE = re.compile(r'^[A-Za-z][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)+$')
+META = re.compile(r'<meta\s+(?:property|name)="(og:[a-z:]+)"\s+content="([^"]*)"')
+APP_DOC_TYPE = 7
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_space(html, i):
+    while i < len(html) and html[i] in ' \t\r\n':
+        i += 1
+    return i
+
+
+def iter_blobs(html):
+    """Yield (key, data) for every AF_initDataCallback block of a page."""
+    pos = html.find(CALLBACK)
+    while pos >= 0:
+        end = html.find(CALLBACK, pos + len(CALLBACK))
+        data_at = html.find('data:', pos, end if end >= 0 else len(html))
+        if data_at >= 0:
+            key = None
+            key_at = html.find('key:', pos, data_at)
+            if key_at >= 0:
+                q = _skip_space(html, key_at + 4)
+                if q < len(html) and html[q] in '\'"':
+                    key = html[q + 1:html.find(html[q], q + 1)]
+            value_at = _skip_space(html, data_at + 5)
+            if html.startswith('function', value_at):
+                # Older pages wrap the payload: data:function(){return [...]}
+                value_at = _skip_space(html, html.find('return', value_at) + len('return'))
+            try:
+                yield key, _decoder.raw_decode(html, value_at)[0]
+            except ValueError:
+                pass
+        pos = end
+
+
+def parse_blobs(html):
+    return dict(iter_blobs(html))
+
+
+def _get(node, *path):
+    for i in path:
+        if not isinstance(node, list) or i >= len(node):
+            return None
+        node = node[i]
+    return node
+
+
+def _typed(value, kind):
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value if isinstance(value, kind) else None
+
+
+def _is_app_entry(node):
+    doc = node[0] if node else None
+    return (len(node) > 3 and isinstance(doc, list) and len(doc) >= 2 and doc[1] == APP_DOC_TYPE
+            and isinstance(doc[0], str) and PACKAGE.match(doc[0]) is not None and isinstance(node[3], str))
+
+
+def _iter_entries(data):
+    """Depth-first, in page order, without descending into found entries."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, list):
+            continue
+        if _is_app_entry(node):
+            yield node
+            continue
+        stack.extend(reversed(node))
+
+
+def _search_result(entry):
+    return {
+        'package': entry[0][0],
+        'title': entry[3],
+        'developer': _typed(_get(entry, 14), str),
+        'icon': _typed(_get(entry, 1, 3, 2), str),
+        'rating': _typed(_get(entry, 4, 1), float),
+        'installs': _typed(_get(entry, 15), str),
+        'genre': _typed(_get(entry, 5), str),
+    }
+
+
+def parse_search(html):
+    """Every app on a search page, in page order, each package once."""
+    results = []
+    seen = set()
+    for _, data in iter_blobs(html):
+        for entry in _iter_entries(data):
+            if entry[0][0] not in seen:
+                seen.add(entry[0][0])
+                results.append(_search_result(entry))
+    if not results:
+        for m in DETAILS_LINK.finditer(html):
+            if m.group(1) not in seen:
+                seen.add(m.group(1))
+                results.append({'package': m.group(1), 'title': None, 'developer': None, 'icon': None,
+                                'rating': None, 'installs': None, 'genre': None})
+    return results
+
+
+def _details_node(html, package):
+    for _, data in iter_blobs(html):
+        node = _get(data, 1, 2)
+        if isinstance(_get(node, 0, 0), str) and (package is None or _get(node, 77, 0) in (package, None)):
+            return node
+    return None
+
+
+def parse_details(html, package=None):
+    """App details from a details page; fields the page lacks are None."""
+    node = _details_node(html, package)
+    if node is None:
+        # Layout not recognised: fall back to the Open Graph tags every page has
+        meta = dict(META.findall(html))
+        title = meta.get('og:title')
+        return {'package': package, 'title': title.rsplit(' - ', 1)[0] if title else None,
+                'developer': None, 'icon': meta.get('og:image'), 'rating': None, 'ratings': None,
+                'installs': None, 'version': None, 'updated': None, 'genre': None, 'description': None}
+    return {
+        'package': _typed(_get(node, 77, 0), str) or package,
+        'title': node[0][0],
+        'developer': _typed(_get(node, 68, 0), str),
+        'icon': _typed(_get(node, 95, 0, 3, 2), str),
+        'rating': _typed(_get(node, 51, 0, 1), float),
+        'ratings': _typed(_get(node, 51, 2, 1), int),
+        'installs': _typed(_get(node, 13, 0), str),
+        'version': _typed(_get(node, 140, 0, 0, 0), str),
+        'updated': _typed(_get(node, 145, 0, 1, 0), int),
+        'genre': _typed(_get(node, 79, 0, 0, 0), str),
+        'description': _typed(_get(node, 72, 0, 1), str),
+    }
@@ -0,0 +1,117 @@
+"""
+GPlay Downloader - Device Profiles
+Device/region profiles compiled once into frozen configs and header templates
+
+Every (device, region) pair becomes a Profile at startup: the dispenser
+config as a read-only mapping plus its JSON body, and the FDFE headers
+that do not depend on the token. Per request only the token fields
+(Authorization, User-Agent, device id, cookie) are filled in. Extra
+devices and regions can come from a JSON file (GPLAY_PROFILES_FILE, or
+profiles.json next to this module):
+
+    {"devices": {"a54": {"extends": "s23", "Build.MODEL": "SM-A546B", ...}},
+     "regions": {"fr": {"lang": "fr_FR", "tz": "Europe/Paris", "sim": "20801", "cc": "FR"}}}
+"""
+import json
+import os
+from pathlib import Path
+from types import MappingProxyType
+
+PROFILES_FILE = os.environ.get('GPLAY_PROFILES_FILE', str(Path(__file__).with_name('profiles.json')))
+REGION_FIELDS = ('lang', 'tz', 'sim', 'cc')
+DEFAULT_USER_AGENT = 'Android-Finsky/41.2.29-23'
+
+
+def load_profiles_file(devices, regions, path=PROFILES_FILE):
+    """Add the devices/regions from `path` to the given dicts; returns the keys added.
+
+    A missing file is not an error. A device may name an existing one in
+    "extends" and list only the properties that differ. Keys may not contain
+    '_', which joins device and region in cache keys. Raises ValueError for
+    malformed content.
+    """
+    try:
+        data = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError as e:
+        raise ValueError(f'{path}: {e}') from e
+
+    new_regions, new_devices = {}, {}
+    for key in [*(data.get('regions') or {}), *(data.get('devices') or {})]:
+        if '_' in key:
+            raise ValueError(f"{path}: profile key {key!r} must not contain '_'")
+    for key, region in (data.get('regions') or {}).items():
+        missing = [f for f in REGION_FIELDS if f not in region]
+        if missing:
+            raise ValueError(f'{path}: region {key!r} is missing {", ".join(missing)}')
+        new_regions[key] = dict(region)
+    for key, device in (data.get('devices') or {}).items():
+        device = dict(device)
+        base = device.pop('extends', None)
+        known = {**devices, **new_devices}
+        if base is not None and base not in known:
+            raise ValueError(f'{path}: device {key!r} extends unknown device {base!r}')
+        new_devices[key] = {**(known[base] if base else {}), **device}
+    # Only applied once the whole file is valid
+    regions.update(new_regions)
+    devices.update(new_devices)
+    return list(new_regions) + list(new_devices)
+
+
+def device_config(defaults, device, region):
+    config = dict(defaults)
+    config.update(device)
+    config['Locales'] = f"{region['lang']},en_US"
+    config['TimeZone'] = region['tz']
+    config['SimOperator'] = region['sim']
+    config['CellOperator'] = region['sim']
+    return config
+
+
+def header_template(region):
+    """FDFE request headers for `region` that are the same for every token."""
+    return MappingProxyType({
+        'Accept-Language': region['lang'].replace('_', '-'),
+        'X-DFE-Client-Id': 'am-android-google',
+        'X-DFE-Network-Type': '4',
+        'X-DFE-Content-Filters': '',
+        'X-Limit-Ad-Tracking-Enabled': 'false',
+        'Content-Type': 'application/x-protobuf',
+        'Accept': 'application/x-protobuf',
+    })
+
+
+def token_headers(template, auth):
+    """`template` with the token-specific headers of `auth` filled in (a new dict)."""
+    device_info = auth.get('deviceInfoProvider') or {}
+    headers = template.copy()  # A plain dict copy; `{**template}` goes through the slow mapping protocol
+    headers['Authorization'] = f"Bearer {auth.get('authToken')}"
+    headers['User-Agent'] = device_info.get('userAgentString', DEFAULT_USER_AGENT)
+    headers['X-DFE-Device-Id'] = auth.get('gsfId', '')
+    headers['X-DFE-Cookie'] = auth.get('dfeCookie', '')
+    return headers
+
+
+class Profile:
+    """Read-only device/region profile; `config` is a mappingproxy, `dispenser_body` its JSON."""
+
+    __slots__ = ('device', 'region', 'key', 'config', 'dispenser_body', 'headers')
+
+    def __init__(self, device, region, config, headers):
+        self.device = device
+        self.region = region
+        self.key = f'{device}_{region}'
+        self.config = MappingProxyType(config)
+        self.dispenser_body = json.dumps(config).encode()
+        self.headers = headers
+
+    def fdfe_headers(self, auth):
+        return token_headers(self.headers, auth)
+
+
+def compile_profiles(devices, regions, defaults):
+    """{(device, region): Profile} for every combination."""
+    templates = {reg: header_template(region) for reg, region in regions.items()}
+    return {(dev, reg): Profile(dev, reg, device_config(defaults, device, regions[reg]), templates[reg])
+            for dev, device in devices.items() for reg in regions}
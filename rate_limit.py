@@ -0,0 +1,36 @@
+"""
+GPlay Downloader - Rate Limit
+Token bucket shared by threads that call the FDFE API
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """Allow `rate` calls per second on average, with bursts of up to `burst`.
+
+    `acquire()` blocks until a token is available. A rate of 0 disables
+    limiting.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = self.burst
+        self.waited = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= n
+            # Reserve the tokens now and sleep off the debt outside the lock
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.waited += delay
+        if delay:
+            time.sleep(delay)
@@ -8,10 +8,17 @@ import os
 os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
 
 import json
-import re
+import sys
 import logging
+import queue
+import shutil
+import tempfile
+import threading
 import time
 import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
 from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
@@ -19,6 +26,24 @@ import requests
 import cloudscraper
 import urllib3
 import ssl
+from fdfe_client import FdfeClient
+from token_pool import TokenPool
+from token_health import DEAD_STATUSES, TokenHealth, toc_probe
+from profiles import compile_profiles, load_profiles_file, token_headers
+from ttl_cache import TTLCache
+from swr_cache import SWRCache
+import metrics
+from metrics import PROXY_BYTES, PROXY_IN_FLIGHT, STREAM_SECONDS, TOKEN_CACHE, upstream_call
+from single_flight import SingleFlight
+from artifact_store import ArtifactStore
+from download_engine import DownloadJob, download_all, normalize_sha1
+from bulk_details import bulk_details
+from fdfe_search import SearchError, iter_search
+from dispenser import HEALTH as DISPENSER_HEALTH, TokenRacer
+from zip_stream import bundle, file_crc
+from apk_merge import merge_apks
+from apk_sign import sign_apk
+import play_parser
 
 # --- 1. SSL & Scraper Setup ---
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,6 +64,7 @@ def create_scraper_no_verify():
     return scraper
 
 SCRAPER = create_scraper_no_verify()
+FDFE = FdfeClient()
 
 app = Flask(__name__)
 CORS(app)
@@ -51,12 +77,30 @@ except:
     logger.warning("gpapi library missing! Downloads will fail.")
 
 # Constants
-DISPENSER_URL = "https://auroraoss.com/api/auth"
-FDFE_URL = "https://android.clients.google.com/fdfe"
+# Both can point at a local stand-in (bench/mock_upstream.py); several dispensers are comma-separated
+DISPENSER_URLS = [u.strip() for u in os.environ.get('GPLAY_DISPENSER_URL', '').split(',') if u.strip()] or [
+    "https://auroraoss.com/api/auth",
+]
+FDFE_URL = os.environ.get('GPLAY_FDFE_URL', "https://android.clients.google.com/fdfe")
 PURCHASE_URL = f"{FDFE_URL}/purchase"
 DELIVERY_URL = f"{FDFE_URL}/delivery"
 DETAILS_URL = f"{FDFE_URL}/details"
+BULK_DETAILS_URL = f"{FDFE_URL}/bulkDetails"
 AUTH_CACHE_DIR = Path.home()
+TOKEN_POOL_SIZE = int(os.environ.get('GPLAY_TOKEN_POOL_SIZE', '2'))
+TOKEN_REFRESH_AFTER = int(os.environ.get('GPLAY_TOKEN_REFRESH_AFTER', '1800'))
+# Resolved versionCode/title live longer than the signed download URLs/cookies
+DETAILS_CACHE_TTL = int(os.environ.get('GPLAY_DETAILS_CACHE_TTL', '900'))
+DELIVERY_CACHE_TTL = int(os.environ.get('GPLAY_DELIVERY_CACHE_TTL', '300'))
+SEARCH_CACHE_TTL = int(os.environ.get('GPLAY_SEARCH_CACHE_TTL', '600'))
+INFO_CACHE_TTL = int(os.environ.get('GPLAY_INFO_CACHE_TTL', '3600'))
+# Search/info entries past their TTL are still served (and refreshed in the background) this long
+PAGE_CACHE_STALE_TTL = int(os.environ.get('GPLAY_PAGE_CACHE_STALE_TTL', '86400'))
+# Optional directory to persist the search/info caches across restarts
+PAGE_CACHE_DIR = os.environ.get('GPLAY_PAGE_CACHE_DIR')
+RESULT_CACHE_SIZE = int(os.environ.get('GPLAY_RESULT_CACHE_SIZE', '2048'))
+BULK_MAX_PACKAGES = int(os.environ.get('GPLAY_BULK_MAX_PACKAGES', '5000'))
+DISPENSER_HEADERS = {'User-Agent': 'com.aurora.store-4.6.1-70', 'Content-Type': 'application/json'}
 
 # --- 2. CONFIGURATION PROFILES ---
 
@@ -89,6 +133,22 @@ BASE_DEVICES = {
     }
 }
 
+# Extra devices/regions from GPLAY_PROFILES_FILE (default: profiles.json next to this file)
+try:
+    _added = load_profiles_file(BASE_DEVICES, REGIONS)
+    if _added: logger.info(f"Loaded profiles: {', '.join(_added)}")
+except ValueError as e:
+    logger.warning(f"Ignoring profiles file: {e}")
+
+# ABIs reported per target architecture. Every device also gets a 32-bit
+# variant ("<device>-armv7") so Play delivers armeabi-v7a splits for it.
+ARCH_PLATFORMS = {
+    'arm64-v8a': 'arm64-v8a,armeabi-v7a,armeabi',
+    'armeabi-v7a': 'armeabi-v7a,armeabi',
+}
+for _dev, _props in list(BASE_DEVICES.items()):
+    BASE_DEVICES[f'{_dev}-armv7'] = {**_props, 'Platforms': ARCH_PLATFORMS['armeabi-v7a']}
+
 DEFAULT_PROPS = {
     'TouchScreen': '3', 'Keyboard': '1', 'Navigation': '1', 'ScreenLayout': '2',
     'HasHardKeyboard': 'false', 'HasFiveWayNavigation': 'false',
@@ -100,40 +160,23 @@ DEFAULT_PROPS = {
     'Roaming': 'mobile-notroaming',
 }
 
+# Every device x region compiled once; per request only the token fields are filled in
+PROFILES = compile_profiles(BASE_DEVICES, REGIONS, DEFAULT_PROPS)
+REGION_HEADERS = {profile.region: profile.headers for profile in PROFILES.values()}
+# Token pool / auth cache key ("<device>_<region>") -> profile, so the key is never re-parsed
+PROFILES_BY_KEY = {profile.key: profile for profile in PROFILES.values()}
+
 # --- 3. HELPER FUNCTIONS ---
 
-def get_device_config(dev_key, reg_key):
-    if dev_key not in BASE_DEVICES: dev_key = 's23'
-    if reg_key not in REGIONS: reg_key = 'il'
-    
-    reg_data = REGIONS[reg_key]
-    hw_data = BASE_DEVICES[dev_key]
-    
-    config = DEFAULT_PROPS.copy()
-    config.update(hw_data)
-    config['Locales'] = f"{reg_data['lang']},en_US"
-    config['TimeZone'] = reg_data['tz']
-    config['SimOperator'] = reg_data['sim']
-    config['CellOperator'] = reg_data['sim']
-    
-    return config
+def get_profile(dev_key, reg_key):
+    profile = PROFILES.get((dev_key, reg_key))
+    if profile is None:
+        profile = PROFILES[(dev_key if dev_key in BASE_DEVICES else 's23', reg_key if reg_key in REGIONS else 'il')]
+    return profile
 
-def get_headers(auth, reg_key):
-    reg = REGIONS.get(reg_key, REGIONS['il'])
-    locale = reg['lang'].replace('_', '-')
-    device_info = auth.get('deviceInfoProvider', {})
-    
-    return {
-        'Authorization': f"Bearer {auth.get('authToken')}",
-        'User-Agent': device_info.get('userAgentString', 'Android-Finsky/41.2.29-23'),
-        'X-DFE-Device-Id': auth.get('gsfId', ''),
-        'Accept-Language': locale,
-        'X-DFE-Client-Id': 'am-android-google',
-        'X-DFE-Network-Type': '4',
-        'X-DFE-Content-Filters': '',
-        'X-Limit-Ad-Tracking-Enabled': 'false',
-        'X-DFE-Cookie': auth.get('dfeCookie', ''),
-    }
+def device_for_arch(dev_key, arch):
+    base = dev_key[:-len('-armv7')] if dev_key.endswith('-armv7') else dev_key
+    return base if arch == 'arm64-v8a' else f'{base}-armv7'
 
 def get_cached_auth(cache_key):
     # 1. PRIORITY: Check Environment Variable (Restored!)
@@ -141,7 +184,7 @@ def get_cached_auth(cache_key):
     if env_token:
         try:
             auth = json.loads(env_token)
-            if auth.get('authToken'):
+            if auth.get('authToken') and not TOKEN_HEALTH.is_dead(auth):
                 logger.info("Using auth token from Environment Variable")
                 return auth
         except: 
@@ -151,7 +194,11 @@ def get_cached_auth(cache_key):
     path = AUTH_CACHE_DIR / f".gplay-auth-{cache_key}.json"
     if path.exists():
         try:
-            return json.loads(path.read_text())
+            auth = json.loads(path.read_text())
+            if not TOKEN_HEALTH.is_dead(auth):
+                return auth
+            path.unlink()
+            logger.info(f"Retired dead cached token for {cache_key}")
         except: pass
     return None
 
@@ -160,158 +207,701 @@ def save_cached_auth(auth, cache_key):
         (AUTH_CACHE_DIR / f".gplay-auth-{cache_key}.json").write_text(json.dumps(auth))
     except: pass
 
+def dispenser_racer(profile, check):
+    """TokenRacer over DISPENSER_URLS posting the profile's config; `check(auth)` returns (ok, detail)."""
+    def post(url):
+        return upstream_call('dispenser', create_scraper_no_verify().post, url, data=profile.dispenser_body,
+                             headers=DISPENSER_HEADERS, timeout=30)
+    return TokenRacer(DISPENSER_URLS, post, check)
+
+def fetch_pool_token(cache_key):
+    """A validated token for the pool, or None."""
+    profile = PROFILES_BY_KEY.get(cache_key)
+    if profile is None:
+        logger.warning(f"Token pool [{cache_key}]: unknown device/region profile")
+        return None
+    racer = dispenser_racer(profile, lambda auth: (validate_pool_token(auth, cache_key), 'validation failed'))
+    for event in racer.events():
+        if event['type'] == 'token':
+            return event['auth']
+        logger.info(f"Token pool [{cache_key}]: {event['msg']}")
+    return None
+
+def validate_pool_token(auth, cache_key):
+    """True/False from FDFE toc (or a result seen within the validation window), None if inconclusive."""
+    profile = PROFILES_BY_KEY.get(cache_key)
+    if profile is None: return False
+    return TOKEN_HEALTH.validate(auth, lambda a: toc_probe(FDFE, FDFE_URL, profile.fdfe_headers(a)))
+
+TOKEN_HEALTH = TokenHealth()
+TOKEN_POOL = TokenPool(fetch_pool_token, validate_pool_token, size=TOKEN_POOL_SIZE,
+                       refresh_after=TOKEN_REFRESH_AFTER, is_dead=TOKEN_HEALTH.is_dead)
+
+# Optional pre-warm list, e.g. GPLAY_WARM_PROFILES="s23_il,pixel7_us"
+for _key in filter(None, os.environ.get('GPLAY_WARM_PROFILES', '').split(',')):
+    TOKEN_POOL.register(_key.strip())
+
 # --- 4. CORE DOWNLOAD LOGIC ---
 
-def get_download_info_internal(pkg, auth, reg_key):
+# (pkg, device, region) -> {versionCode, version, title}
+DETAILS_CACHE = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=DETAILS_CACHE_TTL)
+# (pkg, versionCode, device, region) -> full get_download_info_internal result
+DELIVERY_CACHE = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=DELIVERY_CACHE_TTL)
+# (query, region) -> search_apps result, (pkg, region) -> app_info result
+def page_cache(name, ttl):
+    path = None
+    if PAGE_CACHE_DIR:
+        os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+        path = os.path.join(PAGE_CACHE_DIR, f'{name}.json')
+    return SWRCache(maxsize=RESULT_CACHE_SIZE, ttl=ttl, stale_ttl=PAGE_CACHE_STALE_TTL, path=path,
+                    cacheable=lambda res: 'error' not in res)
+
+SEARCH_CACHE = page_cache('search', SEARCH_CACHE_TTL)
+INFO_CACHE = page_cache('info', INFO_CACHE_TTL)
+# In-flight resolutions keyed by (pkg, device, region)
+FLIGHTS = SingleFlight()
+# Verified APKs by sha1, shared with the CLI (GPLAY_STORE_DIR, GPLAY_STORE_MAX_BYTES)
+STORE = ArtifactStore()
+
+def get_download_info_internal(pkg, auth, reg_key, details=None):
+    """Resolve details -> purchase -> delivery. Pass cached `details` to skip step A."""
     if not HAS_GPAPI: return {'error': 'GPAPI missing'}
     
-    headers = {
-        **get_headers(auth, reg_key),
-        'Content-Type': 'application/x-protobuf',
-        'Accept': 'application/x-protobuf'
-    }
+    headers = fdfe_headers(auth, reg_key)
 
     # A. DETAILS
-    try:
-        r = requests.get(f'{DETAILS_URL}?doc={pkg}', headers=headers, timeout=15, verify=False)
-        wrapper = googleplay_pb2.ResponseWrapper()
-        wrapper.ParseFromString(r.content)
-        
-        doc = wrapper.payload.detailsResponse.docV2
-        if not doc.docid: return {'error': 'App not found'}
-        
-        vc = doc.details.appDetails.versionCode
-        if vc == 0: return {'error': 'Incompatible/Restricted'}
-        
-    except Exception as e:
-        return {'error': f'Details failed: {e}'}
+    if not details:
+        try:
+            r = upstream_call('details', FDFE.get, f'{DETAILS_URL}?doc={pkg}', headers=headers, timeout=15)
+            TOKEN_HEALTH.observe(auth, r.status_code)
+            if r.status_code in DEAD_STATUSES: return {'error': f'Token rejected ({r.status_code})'}
+            details = parse_details(r.content)
+            if 'error' in details: return details
+        except Exception as e:
+            return {'error': f'Details failed: {e}'}
+    vc = details['versionCode']
 
     # B. PURCHASE
     try:
-        requests.post(PURCHASE_URL, headers={**headers, 'Content-Type': 'application/x-www-form-urlencoded'},
-                     data=f'doc={pkg}&ot=1&vc={vc}', timeout=10, verify=False)
+        upstream_call('purchase', FDFE.post, PURCHASE_URL,
+                      headers={**headers, 'Content-Type': 'application/x-www-form-urlencoded'},
+                      data=f'doc={pkg}&ot=1&vc={vc}', timeout=10)
     except: pass
 
     # C. DELIVERY
     try:
-        r = requests.get(f'{DELIVERY_URL}?doc={pkg}&ot=1&vc={vc}', headers=headers, timeout=15, verify=False)
-        wrapper = googleplay_pb2.ResponseWrapper()
-        wrapper.ParseFromString(r.content)
-        data = wrapper.payload.deliveryResponse.appDeliveryData
-        
-        if not data.downloadUrl: return {'error': 'No URL returned'}
-        
-        return {
-            'package': pkg,
-            'versionCode': vc,
-            'version': doc.details.appDetails.versionString,
-            'title': doc.title,
-            'downloadUrl': data.downloadUrl,
-            'size': data.downloadSize,
-            'cookies': [{'name': c.name, 'value': c.value} for c in data.downloadAuthCookie],
-            'splits': [{'name': s.name or f'split{i}', 'url': s.downloadUrl} for i,s in enumerate(data.split) if s.downloadUrl]
-        }
+        r = upstream_call('delivery', FDFE.get, f'{DELIVERY_URL}?doc={pkg}&ot=1&vc={vc}',
+                          headers=headers, timeout=15)
+        TOKEN_HEALTH.observe(auth, r.status_code)
+        if r.status_code in DEAD_STATUSES: return {'error': f'Token rejected ({r.status_code})'}
+        return parse_delivery(r.content, pkg, details)
     except Exception as e:
         return {'error': f'Delivery failed: {e}'}
 
+def fdfe_headers(auth, reg_key):
+    return token_headers(REGION_HEADERS.get(reg_key) or REGION_HEADERS['il'], auth)
+
+def parse_details(content):
+    wrapper = googleplay_pb2.ResponseWrapper()
+    wrapper.ParseFromString(content)
+    
+    doc = wrapper.payload.detailsResponse.docV2
+    if not doc.docid: return {'error': 'App not found'}
+    
+    if doc.details.appDetails.versionCode == 0: return {'error': 'Incompatible/Restricted'}
+    return {
+        'versionCode': doc.details.appDetails.versionCode,
+        'version': doc.details.appDetails.versionString,
+        'title': doc.title,
+    }
+
+def parse_delivery(content, pkg, details):
+    wrapper = googleplay_pb2.ResponseWrapper()
+    wrapper.ParseFromString(content)
+    data = wrapper.payload.deliveryResponse.appDeliveryData
+    
+    if not data.downloadUrl: return {'error': 'No URL returned'}
+    
+    return {
+        'package': pkg,
+        'versionCode': details['versionCode'],
+        'version': details['version'],
+        'title': details['title'],
+        'downloadUrl': data.downloadUrl,
+        'size': data.downloadSize,
+        'sha1': normalize_sha1(data.sha1),
+        'cookies': [{'name': c.name, 'value': c.value} for c in data.downloadAuthCookie],
+        'splits': [{'name': s.name or f'split{i}', 'url': s.downloadUrl, 'size': s.size,
+                    'sha1': normalize_sha1(s.sha1)}
+                   for i,s in enumerate(data.split) if s.downloadUrl]
+    }
+
+def get_cached_download_info(pkg, dev_key, reg_key):
+    details = DETAILS_CACHE.get((pkg, dev_key, reg_key))
+    if not details: return None
+    return DELIVERY_CACHE.get((pkg, details['versionCode'], dev_key, reg_key))
+
+def resolve_download_info(pkg, auth, dev_key, reg_key):
+    """get_download_info_internal behind the details/delivery caches."""
+    details = DETAILS_CACHE.get((pkg, dev_key, reg_key))
+    res = get_download_info_internal(pkg, auth, reg_key, details)
+    store_download_info(res, dev_key, reg_key)
+    return res
+
+def store_download_info(res, dev_key, reg_key):
+    if 'error' in res: return
+    details = {k: res[k] for k in ('versionCode', 'version', 'title')}
+    DETAILS_CACHE.set((res['package'], dev_key, reg_key), details)
+    DELIVERY_CACHE.set((res['package'], res['versionCode'], dev_key, reg_key), res)
+
+def any_auth(dev_key, reg_key, fetch=True):
+    """A token for one-shot lookups: pooled, then env/file cache, then (with `fetch`) a dispenser race."""
+    cache_key = get_profile(dev_key, reg_key).key
+    use_pool = not os.environ.get('GPLAY_AUTH_TOKEN')
+    auth = TOKEN_POOL.acquire(cache_key) if use_pool else None
+    if use_pool: TOKEN_CACHE.inc(cache_key, 'pool', 'hit' if auth else 'miss')
+    auth = auth or get_cached_auth(cache_key)
+    if not auth and fetch:
+        auth = fetch_pool_token(cache_key)
+        if auth:
+            save_cached_auth(auth, cache_key)
+            if use_pool: TOKEN_POOL.add(cache_key, auth)
+    return auth
+
+def bulk_app_details(packages, dev_key, reg_key):
+    """versionCode/version/title for many packages; DETAILS_CACHE first, bulkDetails for the rest."""
+    results = {pkg: DETAILS_CACHE.get((pkg, dev_key, reg_key)) for pkg in dict.fromkeys(packages)}
+    missing = [pkg for pkg, res in results.items() if res is None]
+    if missing:
+        auth = any_auth(dev_key, reg_key)
+        if not auth: return {'error': 'No auth token available'}
+        fetched = bulk_details(FDFE, BULK_DETAILS_URL, fdfe_headers(auth, reg_key), missing)
+        for pkg, res in fetched.items():
+            if 'error' not in res: DETAILS_CACHE.set((pkg, dev_key, reg_key), res)
+        results.update(fetched)
+    return {'results': results, 'fetched': len(missing)}
+
+def resolve_check(pkg, dev_key, reg_key):
+    """TokenRacer check that resolves `pkg` with the candidate token."""
+    cache_key = get_profile(dev_key, reg_key).key
+    def check(auth):
+        res = resolve_download_info(pkg, auth, dev_key, reg_key)
+        if 'error' in res:
+            TOKEN_CACHE.inc(cache_key, 'dispenser', 'failure')
+            return False, res['error']
+        return True, res
+    return check
+
+def resolve_events(pkg, dev_key, reg_key):
+    """Token selection + resolution as a stream of progress/success/error events."""
+    profile = get_profile(dev_key, reg_key)
+    cache_key = profile.key
+
+    # 1. Try a warm token from the pool (skipped when an env token is pinned)
+    use_pool = not os.environ.get('GPLAY_AUTH_TOKEN')
+    pooled = TOKEN_POOL.acquire(cache_key) if use_pool else None
+    if use_pool: TOKEN_CACHE.inc(cache_key, 'pool', 'hit' if pooled else 'miss')
+    if pooled:
+        yield {'type':'progress','msg':'Using pooled token...'}
+        res = resolve_download_info(pkg, pooled, dev_key, reg_key)
+        if 'error' not in res:
+            TOKEN_POOL.report_success(cache_key, pooled)
+            yield {'type':'success', **res}
+            return
+        TOKEN_POOL.report_failure(cache_key, pooled)
+        TOKEN_CACHE.inc(cache_key, 'pool', 'failure')
+        yield {'type':'progress','msg':'Pooled token failed, trying cached...'}
+
+    # 2. Try Cached (Env Var or File)
+    cached = get_cached_auth(cache_key)
+    TOKEN_CACHE.inc(cache_key, 'cached', 'hit' if cached else 'miss')
+    if cached:
+        yield {'type':'progress','msg':'Using cached/env token...'}
+        res = resolve_download_info(pkg, cached, dev_key, reg_key)
+        if 'error' not in res:
+            if use_pool: TOKEN_POOL.add(cache_key, cached)
+            yield {'type':'success', **res}
+            return
+        TOKEN_CACHE.inc(cache_key, 'cached', 'failure')
+        yield {'type':'progress','msg':'Cached token failed, trying new...'}
+
+    # 3. Race the dispensers for a new token (only reached when the pool is empty or failing);
+    #    the resolution itself is the validation
+    for event in dispenser_racer(profile, resolve_check(pkg, dev_key, reg_key)).events():
+        if event['type'] == 'token':
+            save_cached_auth(event['auth'], cache_key)
+            if use_pool: TOKEN_POOL.add(cache_key, event['auth'])
+            yield {'type':'success', **event['detail']}
+            return
+        if event['type'] == 'progress':
+            yield event
+
+    yield {'type':'error', 'msg':'Failed to find working token'}
+
 # --- 5. ROUTES ---
 
 @app.route('/')
 def index(): return send_file('index.html')
 
-@app.route('/api/search')
-def search():
-    q = request.args.get('q')
-    reg = request.args.get('region', 'il')
+def search_apps(q, reg, dev='s23'):
+    """FDFE search behind SEARCH_CACHE; the web page is only scraped when FDFE fails."""
+    if not q: return {'error': 'Missing query'}
+    return SEARCH_CACHE.get((q, reg), lambda: fdfe_search_apps(q, dev, reg) or scrape_search_apps(q, reg))
+
+def fdfe_search_apps(q, dev, reg):
+    """First FDFE results page; None (web fallback) unless a pooled or cached token is at hand."""
+    if not HAS_GPAPI: return None
+    # Never wait for a dispenser race on a keystroke; acquiring registers the pool key so it warms up
+    auth = any_auth(dev, reg, fetch=False)
+    if not auth: return None
+    try:
+        results = list(iter_search(FDFE, FDFE_URL, fdfe_headers(auth, reg), q, max_pages=1))
+        return {'results': results, 'source': 'fdfe'}
+    except SearchError as e:
+        logger.info(f"FDFE search failed ({e}), falling back to web search")
+        return None
+
+def scrape_search_apps(q, reg):
     hl = REGIONS.get(reg, REGIONS['il'])['lang'].split('_')[0]
     
     try:
         html = SCRAPER.get(f'https://play.google.com/store/search?q={q}&c=apps&hl={hl}&gl={reg}', timeout=10).text
-        results = []
-        for m in re.finditer(r'href="/store/apps/details\?id=([^"]+)"[^>]*><div[^>]*>([^<]+)</div>', html):
-            if m.group(1) not in [x['package'] for x in results]:
-                results.append({'package': m.group(1), 'title': m.group(2)})
-                if len(results) >= 5: break
-        return jsonify({'results': results})
+        results = play_parser.parse_search(html)
+        for app_ in results:
+            app_['title'] = app_['title'] or app_['package']
+        return {'results': results, 'source': 'web'}
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
-@app.route('/api/info/<path:pkg>')
-def info(pkg):
-    reg = request.args.get('region', 'il')
-    hl = REGIONS.get(reg, REGIONS['il'])['lang'].split('_')[0]
+def app_info(pkg, reg):
+    """Details page info behind INFO_CACHE; failures fall back to the package name."""
     try:
-        r = SCRAPER.get(f'https://play.google.com/store/apps/details?id={pkg}&hl={hl}&gl={reg}', timeout=15)
-        
-        title_m = re.search(r'<h1[^>]*>([^<]+)</h1>', r.text)
-        title = title_m.group(1) if title_m else pkg
-        
-        dev_m = re.search(r'<div[^>]*class="Vbfug "[^>]*><span[^>]*>([^<]+)</span>', r.text)
-        dev = dev_m.group(1) if dev_m else "Unknown"
-        
-        return jsonify({'package': pkg, 'title': title, 'developer': dev})
+        return INFO_CACHE.get((pkg, reg), lambda: scrape_app_info(pkg, reg))
     except:
-        return jsonify({'package': pkg, 'title': pkg, 'developer': 'Unknown'})
+        return {'package': pkg, 'title': pkg, 'developer': 'Unknown'}
+
+def scrape_app_info(pkg, reg):
+    hl = REGIONS.get(reg, REGIONS['il'])['lang'].split('_')[0]
+    r = SCRAPER.get(f'https://play.google.com/store/apps/details?id={pkg}&hl={hl}&gl={reg}', timeout=15)
+    r.raise_for_status()
+    info = play_parser.parse_details(r.text, pkg)
+    info['package'] = pkg
+    info['title'] = info['title'] or pkg
+    info['developer'] = info['developer'] or 'Unknown'
+    return info
+
+@app.route('/api/search')
+def search():
+    return jsonify(search_apps(request.args.get('q'), request.args.get('region', 'il'),
+                               request.args.get('device', 's23')))
+
+@app.route('/api/info/<path:pkg>')
+def info(pkg):
+    return jsonify(app_info(pkg, request.args.get('region', 'il')))
+
+@app.route('/api/bulk-details', methods=['GET', 'POST'])
+def bulk_details_api():
+    data = request.get_json(silent=True) or {}
+    packages = data.get('packages') or [p for p in request.args.get('packages', '').split(',') if p]
+    dev_key = data.get('device') or request.args.get('device', 's23')
+    reg_key = data.get('region') or request.args.get('region', 'il')
+    if dev_key not in BASE_DEVICES: dev_key = 's23'
+    if reg_key not in REGIONS: reg_key = 'il'
+    if not packages: return jsonify({'error': 'packages required'}), 400
+    if len(packages) > BULK_MAX_PACKAGES: return jsonify({'error': f'At most {BULK_MAX_PACKAGES} packages'}), 400
+    res = bulk_app_details(packages, dev_key, reg_key)
+    return jsonify(res), 503 if 'error' in res else 200
+
+def sse(event):
+    return f"data: {json.dumps(event)}\n\n"
 
 @app.route('/api/download-info-stream/<path:pkg>')
 def stream(pkg):
     dev_key = request.args.get('device', 's23')
     reg_key = request.args.get('region', 'il')
-    config = get_device_config(dev_key, reg_key)
-    cache_key = f"{dev_key}_{reg_key}"
+    if dev_key not in BASE_DEVICES: dev_key = 's23'
+    if reg_key not in REGIONS: reg_key = 'il'
     
     def generate():
-        # 1. Try Cached (Env Var or File)
-        cached = get_cached_auth(cache_key)
-        if cached:
-            yield f"data: {json.dumps({'type':'progress','msg':'Using cached/env token...'})}\n\n"
-            res = get_download_info_internal(pkg, cached, reg_key)
-            if 'error' not in res:
-                yield f"data: {json.dumps({'type':'success', **res})}\n\n"
-                return
-            yield f"data: {json.dumps({'type':'progress','msg':'Cached token failed, trying new...'})}\n\n"
-
-        # 2. Get New Token Loop
-        scraper = create_scraper_no_verify()
-        headers = {'User-Agent': 'com.aurora.store-4.6.1-70', 'Content-Type': 'application/json'}
-        
-        for i in range(1, 8):
-            yield f"data: {json.dumps({'type':'progress','msg':f'Generating Token #{i}...'})}\n\n"
-            try:
-                r = scraper.post(DISPENSER_URL, json=config, headers=headers, timeout=30)
-                if r.status_code == 200:
-                    auth = r.json()
-                    res = get_download_info_internal(pkg, auth, reg_key)
-                    if 'error' not in res:
-                        save_cached_auth(auth, cache_key)
-                        yield f"data: {json.dumps({'type':'success', **res})}\n\n"
-                        return
-                    else:
-                        yield f"data: {json.dumps({'type':'progress','msg':f'Error: {res["error"]}'})}\n\n"
-                else:
-                    yield f"data: {json.dumps({'type':'progress','msg':f'Dispenser Err: {r.status_code}'})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'type':'progress','msg':f'Net Err: {str(e)[:20]}'})}\n\n"
-            time.sleep(1.5)
-            
-        yield f"data: {json.dumps({'type':'error', 'msg':'Failed to find working token'})}\n\n"
+        start = time.monotonic()
+        # Recently resolved by someone else
+        hit = get_cached_download_info(pkg, dev_key, reg_key)
+        if hit:
+            STREAM_SECONDS.observe(time.monotonic() - start, 'cached')
+            yield sse({'type':'success', **hit})
+            return
+
+        # Concurrent identical lookups share one resolution and its events
+        events = FLIGHTS.subscribe((pkg, dev_key, reg_key), lambda: resolve_events(pkg, dev_key, reg_key))
+        outcome = 'aborted'
+        try:
+            for event in events:
+                if event['type'] != 'progress': outcome = event['type']
+                yield sse(event)
+        finally:
+            STREAM_SECONDS.observe(time.monotonic() - start, outcome)
 
     return Response(generate(), mimetype='text/event-stream')
 
+# Upstream bytes are relayed as-is (no decoding), so length/range headers stay valid
+PROXY_CHUNK_SIZE = int(os.environ.get('GPLAY_PROXY_CHUNK_SIZE', str(1024 * 1024)))
+PROXY_REQUEST_HEADERS = ('Range', 'If-Range')
+PROXY_RESPONSE_HEADERS = ('Content-Length', 'Content-Range', 'Content-Encoding', 'Accept-Ranges',
+                          'ETag', 'Last-Modified')
+
+def proxy_headers(client_headers, cookie):
+    headers = {'Cookie': cookie} if cookie else {}
+    for h in PROXY_REQUEST_HEADERS:
+        if client_headers.get(h): headers[h] = client_headers[h]
+    return headers
+
+def proxy_response_headers(upstream_headers, name):
+    headers = {h: upstream_headers[h] for h in PROXY_RESPONSE_HEADERS if h in upstream_headers}
+    headers.setdefault('Accept-Ranges', 'bytes')
+    headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return headers
+
+def log_relay(sent, wall, cpu=None):
+    mb = sent / 1e6
+    per_core = f", {mb / max(cpu, 1e-6):.0f} MB/s per core" if cpu is not None else ""
+    logger.info(f"Proxy relayed {mb:.1f} MB in {wall:.2f}s ({mb / max(wall, 1e-6):.1f} MB/s{per_core})")
+
+def store_writer(sha1, status, client_headers):
+    """Tee a full upstream body into the artifact store; kept only if the sha1 matches."""
+    if status != 200 or client_headers.get('Range'): return None
+    return STORE.writer(normalize_sha1(sha1))
+
+def relay(r, writer=None):
+    start, cpu = time.monotonic(), time.thread_time()
+    sent = 0
+    PROXY_IN_FLIGHT.inc()
+    try:
+        for chunk in r.raw.stream(PROXY_CHUNK_SIZE, decode_content=False):
+            sent += len(chunk)
+            PROXY_BYTES.inc(amount=len(chunk))
+            if writer: writer.write(chunk)
+            yield chunk
+    finally:
+        PROXY_IN_FLIGHT.dec()
+        r.close()
+        if writer: writer.commit()
+        log_relay(sent, time.monotonic() - start, time.thread_time() - cpu)
+
 @app.route('/proxy-download')
 def proxy_dl():
     url = request.args.get('url')
     cookie = request.args.get('cookie')
     name = request.args.get('name', 'file.apk')
-    headers = {'Cookie': cookie} if cookie else {}
+    sha1 = request.args.get('sha1')
+
+    # Served from the artifact store when this exact file was fetched before
+    cached = STORE.lookup(normalize_sha1(sha1))
+    if cached:
+        return send_file(cached, as_attachment=True, download_name=name, conditional=True,
+                         mimetype='application/vnd.android.package-archive')
+
+    headers = proxy_headers(request.headers, cookie)
     try:
-        r = requests.get(url, headers=headers, stream=True, verify=False, timeout=120)
-        return Response(r.iter_content(chunk_size=8192), 
-                        headers={'Content-Disposition': f'attachment; filename="{name}"'},
+        r = upstream_call('proxy', FDFE.get, url, headers=headers, stream=True, timeout=120)
+        writer = store_writer(sha1, r.status_code, request.headers)
+        return Response(relay(r, writer), status=r.status_code,
+                        headers=proxy_response_headers(r.headers, name),
                         content_type='application/vnd.android.package-archive')
     except Exception as e:
         return str(e), 500
 
+# Delivery info posted for /api/bundle, by id; the signed URLs expire anyway
+BUNDLES = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=DELIVERY_CACHE_TTL)
+BUNDLE_WORKERS = int(os.environ.get('GPLAY_BUNDLE_WORKERS', '4'))
+
+def register_bundle(data):
+    """Validate posted delivery info and keep it for the GET; returns (response dict, status)."""
+    if not isinstance(data, dict) or not data.get('downloadUrl') or not data.get('package'):
+        return {'error': 'package and downloadUrl required'}, 400
+    bundle_id = uuid.uuid4().hex
+    BUNDLES.set(bundle_id, data)
+    return {'id': bundle_id, 'url': f'/api/bundle/{bundle_id}'}, 200
+
+def bundle_parts(data):
+    pkg = data['package']
+    parts = [{'name': f"{pkg}-base.apk", 'url': data['downloadUrl'], 'sha1': data.get('sha1')}]
+    parts += [{'name': f"{pkg}-{s['name']}.apk", 'url': s['url'], 'sha1': s.get('sha1')}
+              for s in data.get('splits', []) if s.get('url')]
+    return parts
+
+def fetch_bundle_part(part, cookie, stop):
+    """Local copy of one part: the artifact store's, or a temp download teed into the store.
+
+    Gives up (closing the upstream response) as soon as `stop` is set.
+    """
+    sha1 = normalize_sha1(part['sha1'])
+    cached = STORE.lookup(sha1)
+    if cached: return (cached, *file_crc(cached), False)
+    fd, tmp = tempfile.mkstemp(prefix='gplay-bundle-', suffix='.apk')
+    writer = None
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            r = upstream_call('bundle', FDFE.get, part['url'], headers={'Cookie': cookie} if cookie else {},
+                              stream=True, timeout=120)
+            if r.status_code != 200:
+                r.close()
+                raise IOError(f"{part['name']}: HTTP {r.status_code}")
+            writer = STORE.writer(sha1)
+            crc = size = 0
+            for chunk in relay(r, writer):
+                if stop.is_set():
+                    raise IOError(f"{part['name']}: bundle abandoned")
+                f.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+        return tmp, crc, size, True
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def bundle_stream(data, stop=None):
+    cookie = '; '.join(f"{c['name']}={c['value']}" for c in data.get('cookies', []))
+    return bundle(bundle_parts(data), lambda part, stop: fetch_bundle_part(part, cookie, stop),
+                  workers=BUNDLE_WORKERS, log=logger.info, stop=stop)
+
+def bundle_headers(data):
+    return {'Content-Disposition': f'attachment; filename="{data["package"]}-{data.get("versionCode", 0)}.zip"'}
+
+@app.route('/api/bundle', methods=['POST'])
+def bundle_register():
+    res, status = register_bundle(request.get_json(silent=True))
+    return jsonify(res), status
+
+@app.route('/api/bundle/<bundle_id>')
+def bundle_download(bundle_id):
+    """Base + splits as one store-mode ZIP, streamed while the parts download."""
+    data = BUNDLES.get(bundle_id)
+    if not data: return jsonify({'error': 'Unknown or expired bundle'}), 404
+    return Response(bundle_stream(data), headers=bundle_headers(data), mimetype='application/zip')
+
+# --- MERGE JOBS ---
+
+MERGE_WORKERS = int(os.environ.get('GPLAY_MERGE_WORKERS', '2'))
+MERGE_QUEUE_MAX = int(os.environ.get('GPLAY_MERGE_QUEUE_MAX', '16'))
+MERGE_CACHE_TTL = int(os.environ.get('GPLAY_MERGE_CACHE_TTL', '3600'))
+MERGE_DIR = Path(os.environ.get('GPLAY_MERGE_DIR', Path(tempfile.gettempdir()) / 'gplay-merged'))
+# At most MERGE_WORKERS jobs download+merge at once; the rest wait in the pool's queue
+MERGE_FLIGHTS = SingleFlight(pool=ThreadPoolExecutor(max_workers=MERGE_WORKERS, thread_name_prefix='merge'))
+# (pkg, versionCode, arch) -> success event of a finished merge
+MERGED = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=MERGE_CACHE_TTL)
+# id -> {'path', 'name'} for /api/download-temp
+MERGED_FILES = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=MERGE_CACHE_TTL)
+
+def merged_result(pkg, version_code, arch):
+    """The cached success event for this build, if its file is still there."""
+    hit = MERGED.get((pkg, version_code, arch))
+    if hit and os.path.exists(hit['path']):
+        return {**hit, 'cached': True}
+    return None
+
+def prune_merge_dir():
+    """Remove merged files older than MERGE_CACHE_TTL (their cache entries have expired)."""
+    cutoff = time.time() - MERGE_CACHE_TTL
+    for path in MERGE_DIR.glob('*') if MERGE_DIR.exists() else []:
+        try:
+            if path.stat().st_mtime < cutoff:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        except OSError:
+            pass
+
+def download_events(jobs):
+    """download_all on a helper thread, yielding progress events as bytes arrive."""
+    updates = queue.Queue()
+    failure = []
+
+    def run():
+        try:
+            download_all(FDFE, jobs, workers=4, on_progress=lambda done, total: updates.put((done, total)),
+                         store=STORE)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            updates.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    shown = -1
+    while (update := updates.get()) is not None:
+        percent = min(update[0] * 100 // update[1], 100) if update[1] else 0
+        if percent >= shown + 5:
+            shown = percent
+            yield {'type':'progress','msg':f'Downloading {len(jobs)} files... {percent}%','percent':percent}
+    if failure: raise failure[0]
+
+def merge_job(pkg, dev_key, reg_key, arch):
+    """Resolve, download, merge and sign one build; runs on the merge pool."""
+    started = time.monotonic()
+    res = get_cached_download_info(pkg, dev_key, reg_key)
+    if not res:
+        for event in FLIGHTS.subscribe((pkg, dev_key, reg_key), lambda: resolve_events(pkg, dev_key, reg_key)):
+            if event['type'] == 'success':
+                res = event
+            else:
+                yield event
+                if event['type'] == 'error': return
+        if not res: return
+    hit = merged_result(pkg, res['versionCode'], arch)
+    if hit:
+        yield hit
+        return
+
+    prune_merge_dir()
+    MERGE_DIR.mkdir(parents=True, exist_ok=True)
+    work = Path(tempfile.mkdtemp(prefix='job-', dir=MERGE_DIR))
+    cookie = '; '.join(f"{c['name']}={c['value']}" for c in res.get('cookies', []))
+    headers = {'Cookie': cookie} if cookie else {}
+    jobs = [DownloadJob(res['downloadUrl'], work / 'base.apk', headers, size=res['size'], sha1=res['sha1'])]
+    jobs += [DownloadJob(s['url'], work / f"split-{i}.apk", headers, size=s.get('size', 0), sha1=s['sha1'])
+             for i, s in enumerate(res['splits'])]
+    try:
+        yield from download_events(jobs)
+        timing = {'download': round(time.monotonic() - started, 2)}
+        file_id = uuid.uuid4().hex
+        output = MERGE_DIR / f'{file_id}.apk'
+        if len(jobs) > 1:
+            yield {'type':'progress','msg':f'Merging {len(jobs) - 1} splits...'}
+            step = time.monotonic()
+            method = merge_apks(jobs[0].path, [job.path for job in jobs[1:]], output)
+            timing['merge'] = round(time.monotonic() - step, 2)
+            yield {'type':'progress','msg':'Signing...'}
+            step = time.monotonic()
+            sign_apk(output, log=logger.info)
+            timing['sign'] = round(time.monotonic() - step, 2)
+        else:
+            # No splits: hand out the original, originally signed APK
+            method = None
+            os.replace(jobs[0].path, output)
+    except Exception as e:
+        logger.error(f"Merge job {pkg} ({arch}) failed: {e}")
+        yield {'type':'error','msg':f'Merge failed: {e}'}
+        return
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    name = f"{pkg}-{res['versionCode']}-{arch}{'-merged' if method else ''}.apk"
+    result = {
+        'type': 'success', 'id': file_id, 'url': f'/api/download-temp/{file_id}', 'name': name,
+        'path': str(output), 'size': os.path.getsize(output), 'method': method, 'timing': timing,
+        'package': pkg, 'versionCode': res['versionCode'], 'version': res['version'], 'title': res['title'],
+        'arch': arch,
+    }
+    MERGED.set((pkg, res['versionCode'], arch), result)
+    MERGED_FILES.set(file_id, {'path': str(output), 'name': name})
+    logger.info(f"Merged {pkg} {res['versionCode']} ({arch}) in {time.monotonic() - started:.1f}s: {timing}")
+    yield {**result, 'cached': False}
+
+def merged_events(pkg, dev_key, reg_key, arch):
+    """Events for a merged build: instant from MERGED, else joins or queues a merge job."""
+    dev_key = device_for_arch(dev_key, arch)
+    details = DETAILS_CACHE.get((pkg, dev_key, reg_key))
+    hit = details and merged_result(pkg, details['versionCode'], arch)
+    if hit: return iter([hit])
+
+    key = (pkg, dev_key, reg_key, arch)
+    in_flight = MERGE_FLIGHTS.stats()['in_flight']
+    joining = key in MERGE_FLIGHTS
+    if not joining and in_flight >= MERGE_WORKERS + MERGE_QUEUE_MAX:
+        return iter([{'type':'error','msg':'Merge queue is full, try again later'}])
+    events = MERGE_FLIGHTS.subscribe(key, lambda: merge_job(pkg, dev_key, reg_key, arch))
+    if not joining and in_flight >= MERGE_WORKERS:
+        return chain([{'type':'progress','msg':f'Queued ({in_flight - MERGE_WORKERS + 1} ahead)...'}], events)
+    return events
+
+def public_event(event):
+    return {k: v for k, v in event.items() if k != 'path'}
+
+def merge_params(args):
+    dev_key = args.get('device', 's23')
+    reg_key = args.get('region', 'il')
+    arch = args.get('arch', 'arm64-v8a')
+    if dev_key not in BASE_DEVICES: dev_key = 's23'
+    if reg_key not in REGIONS: reg_key = 'il'
+    if arch not in ARCH_PLATFORMS: arch = 'arm64-v8a'
+    return dev_key, reg_key, arch
+
+@app.route('/api/download-merged-stream/<path:pkg>')
+def merged_stream(pkg):
+    """SSE progress of a server-side merge; `success` carries the /api/download-temp url."""
+    dev_key, reg_key, arch = merge_params(request.args)
+
+    def generate():
+        for event in merged_events(pkg, dev_key, reg_key, arch):
+            yield sse(public_event(event))
+
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/download-temp/<file_id>')
+def download_temp(file_id):
+    entry = MERGED_FILES.get(file_id)
+    if not entry or not os.path.exists(entry['path']):
+        return jsonify({'error': 'Unknown or expired file'}), 404
+    return send_file(entry['path'], as_attachment=True, download_name=entry['name'], conditional=True,
+                     mimetype='application/vnd.android.package-archive')
+
+@app.route('/api/stats')
+def stats():
+    return jsonify({
+        'fdfe': FDFE.stats(),
+        'token_pool': TOKEN_POOL.stats(),
+        'dispensers': DISPENSER_HEALTH.stats(),
+        'token_health': TOKEN_HEALTH.stats(),
+        'details_cache': DETAILS_CACHE.stats(),
+        'search_cache': SEARCH_CACHE.stats(),
+        'info_cache': INFO_CACHE.stats(),
+        'delivery_cache': DELIVERY_CACHE.stats(),
+        'flights': FLIGHTS.stats(),
+        'artifact_store': STORE.stats(),
+        'merge_jobs': MERGE_FLIGHTS.stats(),
+        'merged_cache': MERGED.stats(),
+    })
+
+# Cache and pool counters, read when /metrics is scraped
+CACHES = {'details': DETAILS_CACHE, 'delivery': DELIVERY_CACHE, 'search': SEARCH_CACHE, 'info': INFO_CACHE,
+          'merged': MERGED}
+
+def cache_stats(field):
+    return lambda: {(name,): cache.stats()[field] for name, cache in CACHES.items()}
+
+metrics.Callback('gplay_cache_entries', 'Entries per result cache', ('cache',), cache_stats('size'))
+metrics.Callback('gplay_cache_hits_total', 'Result cache hits', ('cache',), cache_stats('hits'), kind='counter')
+metrics.Callback('gplay_cache_misses_total', 'Result cache misses', ('cache',), cache_stats('misses'),
+                 kind='counter')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Cache-Control': 'max-age=0'
+}
+
+def guess_filename(url, headers, filename):
+    """Get filename from response headers (or the URL) if not provided."""
+    if filename != 'download.apk':
+        return filename
+    content_disp = headers.get('content-disposition', '')
+    if 'filename=' in content_disp:
+        return content_disp.split('filename=')[-1].strip('"')
+    # Extract from URL
+    return url.split('/')[-1].split('?')[0] or 'download.apk'
+
 @app.route('/api/download-url', methods=['POST'])
 def download_url():
     """Download any file from URL via server"""
@@ -326,35 +916,11 @@ def download_url():
         # Download file to server using cloudscraper with browser headers
         logger.info(f"Downloading from URL: {url}")
         
-        # Use cloudscraper to bypass protections
+        # Use cloudscraper (with realistic browser headers) to bypass protections
         scraper = create_scraper_no_verify()
-        
-        # Add realistic browser headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Cache-Control': 'max-age=0'
-        }
-        
-        r = scraper.get(url, headers=headers, stream=True, timeout=60)
+        r = scraper.get(url, headers=BROWSER_HEADERS, stream=True, timeout=60)
         r.raise_for_status()
-        
-        # Get filename from headers if not provided
-        if filename == 'download.apk':
-            content_disp = r.headers.get('content-disposition', '')
-            if 'filename=' in content_disp:
-                filename = content_disp.split('filename=')[-1].strip('"')
-            else:
-                # Extract from URL
-                filename = url.split('/')[-1].split('?')[0] or 'download.apk'
+        filename = guess_filename(url, r.headers, filename)
         
         # Stream back to client
         return Response(
@@ -369,4 +935,11 @@ def download_url():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    if '--asgi' in sys.argv or os.environ.get('GPLAY_SERVER') == 'asgi':
+        # Async variant: share this module's state instead of importing it twice
+        import uvicorn
+        sys.modules['server'] = sys.modules[__name__]
+        from asgi_server import app as asgi_app
+        uvicorn.run(asgi_app, host='0.0.0.0', port=5000)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=True)
@@ -87,7 +87,8 @@ KEYSTORE_DIR="$HOME/.android"
 KEYSTORE_FILE="$KEYSTORE_DIR/debug.keystore"
 if [ ! -f "$KEYSTORE_FILE" ]; then
     mkdir -p "$KEYSTORE_DIR"
-    keytool -genkey -v -keystore "$KEYSTORE_FILE" \
+    # PKCS12 so the built-in signer can read it (JKS keystores need apksigner)
+    keytool -genkey -v -keystore "$KEYSTORE_FILE" -storetype PKCS12 \
         -storepass android -alias androiddebugkey -keypass android \
         -keyalg RSA -keysize 2048 -validity 10000 \
         -dname "CN=Android Debug,O=Android,C=US" 2>/dev/null
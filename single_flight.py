@@ -0,0 +1,151 @@
+"""
+GPlay Downloader - Single Flight
+Coalesces concurrent identical lookups onto one in-flight producer
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.cond = threading.Condition()
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    def follow(self):
+        """Yield every event of the flight, replaying the ones already published."""
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.events) and not self.done:
+                    self.cond.wait()
+                batch = self.events[i:]
+                i = len(self.events)
+                if not batch and self.done:
+                    return
+            yield from batch
+
+
+class SingleFlight:
+    """Run `producer()` once per key no matter how many callers subscribe.
+
+    The producer (a generator of events) runs in a background thread, so a
+    subscriber disconnecting never cancels the work for the others. Every
+    subscriber, including late joiners, receives the full event sequence;
+    if the producer raises, it ends with an {'type': 'error'} event.
+    With an executor `pool`, producers run on it instead of their own
+    thread, which bounds how many run at once; the rest wait in its queue.
+    """
+
+    def __init__(self, pool=None):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.pool = pool
+        self.started = 0
+        self.shared = 0
+
+    def __contains__(self, key):
+        return key in self._flights
+
+    def subscribe(self, key, producer):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.started += 1
+                if self.pool:
+                    self.pool.submit(self._run, key, flight, producer)
+                else:
+                    threading.Thread(target=self._run, args=(key, flight, producer),
+                                     name=f'flight-{key}', daemon=True).start()
+            else:
+                self.shared += 1
+        return flight.follow()
+
+    def _run(self, key, flight, producer):
+        try:
+            for event in producer():
+                flight.publish(event)
+        except Exception as e:
+            logger.exception(f"Flight {key} failed: {e}")
+            # Subscribers (e.g. an EventSource) must see a final event, or they reconnect and retry
+            flight.publish({'type': 'error', 'msg': f'Internal error: {e}'})
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.close()
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), 'started': self.started, 'shared': self.shared}
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.cond = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, event):
+        async with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    async def close(self):
+        async with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    async def follow(self):
+        i = 0
+        while True:
+            async with self.cond:
+                while i >= len(self.events) and not self.done:
+                    await self.cond.wait()
+                batch = self.events[i:]
+                i = len(self.events)
+                if not batch and self.done:
+                    return
+            for event in batch:
+                yield event
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for async generators; the producer runs as an asyncio task."""
+
+    def subscribe(self, key, producer):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _AsyncFlight()
+            self.started += 1
+            flight.task = asyncio.ensure_future(self._run(key, flight, producer))
+        else:
+            self.shared += 1
+        return flight.follow()
+
+    async def _run(self, key, flight, producer):
+        try:
+            async for event in producer():
+                await flight.publish(event)
+        except Exception as e:
+            logger.exception(f"Flight {key} failed: {e}")
+            await flight.publish({'type': 'error', 'msg': f'Internal error: {e}'})
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            await flight.close()
@@ -0,0 +1,167 @@
+"""
+GPlay Downloader - Stale-While-Revalidate Cache
+Size-bounded LRU cache that serves stale entries while refreshing them in the background
+
+Entries are fresh for `ttl` seconds and may then be served stale for another
+`stale_ttl` seconds; the first stale read starts one background refresh and
+returns at once. Concurrent misses for a key share one load. With a `path`
+the entries are written to a JSON file (shortly after changes and at exit)
+and read back on start, so a restart begins warm.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SAVE_DELAY = 5
+
+
+class SWRCache:
+    """`get(key, load)` returns load()'s result through the cache.
+
+    Results for which `cacheable(result)` is false are returned but not
+    stored. If a background refresh fails the stale entry is kept and
+    served until it expires. Keys must be tuples of JSON values when a
+    `path` is given. Times are wall-clock so they survive restarts.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=86400, path=None, workers=2, cacheable=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.cacheable = cacheable or (lambda value: True)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._data = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='swr')
+        self._save_timer = None
+        if path:
+            self._load_file()
+            atexit.register(self.save)
+
+    def get(self, key, load):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and now - item[0] < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                if now - item[0] < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if key not in self._loading:
+                        self._loading[key] = Future()
+                        self._pool.submit(self._refresh, key, load)
+                return item[1]
+            self.misses += 1
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            value = load()
+        except Exception as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, value)
+        return value
+
+    def _refresh(self, key, load):
+        future = self._loading[key]
+        try:
+            value = load()
+        except Exception as e:
+            logger.info(f"Background refresh of {key} failed: {e}")
+            with self._lock:
+                self.refresh_errors += 1
+            self._finish(key, future, exception=e)
+            return
+        with self._lock:
+            self.refreshes += 1
+        self._finish(key, future, value)
+
+    def _finish(self, key, future, value=None, exception=None):
+        if exception is None and self.cacheable(value):
+            self.set(key, value)
+        with self._lock:
+            self._loading.pop(key, None)
+        if exception is None:
+            future.set_result(value)
+        else:
+            future.set_exception(exception)
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl + self.stale_ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if self.path and self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def save(self):
+        """Write all unexpired entries to `path` (atomically)."""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            self._save_timer = None
+            entries = [[list(key), stored, value] for key, (stored, value) in self._data.items()
+                       if now - stored < self.ttl + self.stale_ttl]
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save cache to {self.path}: {e}")
+
+    def _load_file(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache file {self.path}: {e}")
+            return
+        now = time.time()
+        for key, stored, value in entries[-self.maxsize:] if self.maxsize > 0 else []:
+            if now - stored < self.ttl + self.stale_ttl:
+                self._data[tuple(key)] = (stored, value)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'stale_hits': self.stale_hits, 'misses': self.misses,
+                    'refreshes': self.refreshes, 'refresh_errors': self.refresh_errors}
@@ -0,0 +1,81 @@
+import struct
+import zipfile
+
+import pytest
+
+from android_res import (NO_ENTRY, RES_STRING_POOL_TYPE, RES_XML_END_ELEMENT_TYPE, RES_XML_START_ELEMENT_TYPE,
+                         RES_XML_TYPE, TYPE_STRING, UTF8_FLAG, StringPool)
+from apk_merge import MergeUnsupported, merge_native
+
+
+def axml_manifest(**attrs):
+    """A binary AndroidManifest.xml holding only <manifest> with string attributes `attrs`."""
+    pool = StringPool(struct.pack('<HHIIIIII', RES_STRING_POOL_TYPE, 28, 28, 0, 0, UTF8_FLAG, 28, 0))
+    tag = pool.add('manifest')
+    packed = b''
+    for name, value in attrs.items():
+        value_index = pool.add(value)
+        packed += struct.pack('<IIIHBBI', NO_ENTRY, pool.add(name), value_index, 8, 0, TYPE_STRING, value_index)
+    start = struct.pack('<IIHHHHHH', NO_ENTRY, tag, 20, 20, len(attrs), 0, 0, 0) + packed
+    start = struct.pack('<HHIII', RES_XML_START_ELEMENT_TYPE, 16, 16 + len(start), 1, NO_ENTRY) + start
+    end = struct.pack('<HHIIIII', RES_XML_END_ELEMENT_TYPE, 16, 24, 1, NO_ENTRY, NO_ENTRY, tag)
+    body = pool.serialize() + start + end
+    return struct.pack('<HHI', RES_XML_TYPE, 8, 8 + len(body)) + body
+
+
+def write_apk(path, manifest, entries):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('AndroidManifest.xml', manifest)
+        for name, data in entries.items():
+            z.writestr(name, data)
+    return path
+
+
+@pytest.fixture
+def base(tmp_path):
+    return write_apk(tmp_path / 'base.apk', axml_manifest(package='com.example'),
+                     {'classes.dex': b'base dex', 'res/icon.png': b'base icon'})
+
+
+def test_config_split_is_merged(tmp_path, base):
+    split = write_apk(tmp_path / 'split.apk', axml_manifest(package='com.example', split='config.arm64_v8a'),
+                      {'lib/arm64-v8a/libapp.so': b'native', 'res/icon.png': b'split icon'})
+    out = tmp_path / 'out.apk'
+    merge_native(base, [split], out)
+    with zipfile.ZipFile(out) as z:
+        assert z.testzip() is None
+        assert z.read('classes.dex') == b'base dex'
+        assert z.read('lib/arm64-v8a/libapp.so') == b'native'
+        assert z.read('res/icon.png') == b'base icon'
+
+
+def test_split_with_conflicting_dex_is_unsupported(tmp_path, base):
+    split = write_apk(tmp_path / 'split.apk', axml_manifest(package='com.example', split='config.xxhdpi'),
+                      {'classes.dex': b'split dex'})
+    out = tmp_path / 'out.apk'
+    with pytest.raises(MergeUnsupported, match='classes.dex'):
+        merge_native(base, [split], out)
+    assert not out.exists()
+
+
+def test_conflicting_native_library_is_unsupported(tmp_path, base):
+    splits = [write_apk(tmp_path / f'split{i}.apk', axml_manifest(package='com.example', split=name),
+                        {'lib/arm64-v8a/libapp.so': name.encode()})
+              for i, name in enumerate(['config.arm64_v8a', 'config.xxhdpi'])]
+    with pytest.raises(MergeUnsupported, match='libapp.so'):
+        merge_native(base, splits, tmp_path / 'out.apk')
+
+
+def test_feature_split_is_unsupported(tmp_path, base):
+    split = write_apk(tmp_path / 'split.apk', axml_manifest(package='com.example', split='camera'),
+                      {'classes2.dex': b'feature dex'})
+    with pytest.raises(MergeUnsupported, match='not a base configuration split'):
+        merge_native(base, [split], tmp_path / 'out.apk')
+
+
+def test_config_split_of_a_feature_is_unsupported(tmp_path, base):
+    split = write_apk(tmp_path / 'split.apk',
+                      axml_manifest(package='com.example', split='config.arm64_v8a', configForSplit='camera'),
+                      {'lib/arm64-v8a/libcamera.so': b'native'})
+    with pytest.raises(MergeUnsupported):
+        merge_native(base, [split], tmp_path / 'out.apk')
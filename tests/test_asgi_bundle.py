@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+from starlette.requests import ClientDisconnect  # noqa: E402
+
+SLOW_PART_SIZE = 16 * 1024 * 1024
+
+
+class Parts(BaseHTTPRequestHandler):
+    """/small.apk at once, /slow.apk a few KB at a time; records when a slow download is dropped."""
+    protocol_version = 'HTTP/1.1'
+    hung_up = None
+
+    def do_GET(self):
+        size = SLOW_PART_SIZE if self.path == '/slow.apk' else 1024
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        try:
+            for _ in range(size // 1024):
+                self.wfile.write(b'\0' * 1024)
+                if size == SLOW_PART_SIZE:
+                    time.sleep(0.001)
+        except OSError:
+            self.hung_up.set()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    Parts.hung_up = threading.Event()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Parts)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+
+
+@pytest.fixture
+def asgi_server(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    import asgi_server
+    monkeypatch.setattr(asgi_server.STORE, 'root', tmp_path / 'store', raising=False)
+    return asgi_server
+
+
+async def get_until_first_chunk(app, path, spec_version):
+    """GET `path` and hang up once the first body chunk arrives.
+
+    ASGI 2.4 servers report a gone client by failing `send`; older ones
+    answer `receive` with http.disconnect.
+    """
+    first_chunk = asyncio.Event()
+    requested = False
+    scope = {'type': 'http', 'asgi': {'version': '3.0', 'spec_version': spec_version}, 'http_version': '1.1',
+             'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'headers': [], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await first_chunk.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            first_chunk.set()
+            if spec_version == '2.4':
+                raise OSError('client went away')
+
+    try:
+        await asyncio.wait_for(app(scope, receive, send), timeout=30)
+    except ClientDisconnect:
+        pass
+
+
+@pytest.mark.parametrize('spec_version', ['2.3', '2.4'])
+def test_disconnect_stops_bundle_part_downloads(asgi_server, upstream, spec_version):
+    res, status = asgi_server.register_bundle({
+        'package': 'com.example', 'downloadUrl': f'{upstream}/small.apk',
+        'splits': [{'name': 'config.xxhdpi', 'url': f'{upstream}/slow.apk'}],
+    })
+    assert status == 200
+    # In a thread, so a request that never finishes fails the test instead of hanging it
+    client = threading.Thread(target=asyncio.run, args=(get_until_first_chunk(asgi_server.app, res['url'],
+                                                                              spec_version),), daemon=True)
+    client.start()
+    assert Parts.hung_up.wait(10), 'the split kept downloading after the client disconnected'
+    client.join(10)
+    assert not client.is_alive()
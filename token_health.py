@@ -0,0 +1,92 @@
+"""
+GPlay Downloader - Token Health
+Cheap token validation through FDFE toc, with remembered results
+
+A token is checked with GET <fdfe>/toc, which returns a small
+TocResponse and needs no app lookup, instead of a full details call.
+Results are kept per authToken with the time they were observed: a token
+that passed is not probed again for `window` seconds, and one that FDFE
+rejected (401/403) stays dead. Any call that sees a token's status (a
+details or delivery response) can `observe` it, so dead tokens are
+retired before a user request tries them.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+VALIDATE_WINDOW = int(os.environ.get('GPLAY_TOKEN_VALIDATE_WINDOW', '300'))
+DEAD_STATUSES = (401, 403)
+
+
+def toc_probe(client, fdfe_url, headers, timeout=10):
+    """True if the token works, False if FDFE rejected it, None if the answer says nothing about the token."""
+    try:
+        r = client.get(f'{fdfe_url}/toc', headers=headers, timeout=timeout)
+    except Exception:
+        return None
+    if r.status_code == 200:
+        return True
+    if r.status_code in DEAD_STATUSES:
+        return False
+    return None
+
+
+class TokenHealth:
+    """Last validation result and its time per authToken (LRU, `maxsize` tokens)."""
+
+    def __init__(self, window=VALIDATE_WINDOW, maxsize=1024):
+        self.window = window
+        self.maxsize = maxsize
+        self.probes = 0
+        self.skipped = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, auth, ok):
+        token = auth.get('authToken')
+        if not token:
+            return
+        with self._lock:
+            previous = self._results.get(token)
+            if previous and previous[0] is False:
+                return  # Rejected tokens do not come back
+            self._results[token] = (ok, time.time())
+            self._results.move_to_end(token)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def observe(self, auth, status):
+        """Record what an FDFE response status says about the token that made the call."""
+        if status == 200:
+            self.record(auth, True)
+        elif status in DEAD_STATUSES:
+            self.record(auth, False)
+
+    def is_dead(self, auth):
+        with self._lock:
+            result = self._results.get(auth.get('authToken'))
+        return bool(result) and result[0] is False
+
+    def validate(self, auth, probe):
+        """Whether `auth` works: the recorded result inside the window, else `probe(auth)`.
+
+        `probe` returns True, False or None (inconclusive, e.g. 429 or a network
+        error); inconclusive results are returned as None and not recorded.
+        """
+        with self._lock:
+            result = self._results.get(auth.get('authToken'))
+            if result and (result[0] is False or time.time() - result[1] < self.window):
+                self.skipped += 1
+                return result[0]
+            self.probes += 1
+        ok = probe(auth)
+        if ok is not None:
+            self.record(auth, ok)
+        return ok
+
+    def stats(self):
+        with self._lock:
+            dead = sum(1 for ok, _ in self._results.values() if ok is False)
+            return {'tokens': len(self._results), 'dead': dead, 'probes': self.probes, 'skipped': self.skipped,
+                    'window': self.window}
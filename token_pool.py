@@ -0,0 +1,153 @@
+"""
+GPlay Downloader - Token Pool
+Keeps validated auth tokens warm per device/region profile
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledToken:
+    __slots__ = ('auth', 'created', 'failures')
+
+    def __init__(self, auth):
+        self.auth = auth
+        self.created = time.time()
+        self.failures = 0
+
+
+class TokenPool:
+    """Pool of validated tokens per cache key ("<device>_<region>").
+
+    Request handlers only call `acquire`, `add` and `report_*`, which never
+    touch the network. A single background worker keeps `size` tokens per
+    registered key: it gets new ones through `fetch(cache_key)`, which
+    returns an already validated token (or None) and handles its own
+    retries, re-validates tokens older than `refresh_after` seconds with
+    `validate(auth, cache_key)` (True, False, or None when inconclusive) and
+    drops tokens that failed `max_failures` times in a row. Tokens for which
+    the optional `is_dead(auth)` holds are dropped as soon as they are seen.
+    """
+
+    def __init__(self, fetch, validate, size=2, refresh_after=1800, interval=30, max_failures=2, is_dead=None):
+        self.fetch = fetch
+        self.validate = validate
+        self.is_dead = is_dead
+        self.size = size
+        self.refresh_after = refresh_after
+        self.interval = interval
+        self.max_failures = max_failures
+        self._tokens = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    # --- Request path (non-blocking) ---
+
+    def register(self, cache_key):
+        with self._lock:
+            if cache_key not in self._tokens:
+                self._tokens[cache_key] = []
+                self._cursor[cache_key] = 0
+                self._wake.set()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='token-pool', daemon=True)
+                self._worker.start()
+
+    def acquire(self, cache_key):
+        """Return the next pooled token round-robin, or None if the pool is empty."""
+        self.register(cache_key)
+        with self._lock:
+            tokens = self._tokens[cache_key]
+            if self.is_dead:
+                alive = [t for t in tokens if not self.is_dead(t.auth)]
+                if len(alive) < len(tokens):
+                    tokens[:] = alive
+                    logger.info(f"Token pool [{cache_key}]: retired dead token")
+                    self._wake.set()
+            if not tokens:
+                return None
+            i = self._cursor[cache_key] % len(tokens)
+            self._cursor[cache_key] = i + 1
+            return tokens[i].auth
+
+    def add(self, cache_key, auth):
+        """Add a token that is already known to work."""
+        self.register(cache_key)
+        with self._lock:
+            tokens = self._tokens[cache_key]
+            if any(t.auth.get('authToken') == auth.get('authToken') for t in tokens):
+                return
+            tokens.append(_PooledToken(auth))
+            del tokens[:-self.size]
+
+    def report_success(self, cache_key, auth):
+        with self._lock:
+            token = self._find(cache_key, auth)
+            if token:
+                token.failures = 0
+
+    def report_failure(self, cache_key, auth):
+        with self._lock:
+            token = self._find(cache_key, auth)
+            if not token:
+                return
+            token.failures += 1
+            if token.failures >= self.max_failures:
+                self._tokens[cache_key].remove(token)
+                logger.info(f"Token pool [{cache_key}]: evicted failing token")
+                self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {key: len(tokens) for key, tokens in self._tokens.items()}
+
+    def _find(self, cache_key, auth):
+        for token in self._tokens.get(cache_key, []):
+            if token.auth.get('authToken') == auth.get('authToken'):
+                return token
+        return None
+
+    # --- Background worker ---
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                keys = list(self._tokens)
+            for cache_key in keys:
+                try:
+                    self._refill(cache_key)
+                except Exception as e:
+                    logger.warning(f"Token pool [{cache_key}]: refill failed: {e}")
+
+    def _refill(self, cache_key):
+        now = time.time()
+        with self._lock:
+            tokens = list(self._tokens[cache_key])
+        stale = [t for t in tokens if now - t.created > self.refresh_after]
+
+        # Re-check stale tokens and drop the ones that stopped working
+        for token in stale:
+            ok = self.validate(token.auth, cache_key)
+            if ok:
+                token.created = now
+            elif ok is False:
+                with self._lock:
+                    if token in self._tokens[cache_key]:
+                        self._tokens[cache_key].remove(token)
+
+        # Top up to the target size; each fetch races the dispensers with its own backoff
+        for _ in range(self.size):
+            with self._lock:
+                if len(self._tokens[cache_key]) >= self.size:
+                    return
+            auth = self.fetch(cache_key)
+            if not auth:
+                return
+            self.add(cache_key, auth)
+            logger.info(f"Token pool [{cache_key}]: added token ({len(self._tokens[cache_key])}/{self.size})")
@@ -0,0 +1,112 @@
+"""
+GPlay Downloader - ZIP Streaming
+Streams files as one store-mode (uncompressed) ZIP without holding them in memory
+
+APKs are already compressed, so entries are stored as-is. `bundle()` fetches
+every part concurrently into a local file and emits each one as soon as it
+is complete; memory use stays at one chunk per stream whatever the app size.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+CHUNK_SIZE = 1024 * 1024
+# 1981-01-01 00:00, as written by apk_merge
+DOS_DATE = (1 << 9) | (1 << 5) | 1
+
+
+class ZipTooLarge(Exception):
+    pass
+
+
+def file_crc(path):
+    """(crc32, size) of a local file."""
+    crc = size = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return crc, size
+
+
+class ZipStream:
+    """Builds a store-mode ZIP as a sequence of byte chunks."""
+
+    def __init__(self):
+        self.offset = 0
+        self.entries = []
+
+    def add(self, name, path, crc, size):
+        """Yield the local header and contents of `path` (whose crc/size are known)."""
+        name = name.encode('utf-8')
+        if size > 0xFFFFFFFF or self.offset > 0xFFFFFFFF:
+            raise ZipTooLarge("Bundle needs ZIP64")
+        flags = 0x0800 if not name.isascii() else 0
+        self.entries.append((name, flags, crc, size, self.offset))
+        header = struct.pack('<IHHHHHIIIHH', 0x04034b50, 10, flags, 0, 0, DOS_DATE,
+                             crc, size, size, len(name), 0) + name
+        self.offset += len(header) + size
+        yield header
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    def close(self):
+        """The central directory and end record."""
+        cd = b''.join(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 10, 10, flags, 0, 0, DOS_DATE,
+                                  crc, size, size, len(name), 0, 0, 0, 0, 0, offset) + name
+                      for name, flags, crc, size, offset in self.entries)
+        if len(self.entries) > 0xFFFF or self.offset > 0xFFFFFFFF:
+            raise ZipTooLarge("Bundle needs ZIP64")
+        return cd + struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.entries), len(self.entries),
+                                len(cd), self.offset, 0)
+
+
+def bundle(parts, fetch, workers=4, log=None, stop=None):
+    """Yield a store-mode ZIP of `parts`, entries in the order their downloads finish.
+
+    `parts` are dicts with at least a 'name' (the entry name); `fetch(part, stop)`
+    returns (path, crc, size, temporary) for a local copy and should give up
+    once the `stop` event is set. Temporary files are removed once streamed,
+    or when the consumer stops early. Pass `stop` to end the downloads from
+    outside, e.g. when the generator is iterated on another thread and
+    cannot be closed while it waits.
+    """
+    zf = ZipStream()
+    start = time.monotonic()
+    stop = stop or threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(parts))), thread_name_prefix='bundle')
+    pending = {pool.submit(fetch, part, stop): part for part in parts}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                part = pending.pop(future)
+                path, crc, size, temporary = future.result()
+                try:
+                    yield from zf.add(part['name'], path, crc, size)
+                finally:
+                    if temporary:
+                        os.remove(path)
+        yield zf.close()
+        if log:
+            log(f"Bundled {len(parts)} files, {zf.offset / 1e6:.1f} MB in {time.monotonic() - start:.2f}s")
+    finally:
+        # Client gone or a part failed: stop running downloads without waiting for them,
+        # drop what has not started and clean up whatever still finishes
+        stop.set()
+        for future in pending:
+            future.cancel()
+            future.add_done_callback(_discard)
+        pool.shutdown(wait=False)
+
+
+def _discard(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    path, _, _, temporary = future.result()
+    if temporary:
+        os.remove(path)